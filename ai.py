@@ -0,0 +1,210 @@
+import collections
+import time
+import typing
+from cmdgame2048 import Game2048, MAX_PACKED_LEVEL, ROW_MASK, empty_mask, legal_moves_board, move_board, pack_grid, transpose_board
+
+_heuristic_table: typing.List[float] | None = None
+#The time budget and should_stop are checked once this many nodes were searched since the last check
+CHECK_INTERVAL: int = 256
+
+class SearchTimeout(Exception):
+    """Raised inside the search once the time budget of the move runs out"""
+
+def get_heuristic_table()-> typing.List[float]:
+    """Return the heuristic score of every packed row, the table is built on the first call
+
+    Rows with more empty tiles, more possible merges and monotonic tiles score higher, the score is the same for a reversed row"""
+    global _heuristic_table
+    if _heuristic_table is not None:
+        return _heuristic_table
+
+    _heuristic_table = [0.0] * 65536
+    for row in range(65536):
+        line: typing.List[int] = [(row >> shift) & 0xF for shift in (0, 4, 8, 12)]
+        tile_sum: float = sum([tile ** 3.5 for tile in line])
+        empty: int = line.count(0)
+        merges: int = 0
+        previous: int = 0
+        counter: int = 0
+        for tile in line:
+            if tile == 0:
+                continue
+            if previous == tile:
+                counter += 1
+            elif counter > 0:
+                merges += 1 + counter
+                counter = 0
+            previous = tile
+        if counter > 0:
+            merges += 1 + counter
+        monotonicity_left: float = 0.0
+        monotonicity_right: float = 0.0
+        for tile_index in range(1, 4):
+            if line[tile_index - 1] > line[tile_index]:
+                monotonicity_left += line[tile_index - 1] ** 4 - line[tile_index] ** 4
+            else:
+                monotonicity_right += line[tile_index] ** 4 - line[tile_index - 1] ** 4
+        _heuristic_table[row] = 200000.0 + 270.0*empty + 700.0*merges - 47.0*min(monotonicity_left, monotonicity_right) - 11.0*tile_sum
+    return _heuristic_table
+
+def evaluate_board(board: int)-> float:
+    """Return the heuristic score of a packed board, summed over its rows and columns"""
+    heuristic_table: typing.List[float] = get_heuristic_table()
+    columns: int = transpose_board(board)
+    return (heuristic_table[board & ROW_MASK] + heuristic_table[(board >> 16) & ROW_MASK] + heuristic_table[(board >> 32) & ROW_MASK] + heuristic_table[board >> 48]
+            + heuristic_table[columns & ROW_MASK] + heuristic_table[(columns >> 16) & ROW_MASK] + heuristic_table[(columns >> 32) & ROW_MASK] + heuristic_table[columns >> 48])
+
+def mirror_board(board: int)-> int:
+    """Mirror a packed board horizontally, the first column becomes the last one"""
+    return (((board & 0xF000F000F000F000) >> 12) | ((board & 0x0F000F000F000F00) >> 4)
+            | ((board & 0x00F000F000F000F0) << 4) | ((board & 0x000F000F000F000F) << 12))
+
+def flip_board(board: int)-> int:
+    """Flip a packed board vertically, the first row becomes the last one"""
+    return (board >> 48) | ((board >> 16) & 0xFFFF0000) | ((board << 16) & 0xFFFF00000000) | ((board << 48) & 0xFFFF000000000000)
+
+def canonical_board(board: int)-> int:
+    """Return the smallest of the 8 rotations and reflections of a packed board, symmetric boards have the same value"""
+    mirrored: int = mirror_board(board)
+    flipped: int = flip_board(board)
+    rotated: int = flip_board(mirrored)
+    transposed: int = transpose_board(board)
+    return min(board, mirrored, flipped, rotated, transposed, mirror_board(transposed), flip_board(transposed), flip_board(mirror_board(transposed)))
+
+class Expectimax:
+    """Expectimax solver choosing the best direction for a game
+
+    The search alternates between moves of the player and the spawn of a 2 (90%) or 4 (10%) tile on every empty tile,
+    it deepens one move at a time until the time budget runs out. Values of chance nodes are cached in a transposition table
+    keyed by the canonical board, the least recently used entries are evicted once it is full.
+
+    Methods:
+    self.best_move(game: Game2048) - Returns the best direction for the game, -1 if there is none
+    self.stats() - Returns the statistics of the last search
+    """
+    def __init__(self, *, time_limit_ms: float = 50.0, max_depth: int = 8, cache_size: int = 1_000_000, min_probability: float = 0.0001):
+        """Create a new solver
+
+        Parameters:
+
+            time_limit_ms = a float, the time budget of a single move in milliseconds
+
+            max_depth = an integer, the search stops deepening after this many moves
+
+            cache_size = an integer, the highest number of boards kept in the transposition table
+
+            min_probability = a float, spawns less likely than this are evaluated by the heuristic instead of searched deeper
+        """
+        self.time_limit_ms: float = time_limit_ms
+        self.max_depth: int = max_depth
+        self.cache_size: int = cache_size
+        self.min_probability: float = min_probability
+        self.cache: collections.OrderedDict[int, typing.Tuple[int, float]] = collections.OrderedDict()
+        self.nodes: int = 0
+        self.cache_hits: int = 0
+        self.cache_lookups: int = 0
+        self.depth: int = 0
+        self.elapsed: float = 0.0
+        #Called together with the time check, the search stops early once it returns True
+        self.should_stop: typing.Callable[[], bool] | None = None
+        self._deadline: float = 0.0
+        self._next_check: int = 0
+
+    def _max_node(self, board: int, depth: int, probability: float)-> float:
+        """Return the value of the best move on the board"""
+        self.nodes += 1
+        if self.nodes >= self._next_check:
+            #Leaves count as nodes too, so the check is due once the count passes the mark rather than at exact multiples
+            self._next_check = self.nodes + CHECK_INTERVAL
+            if time.perf_counter() > self._deadline or (self.should_stop is not None and self.should_stop()):
+                raise SearchTimeout()
+        best_value: float = 0.0
+        for direction in range(4):
+            new_board, merge_info = move_board(board, direction)
+            if new_board != board:
+                best_value = max(best_value, self._chance_node(new_board, depth - 1, probability))
+        return best_value
+
+    def _chance_node(self, board: int, depth: int, probability: float)-> float:
+        """Return the expected value of the board over all possible spawns"""
+        if depth <= 0 or probability < self.min_probability:
+            self.nodes += 1
+            return evaluate_board(board)
+
+        key: int = canonical_board(board)
+        self.cache_lookups += 1
+        cached: typing.Tuple[int, float] | None = self.cache.get(key)
+        if cached is not None and cached[0] >= depth:
+            self.cache_hits += 1
+            self.cache.move_to_end(key)
+            return cached[1]
+
+        empty_tiles: int = empty_mask(board)
+        empty_spots: int = empty_tiles.bit_count()
+        if empty_spots == 0:
+            return self._max_node(board, depth, probability)
+        value: float = 0.0
+        while empty_tiles:
+            tile: int = empty_tiles & -empty_tiles
+            empty_tiles ^= tile
+            value += 0.9 * self._max_node(board | tile, depth, probability * 0.9 / empty_spots)
+            value += 0.1 * self._max_node(board | (tile << 1), depth, probability * 0.1 / empty_spots)
+        value /= empty_spots
+
+        self.cache[key] = (depth, value)
+        self.cache.move_to_end(key)
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last = False)
+        return value
+
+    def best_move_board(self, board: int)-> int:
+        """Return the best direction for a packed board, -1 if no direction changes it"""
+        start_time: float = time.perf_counter()
+        self._deadline = start_time + self.time_limit_ms / 1000
+        self.nodes = 0
+        self._next_check = CHECK_INTERVAL
+        self.cache_hits = 0
+        self.cache_lookups = 0
+        self.depth = 0
+        legal_mask: int = legal_moves_board(board)
+        best_direction: int = -1 if legal_mask == 0 else (legal_mask & -legal_mask).bit_length() - 1
+        if legal_mask & (legal_mask - 1):
+            try:
+                for depth in range(1, self.max_depth + 1):
+                    best_value: float = -1.0
+                    depth_best_direction: int = best_direction
+                    for direction in range(4):
+                        if legal_mask >> direction & 1:
+                            value: float = self._chance_node(move_board(board, direction)[0], depth, 1.0)
+                            if value > best_value:
+                                best_value = value
+                                depth_best_direction = direction
+                    best_direction = depth_best_direction
+                    self.depth = depth
+            except SearchTimeout:
+                pass
+        self.elapsed = time.perf_counter() - start_time
+        return best_direction
+
+    def best_move(self, game: Game2048)-> int:
+        """Return the best direction for the game, -1 if no direction changes the board
+
+        Games with tiles that do not fit into the packed board and boards other than 4x4 get their first legal direction"""
+        if game.packed and game.rows == 4 and game.cols == 4:
+            return self.best_move_board(game.board)
+        grid: typing.List[typing.List[int]] = game.grid
+        if game.rows == 4 and game.cols == 4 and max([max(row) for row in grid]) <= MAX_PACKED_LEVEL:
+            return self.best_move_board(pack_grid(grid))
+        legal_mask: int = game.legal_moves()
+        return -1 if legal_mask == 0 else (legal_mask & -legal_mask).bit_length() - 1
+
+    def stats(self)-> typing.Dict[str, float]:
+        """Return the statistics of the last search: depth reached, nodes, nodes per second and cache hit rate"""
+        return {
+            "depth": self.depth,
+            "nodes": self.nodes,
+            "elapsed_ms": self.elapsed * 1000,
+            "nodes_per_second": self.nodes / self.elapsed if self.elapsed > 0 else 0.0,
+            "cache_hit_rate": self.cache_hits / self.cache_lookups if self.cache_lookups > 0 else 0.0,
+            "cache_size": len(self.cache),
+        }
@@ -0,0 +1,307 @@
+"""Aggregate reports over large collections of recorded games
+
+Reads JSON lines files with the results of games (as written by --selfplay) and archives of binary replays (.g2k),
+given directly or found in directories. Files are streamed a line or a replay at a time and never loaded fully.
+JSON lines files are split into chunks on line boundaries and every chunk, as well as every replay archive, is
+aggregated in a worker process. The partial aggregates are merged into one report, so memory stays bounded
+no matter how large the logs are.
+
+    python cmdgame2048.py --analyze LOGS_DIRECTORY [--workers N] [--output report.json]
+
+The report holds the distributions of scores, moves, max tiles and powerups used, the win rate by powerup mode,
+the number of undos, swaps and deletes (replays only) and the number of moves it took to make the 2048 tile.
+"""
+import argparse
+import concurrent.futures
+import json
+import os
+import time
+import typing
+import replay
+
+#Only these are searched for in directories, reports and manifests written as .json next to the logs are not game results
+JSON_LINES_EXTENSIONS: typing.Tuple[str, ...] = (".jsonl",)
+REPLAY_EXTENSIONS: typing.Tuple[str, ...] = (".g2k",)
+#Bytes of a JSON lines file aggregated by one task
+DEFAULT_CHUNK_SIZE: int = 64 * 1024 * 1024
+#Every power of two range of a histogram is split into 2**SUB_BUCKET_BITS buckets
+SUB_BUCKET_BITS: int = 5
+
+def bucket_index(number: int)-> int:
+    """Return the bucket of a non-negative integer, numbers below 2**(SUB_BUCKET_BITS + 1) have a bucket of their own and
+    every higher power of two range is split into 2**SUB_BUCKET_BITS buckets of the same width"""
+    shift: int = max(number.bit_length() - SUB_BUCKET_BITS - 1, 0)
+    return (shift << SUB_BUCKET_BITS) + (number >> shift)
+
+def bucket_bounds(index: int)-> typing.Tuple[int, int]:
+    """Return the lowest and highest number of a bucket"""
+    shift: int = max((index >> SUB_BUCKET_BITS) - 1, 0)
+    top_bits: int = index - (shift << SUB_BUCKET_BITS)
+    return top_bits << shift, ((top_bits + 1) << shift) - 1
+
+class Histogram:
+    """Counts non-negative integers in log-linear buckets, see bucket_index(), so percentiles are within 1/2**SUB_BUCKET_BITS of the exact ones"""
+    __slots__ = ("buckets", "count", "total", "minimum", "maximum")
+
+    def __init__(self):
+        self.buckets: typing.Dict[int, int] = {}
+        self.count: int = 0
+        self.total: int = 0
+        self.minimum: int = -1
+        self.maximum: int = 0
+
+    def add(self, number: int):
+        index: int = bucket_index(number)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        self.count += 1
+        self.total += number
+        if number > self.maximum:
+            self.maximum = number
+        if number < self.minimum or self.minimum == -1:
+            self.minimum = number
+
+    def merge(self, other: "Histogram"):
+        """Add the counts of another histogram to this one"""
+        for index, bucket in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + bucket
+        self.count += other.count
+        self.total += other.total
+        self.maximum = max(self.maximum, other.maximum)
+        if other.minimum != -1 and (other.minimum < self.minimum or self.minimum == -1):
+            self.minimum = other.minimum
+
+    def percentile(self, fraction: float)-> int:
+        """Return the middle of the bucket holding the said fraction of numbers, clamped to the lowest and highest number counted"""
+        target: float = fraction * self.count
+        seen: int = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= target and seen > 0:
+                lowest, highest = bucket_bounds(index)
+                return min(max((lowest + highest) // 2, self.minimum), self.maximum)
+        return self.maximum
+
+    def to_dict(self)-> typing.Dict[str, typing.Any]:
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else 0.0,
+            "min": max(self.minimum, 0),
+            "p50": self.percentile(0.5),
+            "p90": self.percentile(0.9),
+            "p99": self.percentile(0.99),
+            "max": self.maximum,
+            #Lowest number of every bucket holding any
+            "histogram": {str(bucket_bounds(index)[0]): self.buckets[index] for index in sorted(self.buckets)},
+        }
+
+class GameStats:
+    """Aggregate of any number of games, aggregates of disjoint sets of games are combined by merge()
+
+    Methods:
+    self.add_game(...) - Counts one game
+    self.merge(other) - Adds the counts of another aggregate
+    self.report() - Returns the aggregate as a JSON serializable dictionary
+    """
+    def __init__(self):
+        self.games: int = 0
+        self.wins: int = 0
+        self.malformed: int = 0
+        self.scores: Histogram = Histogram()
+        self.moves: Histogram = Histogram()
+        self.powerups_used: Histogram = Histogram()
+        self.moves_to_2048: Histogram = Histogram()
+        self.max_tiles: typing.Dict[int, int] = {}
+        #Powerup mode (None when it is not logged) to the number of games and wins
+        self.powerup_modes: typing.Dict[int | None, typing.List[int]] = {}
+        #Undos, swaps and deletes, only replays log which powerups were used
+        self.powerup_counts: typing.List[int] = [0, 0, 0]
+        self.games_with_powerup_counts: int = 0
+
+    def add_game(self, score: int, moves: int, max_tile: int, won: bool, powerup_mode: int | None = None, powerups_used: int | None = None,
+                 moves_to_2048: int | None = None, powerup_counts: typing.Tuple[int, int, int] | None = None):
+        """Count one game
+
+        Parameters:
+
+            score, moves, max_tile = integers, the final score, number of moves and highest tile of the game
+
+            won = a boolean, whether the 2048 tile was made
+
+            powerup_mode = an integer, same as in Game2048.restart(), None if it is not known
+
+            powerups_used = an integer, the number of powerups used, None if it is not known
+
+            moves_to_2048 = an integer, the number of moves made when the 2048 tile was made, None if it never was or it is not known
+
+            powerup_counts = a tuple of the number of undos, swaps and deletes, None if they are not known
+        """
+        self.games += 1
+        self.wins += won
+        self.scores.add(score)
+        self.moves.add(moves)
+        self.max_tiles[max_tile] = self.max_tiles.get(max_tile, 0) + 1
+        mode_counts: typing.List[int] = self.powerup_modes.setdefault(powerup_mode, [0, 0])
+        mode_counts[0] += 1
+        mode_counts[1] += won
+        if powerups_used is not None:
+            self.powerups_used.add(powerups_used)
+        if moves_to_2048 is not None:
+            self.moves_to_2048.add(moves_to_2048)
+        if powerup_counts is not None:
+            self.powerup_counts = [count + added for count, added in zip(self.powerup_counts, powerup_counts)]
+            self.games_with_powerup_counts += 1
+
+    def merge(self, other: "GameStats"):
+        """Add the counts of another aggregate to this one"""
+        self.games += other.games
+        self.wins += other.wins
+        self.malformed += other.malformed
+        for histogram, other_histogram in ((self.scores, other.scores), (self.moves, other.moves), (self.powerups_used, other.powerups_used), (self.moves_to_2048, other.moves_to_2048)):
+            histogram.merge(other_histogram)
+        for max_tile, count in other.max_tiles.items():
+            self.max_tiles[max_tile] = self.max_tiles.get(max_tile, 0) + count
+        for powerup_mode, (games, wins) in other.powerup_modes.items():
+            mode_counts: typing.List[int] = self.powerup_modes.setdefault(powerup_mode, [0, 0])
+            mode_counts[0] += games
+            mode_counts[1] += wins
+        self.powerup_counts = [count + added for count, added in zip(self.powerup_counts, other.powerup_counts)]
+        self.games_with_powerup_counts += other.games_with_powerup_counts
+
+    def report(self)-> typing.Dict[str, typing.Any]:
+        return {
+            "games": self.games,
+            "malformed_records": self.malformed,
+            "win_rate": self.wins / self.games if self.games else 0.0,
+            "scores": self.scores.to_dict(),
+            "moves": self.moves.to_dict(),
+            "max_tiles": {str(max_tile): count for max_tile, count in sorted(self.max_tiles.items())},
+            "win_rate_by_powerup_mode": {"unknown" if powerup_mode is None else str(powerup_mode): {"games": games, "wins": wins, "win_rate": wins / games}
+                                         for powerup_mode, (games, wins) in sorted(self.powerup_modes.items(), key = lambda item: -1 if item[0] is None else item[0])},
+            "powerups_used": self.powerups_used.to_dict(),
+            "powerup_counts": {"games": self.games_with_powerup_counts, "undos": self.powerup_counts[0], "swaps": self.powerup_counts[1], "deletes": self.powerup_counts[2]},
+            #The count of this histogram is the number of games which made the 2048 tile and logged when
+            "moves_to_2048": self.moves_to_2048.to_dict(),
+        }
+
+def iter_lines(path: str, start: int, end: int)-> typing.Iterator[bytes]:
+    """Yield the lines of a file which start between the offsets start (inclusive) and end (exclusive)"""
+    with open(path, "rb") as log_file:
+        position: int = start
+        if start > 0:
+            #The line going through the start belongs to the previous chunk
+            log_file.seek(start - 1)
+            position = start - 1 + len(log_file.readline())
+        while position < end:
+            line: bytes = log_file.readline()
+            if not line:
+                return
+            position += len(line)
+            yield line
+
+def aggregate_json_lines(path: str, start: int, end: int)-> GameStats:
+    """Aggregate the game results of a chunk of a JSON lines file, is run in the worker processes"""
+    stats: GameStats = GameStats()
+    for line in iter_lines(path, start, end):
+        if not line.strip():
+            continue
+        try:
+            result: typing.Dict[str, typing.Any] = json.loads(line)
+            won: bool = bool(result["won"]) if "won" in result else abs(result["game_state"]) == 2
+            stats.add_game(int(result["score"]), int(result["moves"]), int(result["max_tile"]), won, result.get("powerup_mode"), result.get("powerups_used"), result.get("moves_to_2048"))
+        except (ValueError, KeyError, TypeError):
+            stats.malformed += 1
+    return stats
+
+def aggregate_replays(path: str)-> GameStats:
+    """Aggregate the replays of an archive, is run in the worker processes
+
+    Only replays which made the 2048 tile are played again, to find the move it was made on"""
+    stats: GameStats = GameStats()
+    with open(path, "rb") as replay_file:
+        try:
+            for game_replay in replay.iter_replays(replay_file):
+                powerup_counts: typing.List[int] = [0, 0, 0]
+                for operation in game_replay.iter_operations():
+                    if operation[0] != replay.OP_ONE_MOVE:
+                        powerup_counts[operation[0] - replay.OP_UNDO] += 1
+                won: bool = abs(game_replay.game_state) == 2
+                moves_to_2048: typing.List[int] = []
+                if won:
+                    def on_operation(game):
+                        if not moves_to_2048 and abs(game.game_state) == 2:
+                            moves_to_2048.append(game.moves)
+                    game_replay.play(on_operation = on_operation)
+                stats.add_game(game_replay.score, game_replay.moves, 2**max([max(row) for row in game_replay.grid]), won, game_replay.powerup_mode,
+                               sum(powerup_counts), moves_to_2048[0] if moves_to_2048 else None, tuple(powerup_counts))
+        except replay.ReplayError:
+            #The rest of a damaged archive can not be found
+            stats.malformed += 1
+    return stats
+
+def find_logs(paths: typing.List[str])-> typing.Iterator[str]:
+    """Yield the files given and the log files in the directories given, directories are searched recursively"""
+    for path in paths:
+        if os.path.isdir(path):
+            for directory, directory_names, file_names in os.walk(path):
+                directory_names.sort()
+                for file_name in sorted(file_names):
+                    if file_name.endswith(JSON_LINES_EXTENSIONS + REPLAY_EXTENSIONS):
+                        yield os.path.join(directory, file_name)
+        else:
+            yield path
+
+def iter_tasks(paths: typing.List[str], chunk_size: int = DEFAULT_CHUNK_SIZE)-> typing.Iterator[typing.Tuple[typing.Callable[..., GameStats], typing.Tuple[typing.Any, ...]]]:
+    """Yield the function and arguments aggregating every chunk of JSON lines and every replay archive"""
+    for path in find_logs(paths):
+        if path.endswith(REPLAY_EXTENSIONS):
+            yield aggregate_replays, (path,)
+        else:
+            size: int = os.path.getsize(path)
+            for start in range(0, max(size, 1), chunk_size):
+                yield aggregate_json_lines, (path, start, min(start + chunk_size, size))
+
+def analyze(paths: typing.List[str], *, workers: int | None = None, chunk_size: int = DEFAULT_CHUNK_SIZE)-> typing.Dict[str, typing.Any]:
+    """Aggregate the logs across worker processes and return the report
+
+    Parameters:
+
+        paths = a list of paths of log files or directories holding them
+
+        workers = an integer, the number of worker processes, None uses one per CPU
+
+        chunk_size = an integer, the number of bytes of a JSON lines file aggregated by one task
+    """
+    start_time: float = time.perf_counter()
+    stats: GameStats = GameStats()
+    files: typing.Set[str] = set()
+    workers = workers or os.cpu_count() or 1
+    with concurrent.futures.ProcessPoolExecutor(max_workers = workers) as executor:
+        #Only a few tasks per worker are submitted at once, so the number of pending futures stays bounded too
+        pending: typing.Set[concurrent.futures.Future] = set()
+        max_pending: int = 4 * workers
+        for function, arguments in iter_tasks(paths, chunk_size):
+            files.add(arguments[0])
+            pending.add(executor.submit(function, *arguments))
+            if len(pending) >= max_pending:
+                done, pending = concurrent.futures.wait(pending, return_when = concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    stats.merge(future.result())
+        for future in concurrent.futures.as_completed(pending):
+            stats.merge(future.result())
+    elapsed: float = time.perf_counter() - start_time
+    return {"files": len(files), "bytes": sum([os.path.getsize(path) for path in files]), "elapsed": elapsed} | stats.report()
+
+def main(args: typing.List[str]):
+    """Analyze the logs given as command line arguments and print the report"""
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(prog = "cmdgame2048.py --analyze", description = "Aggregate reports over recorded games")
+    parser.add_argument("paths", nargs = "+", help = "JSON lines files of game results, replay archives (.g2k) or directories holding them")
+    parser.add_argument("--workers", type = int, default = None, help = "number of worker processes, one per CPU by default")
+    parser.add_argument("--chunk-size-mb", type = float, default = DEFAULT_CHUNK_SIZE / 1024 / 1024, help = "megabytes of a JSON lines file aggregated by one task")
+    parser.add_argument("--output", default = None, help = "JSON file the report is written into")
+    options: argparse.Namespace = parser.parse_args(args)
+
+    report: typing.Dict[str, typing.Any] = analyze(options.paths, workers = options.workers, chunk_size = max(1, int(options.chunk_size_mb * 1024 * 1024)))
+    if options.output is not None:
+        with open(options.output, "w") as output_file:
+            json.dump(report, output_file, indent = 4)
+    print(json.dumps(report, indent = 4))
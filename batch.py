@@ -0,0 +1,137 @@
+import typing
+import numpy as np
+
+class Game2048Batch:
+    """Class describing many games of 2048 played in lockstep, boards are stored as an (N, rows, cols) array of tile exponents
+
+    The moves and spawns follow the same rules as Game2048._move() and Game2048._spawn(), powerups are not supported.
+
+    Methods:
+    self.step(directions) - Makes a move in every game, the direction is chosen per game
+    self.legal_moves() - Returns a mask of the directions that would change the board for every game
+    self.reset(mask) - Restarts the chosen games in place
+    """
+    def __init__(self, count: int, *, seed: int | None = None, rows: int = 4, cols: int = 4):
+        """Create count new games
+
+        Parameters:
+
+            count = an integer, the number of games played at once
+
+            seed = an integer, seeds the random generator used for spawning tiles, None picks a random seed
+
+            rows, cols = integers, the size of the boards
+        """
+        self.rng: np.random.Generator = np.random.default_rng(seed)
+        self.boards: np.ndarray = np.zeros((count, rows, cols), dtype = np.uint8)
+        self.scores: np.ndarray = np.zeros(count, dtype = np.int64)
+        self.moves: np.ndarray = np.zeros(count, dtype = np.int64)
+        self.done: np.ndarray = np.zeros(count, dtype = bool)
+        self.reset()
+
+    def __len__(self)-> int:
+        return len(self.boards)
+
+    def _spawn(self, mask: np.ndarray):
+        """Spawn a 2 or 4 tile at random empty position of every board chosen by the boolean mask"""
+        flattened_boards: np.ndarray = self.boards.reshape(len(self.boards), -1)
+        empty_tiles: np.ndarray = flattened_boards == 0
+        empty_spots: np.ndarray = empty_tiles.sum(axis = 1)
+        mask = mask & (empty_spots > 0)
+        count: int = int(mask.sum())
+        if count == 0:
+            return
+
+        new_spots: np.ndarray = np.floor(empty_spots[mask] * self.rng.random(count)).astype(np.int64)
+        chosen_levels: np.ndarray = np.where(self.rng.random(count) > 0.9, 2, 1).astype(np.uint8)
+        empty_indices: np.ndarray = np.cumsum(empty_tiles[mask], axis = 1) - 1
+        tile_indices: np.ndarray = np.argmax(empty_tiles[mask] & (empty_indices == new_spots[:, None]), axis = 1)
+        flattened_boards[np.flatnonzero(mask), tile_indices] = chosen_levels
+
+    @staticmethod
+    def _orient(boards: np.ndarray, direction: int)-> np.ndarray:
+        """Return a view of the boards in which the direction moves the tiles to the left of every row"""
+        if direction % 2 == 1:
+            boards = boards.swapaxes(1, 2)
+        if direction >= 2:
+            boards = boards[:, :, ::-1]
+        return boards
+
+    @staticmethod
+    def _unorient(boards: np.ndarray, direction: int)-> np.ndarray:
+        """Undo Game2048Batch._orient()"""
+        if direction >= 2:
+            boards = boards[:, :, ::-1]
+        if direction % 2 == 1:
+            boards = boards.swapaxes(1, 2)
+        return boards
+
+    @staticmethod
+    def _merge_rows(rows: np.ndarray)-> typing.Tuple[np.ndarray, np.ndarray]:
+        """Move an (R, C) array of rows to the left, return the new rows and the score of every row
+
+        If three tiles are next to each other, only the first two merge"""
+        order: np.ndarray = np.argsort(rows == 0, axis = 1, kind = "stable")
+        rows = np.take_along_axis(rows, order, axis = 1)
+        scores: np.ndarray = np.zeros(len(rows), dtype = np.int64)
+        for column in range(rows.shape[1] - 1):
+            merged: np.ndarray = (rows[:, column] != 0) & (rows[:, column] == rows[:, column + 1])
+            if not merged.any():
+                continue
+            rows[merged, column] += 1
+            scores[merged] += np.left_shift(1, rows[merged, column].astype(np.int64))
+            rows[merged, column + 1:-1] = rows[merged, column + 2:]
+            rows[merged, -1] = 0
+        return rows, scores
+
+    def step(self, directions: typing.Sequence[int] | np.ndarray)-> typing.Tuple[np.ndarray, np.ndarray]:
+        """Make a move in every game that is not done, return the score gained and whether the board changed for every game
+
+        Parameters:
+
+            directions = a sequence of integers, one per game, 0 means left, going up by 1 rotates the direction by 90 degrees clockwise,
+            negative numbers skip the game
+        """
+        directions = np.asarray(directions, dtype = np.int64)
+        count: int = len(self.boards)
+        score_deltas: np.ndarray = np.zeros(count, dtype = np.int64)
+        changed: np.ndarray = np.zeros(count, dtype = bool)
+        for direction in range(4):
+            indices: np.ndarray = np.flatnonzero((directions == direction) & ~self.done)
+            if len(indices) == 0:
+                continue
+            oriented_boards: np.ndarray = self._orient(self.boards[indices], direction)
+            rows, row_scores = self._merge_rows(oriented_boards.reshape(-1, oriented_boards.shape[2]))
+            new_boards: np.ndarray = self._unorient(rows.reshape(oriented_boards.shape), direction)
+            changed[indices] = (new_boards != self.boards[indices]).any(axis = (1, 2))
+            score_deltas[indices] = row_scores.reshape(len(indices), -1).sum(axis = 1)
+            self.boards[indices] = new_boards
+
+        self.scores += score_deltas
+        self.moves += changed
+        self._spawn(changed)
+        self.done |= self.legal_moves() == 0
+        return score_deltas, changed
+
+    def legal_moves(self)-> np.ndarray:
+        """Return an array of masks of the directions that would change the board, bit number n is set if direction n does"""
+        legal_masks: np.ndarray = np.zeros(len(self.boards), dtype = np.uint8)
+        for direction in range(4):
+            rows: np.ndarray = self._orient(self.boards, direction)
+            current_tiles: np.ndarray = rows[:, :, :-1]
+            next_tiles: np.ndarray = rows[:, :, 1:]
+            slides: np.ndarray = (current_tiles == 0) & (next_tiles != 0)
+            merges: np.ndarray = (current_tiles != 0) & (current_tiles == next_tiles)
+            legal_masks |= (slides | merges).any(axis = (1, 2)).astype(np.uint8) << direction
+        return legal_masks
+
+    def reset(self, mask: np.ndarray | None = None):
+        """Restart the games chosen by the boolean mask, None restarts all of them"""
+        if mask is None:
+            mask = np.ones(len(self.boards), dtype = bool)
+        self.boards[mask] = 0
+        self.scores[mask] = 0
+        self.moves[mask] = 0
+        self.done[mask] = False
+        self._spawn(mask)
+        self._spawn(mask)
@@ -0,0 +1,113 @@
+"""Load test of the game server
+
+Usage:
+
+    python benchmarks/load_test.py [--sessions N] [--moves N] [--host HOST --port PORT | --start-server]
+
+Opens the sessions, makes random moves in all of them at once and prints the moves per second, the latency of the replies
+and the memory the server uses per session. --start-server runs its own server in a subprocess on a free port.
+Thousands of sessions may need a higher limit of open files (ulimit -n) for both the client and the server.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+import typing
+
+ROOT: str = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MOVES: typing.Tuple[bytes, ...] = (b"move L\n", b"move U\n", b"move R\n", b"move D\n")
+
+async def request(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, line: bytes)-> str:
+    writer.write(line)
+    return (await reader.readline()).decode()
+
+async def server_stats(host: str, port: int)-> typing.Dict[str, int]:
+    """Return the sessions, resident memory, moves and evicted sessions reported by the server, the query opens one session"""
+    reader, writer = await asyncio.open_connection(host, port)
+    await reader.readline()
+    words: typing.List[str] = (await request(reader, writer, b"stats\n")).split()
+    writer.close()
+    return {"sessions": int(words[1]) - 1, "memory": int(words[2]), "moves": int(words[3]), "evicted": int(words[4])}
+
+async def play_session(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, moves: int, rng: random.Random, latencies: typing.List[int])-> int:
+    """Make random moves in one session, a new game is started once it is lost, return the number of moves sent"""
+    perf_counter_ns: typing.Callable[[], int] = time.perf_counter_ns
+    for i in range(moves):
+        start: int = perf_counter_ns()
+        reply: str = await request(reader, writer, MOVES[rng.randrange(4)])
+        latencies.append(perf_counter_ns() - start)
+        if not reply.startswith("OK"):
+            raise RuntimeError(f"Unexpected reply {reply!r}")
+        if int(reply.split()[3]) < 0:
+            await request(reader, writer, b"new\n")
+    return moves
+
+async def load_test(host: str, port: int, sessions: int, moves: int, seed: int = 0)-> typing.Dict[str, typing.Any]:
+    """Open the sessions, play moves in all of them at once and return the results"""
+    before: typing.Dict[str, int] = await server_stats(host, port)
+    connections: typing.List[typing.Tuple[asyncio.StreamReader, asyncio.StreamWriter]] = []
+    for i in range(sessions):
+        reader, writer = await asyncio.open_connection(host, port)
+        await reader.readline()
+        connections.append((reader, writer))
+    during: typing.Dict[str, int] = await server_stats(host, port)
+
+    latencies: typing.List[int] = []
+    start_time: float = time.perf_counter()
+    sent: typing.List[int] = await asyncio.gather(*[play_session(reader, writer, moves, random.Random(seed + index), latencies) for index, (reader, writer) in enumerate(connections)])
+    elapsed: float = time.perf_counter() - start_time
+    after: typing.Dict[str, int] = await server_stats(host, port)
+    for reader, writer in connections:
+        writer.close()
+
+    latencies.sort()
+    percentile = lambda fraction: latencies[min(len(latencies) - 1, int(fraction * len(latencies)))] if latencies else 0
+    return {
+        "sessions": during["sessions"],
+        "moves_sent": sum(sent),
+        "moves_made": after["moves"] - during["moves"],
+        "elapsed": elapsed,
+        "moves_per_second": sum(sent) / elapsed if elapsed > 0 else 0.0,
+        "p50_ms": percentile(0.5) / 1e6,
+        "p99_ms": percentile(0.99) / 1e6,
+        "memory_per_session_after_connecting": (during["memory"] - before["memory"]) / sessions if sessions else 0.0,
+        "memory_per_session_after_playing": (after["memory"] - before["memory"]) / sessions if sessions else 0.0,
+    }
+
+def start_server()-> typing.Tuple[subprocess.Popen, int]:
+    """Run a server on a free port in a subprocess and return it and its port"""
+    process: subprocess.Popen = subprocess.Popen([sys.executable, os.path.join(ROOT, "cmdgame2048.py"), "--server", "--port", "0", "--max-sessions", "1000000"],
+                                                 stdout = subprocess.PIPE, text = True)
+    #The server prints the address it listens on once it is ready
+    port: int = int(process.stdout.readline().rsplit(":", 1)[1])
+    return process, port
+
+def main(args: typing.List[str])-> int:
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(description = "Load test of the game server")
+    parser.add_argument("--host", default = "127.0.0.1")
+    parser.add_argument("--port", type = int, default = 2048)
+    parser.add_argument("--start-server", action = "store_true", help = "run a server in a subprocess instead of connecting to a running one")
+    parser.add_argument("--sessions", type = int, default = 1000, help = "number of concurrent sessions")
+    parser.add_argument("--moves", type = int, default = 100, help = "number of moves per session")
+    parser.add_argument("--seed", type = int, default = 0)
+    options: argparse.Namespace = parser.parse_args(args)
+
+    process: subprocess.Popen | None = None
+    port: int = options.port
+    if options.start_server:
+        process, port = start_server()
+    try:
+        results: typing.Dict[str, typing.Any] = asyncio.run(load_test(options.host, port, options.sessions, options.moves, options.seed))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+    print(json.dumps(results, indent = 4))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
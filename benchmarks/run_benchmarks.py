@@ -0,0 +1,199 @@
+"""Benchmarks of the Game2048 hot paths
+
+Usage:
+
+    python benchmarks/run_benchmarks.py run [--output results.json] [--repeat N] [--games N]
+    python benchmarks/run_benchmarks.py compare baseline.json results.json [--threshold 0.1]
+
+compare exits with status 1 when any benchmark got slower than the baseline by more than the threshold.
+No terminal or key listener is needed, so the benchmarks run on headless machines.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+import typing
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from cmdgame2048 import Game2048, get_row_tables
+
+ENGINES: typing.Tuple[str, ...] = ("bitboard", "list")
+#Boards of tile exponents from different stages of a game
+FIXTURES: typing.Dict[str, typing.List[typing.List[int]]] = {
+    "early": [[1, 0, 0, 0], [0, 1, 0, 0], [0, 0, 2, 0], [1, 0, 0, 0]],
+    "middle": [[1, 2, 1, 0], [3, 4, 2, 1], [5, 6, 3, 2], [7, 7, 4, 1]],
+    "late": [[2, 1, 3, 1], [4, 5, 6, 2], [9, 8, 7, 3], [10, 11, 4, 1]],
+    "full": [[1, 2, 1, 2], [2, 1, 2, 1], [1, 2, 1, 2], [2, 1, 2, 3]],
+}
+#Sizes of the boards of random games besides the default 4x4 one
+GAME_SIZES: typing.Tuple[typing.Tuple[int, int], ...] = ((3, 3), (6, 6))
+#Metrics where a higher value means faster code, the others are latencies
+HIGHER_IS_BETTER: typing.Tuple[str, ...] = ("ops_per_second",)
+COMPARED_METRICS: typing.Tuple[str, ...] = ("ops_per_second", "p50_ns")
+
+def summarize(samples: typing.List[int])-> typing.Dict[str, float]:
+    """Return the throughput and latency percentiles of a list of durations in nanoseconds"""
+    samples = sorted(samples)
+    percentile = lambda fraction: samples[min(len(samples) - 1, int(fraction * len(samples)))]
+    total: int = sum(samples)
+    return {
+        "ops": len(samples),
+        "ops_per_second": len(samples) / (total / 1e9) if total > 0 else 0.0,
+        "mean_ns": total / len(samples),
+        "p50_ns": percentile(0.5),
+        "p90_ns": percentile(0.9),
+        "p99_ns": percentile(0.99),
+        "max_ns": samples[-1],
+    }
+
+def time_operation(setup: typing.Callable[[], typing.Any], operation: typing.Callable[[typing.Any], typing.Any], repeat: int)-> typing.Dict[str, float]:
+    """Time operation repeat times, every call gets a fresh result of setup which is not timed"""
+    samples: typing.List[int] = []
+    perf_counter_ns: typing.Callable[[], int] = time.perf_counter_ns
+    for i in range(repeat):
+        argument: typing.Any = setup()
+        start: int = perf_counter_ns()
+        operation(argument)
+        samples.append(perf_counter_ns() - start)
+    return summarize(samples)
+
+def new_game(engine: str, fixture: str, powerup_mode: int = 0)-> Game2048:
+    """Return a game with the board of the fixture"""
+    game: Game2048 = Game2048(powerup_mode = powerup_mode, engine = engine)
+    game.grid = [row.copy() for row in FIXTURES[fixture]]
+    return game
+
+def bench_moves(engine: str, fixture: str, repeat: int)-> typing.Dict[str, float]:
+    directions: typing.Iterator[int] = iter(range(repeat))
+    def setup()-> typing.Tuple[Game2048, int]:
+        return new_game(engine, fixture), next(directions) % 4
+    return time_operation(setup, lambda argument: argument[0]._move(argument[1]), repeat)
+
+def bench_check(engine: str, fixture: str, repeat: int)-> typing.Dict[str, float]:
+    return time_operation(lambda: new_game(engine, fixture), lambda game: game._check(), repeat)
+
+def bench_spawn(engine: str, fixture: str, repeat: int)-> typing.Dict[str, float]:
+    return time_operation(lambda: new_game(engine, fixture), lambda game: game._spawn(), repeat)
+
+def bench_str(engine: str, fixture: str, repeat: int)-> typing.Dict[str, float]:
+    return time_operation(lambda: new_game(engine, fixture, 1), str, repeat)
+
+def bench_snapshot(engine: str, fixture: str, repeat: int)-> typing.Dict[str, float]:
+    return time_operation(lambda: new_game(engine, fixture, 2), lambda game: game._snapshot(), repeat)
+
+def bench_undo(engine: str, fixture: str, repeat: int)-> typing.Dict[str, float]:
+    def setup()-> Game2048:
+        game: Game2048 = new_game(engine, fixture, 2)
+        game._snapshot()
+        return game
+    return time_operation(setup, lambda game: game.undo(), repeat)
+
+def bench_games(engine: str, games: int, rows: int = 4, cols: int = 4)-> typing.Dict[str, float]:
+    """Play whole games with random moves from fixed seeds, every move is one sample"""
+    samples: typing.List[int] = []
+    perf_counter_ns: typing.Callable[[], int] = time.perf_counter_ns
+    for seed in range(games):
+        rng: random.Random = random.Random(seed)
+        game: Game2048 = Game2048(engine = engine, seed = seed, rows = rows, cols = cols)
+        while game.game_state > 0:
+            direction: int = rng.randrange(4)
+            start: int = perf_counter_ns()
+            game.public_move(direction)
+            samples.append(perf_counter_ns() - start)
+    return summarize(samples)
+
+def run(repeat: int = 2000, games: int = 20)-> typing.Dict[str, typing.Any]:
+    """Run all the benchmarks and return their results"""
+    get_row_tables()
+    get_row_tables(3)
+    benchmarks: typing.Dict[str, typing.Callable[[str, str, int], typing.Dict[str, float]]] = {
+        "move": bench_moves,
+        "check": bench_check,
+        "spawn": bench_spawn,
+        "str": bench_str,
+        "snapshot": bench_snapshot,
+        "undo": bench_undo,
+    }
+    results: typing.Dict[str, typing.Dict[str, float]] = {}
+    for engine in ENGINES:
+        for name, benchmark in benchmarks.items():
+            for fixture in FIXTURES:
+                random.seed(0)
+                results[f"{name}/{engine}/{fixture}"] = benchmark(engine, fixture, repeat)
+        results[f"random_games/{engine}"] = bench_games(engine, games)
+        for rows, cols in GAME_SIZES:
+            results[f"random_games/{engine}/{rows}x{cols}"] = bench_games(engine, games, rows, cols)
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+            "time": time.time(),
+            "repeat": repeat,
+            "games": games,
+        },
+        "results": results,
+    }
+
+def compare(baseline: typing.Dict[str, typing.Any], current: typing.Dict[str, typing.Any], threshold: float)-> typing.List[str]:
+    """Return a description of every metric that regressed against the baseline by more than the threshold (0.1 means 10%)"""
+    regressions: typing.List[str] = []
+    for name, baseline_result in baseline["results"].items():
+        current_result: typing.Dict[str, float] | None = current["results"].get(name)
+        if current_result is None:
+            regressions.append(f"{name}: missing from the results")
+            continue
+        for metric in COMPARED_METRICS:
+            old_value: float = baseline_result[metric]
+            new_value: float = current_result[metric]
+            if old_value <= 0:
+                continue
+            if metric in HIGHER_IS_BETTER:
+                change: float = (old_value - new_value) / old_value
+            else:
+                change: float = (new_value - old_value) / old_value
+            if change > threshold:
+                regressions.append(f"{name}: {metric} {old_value:.0f} -> {new_value:.0f} ({change:.1%} worse)")
+    return regressions
+
+def main(args: typing.List[str])-> int:
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(description = "Benchmarks of the Game2048 hot paths")
+    subparsers = parser.add_subparsers(dest = "command", required = True)
+    run_parser: argparse.ArgumentParser = subparsers.add_parser("run", help = "run the benchmarks and write the results as JSON")
+    run_parser.add_argument("--output", default = "-", help = "path of the JSON results, - prints them")
+    run_parser.add_argument("--repeat", type = int, default = 2000, help = "number of timed calls per operation and fixture")
+    run_parser.add_argument("--games", type = int, default = 20, help = "number of random games per engine")
+    compare_parser: argparse.ArgumentParser = subparsers.add_parser("compare", help = "fail if the results regressed against a baseline")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("results")
+    compare_parser.add_argument("--threshold", type = float, default = 0.1, help = "allowed slowdown, 0.1 means 10%%")
+    options: argparse.Namespace = parser.parse_args(args)
+
+    if options.command == "run":
+        results: typing.Dict[str, typing.Any] = run(options.repeat, options.games)
+        if options.output == "-":
+            print(json.dumps(results, indent = 4))
+        else:
+            with open(options.output, "w") as output_file:
+                json.dump(results, output_file, indent = 4)
+        return 0
+
+    with open(options.baseline) as baseline_file:
+        baseline: typing.Dict[str, typing.Any] = json.load(baseline_file)
+    with open(options.results) as results_file:
+        current: typing.Dict[str, typing.Any] = json.load(results_file)
+    regressions: typing.List[str] = compare(baseline, current, options.threshold)
+    for regression in regressions:
+        print(regression)
+    if regressions:
+        print(f"{len(regressions)} regressions over {options.threshold:.0%}")
+        return 1
+    print(f"No regressions over {options.threshold:.0%}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -1,10 +1,296 @@
 import random
-from pynput import keyboard
 import os
-import copy
 import typing
 import time
 import sys
+import threading
+if typing.TYPE_CHECKING:
+    #asyncio takes most of the import time and only the interactive game needs it, the functions using it import it themselves
+    import asyncio
+
+#The packed board stores grids up to 4x4 in one integer, 4 bits per tile exponent, tile (x, y) is the nibble number 4*y + x
+#Key presses waiting for the game beyond this many are dropped, so holding a key down can not queue up moves
+KEY_QUEUE_SIZE: int = 32
+#Time in seconds to press ESC after SPACE to pause the game
+PAUSE_CONFIRM_SECONDS: float = 1.0
+#Key showing the suggested direction, pressing it does not cancel the hint being computed
+HINT_KEY: str = "h"
+ROW_MASK: int = 0xFFFF
+NIBBLE_LOW_BITS: int = 0x1111111111111111
+NIBBLE_HIGH_BITS: int = 0x8888888888888888
+MAX_PACKED_LEVEL: int = 15
+#States kept for undos in practice mode by default, so a long practice game (or a server session) can not grow without a limit
+PRACTICE_HISTORY_SIZE: int = 16384
+#Fields of the merge info tables, score is stored above them
+MERGE_INFO_128: int = 0
+MERGE_INFO_256: int = 4
+MERGE_INFO_512: int = 8
+MERGE_INFO_OVERFLOW: int = 12
+MERGE_INFO_SCORE: int = 16
+#The random generator of a game is xorshift64*, its whole state is one 64 bit integer
+RANDOM_MASK: int = 0xFFFFFFFFFFFFFFFF
+RANDOM_MULTIPLIER: int = 0x2545F4914F6CDD1D
+_padded_tiles: typing.Dict[typing.Tuple[str, int, bool], str] = {}
+#Strings of the tiles by their exponent shared by all games, grows when a game makes a higher tile
+TILE_STRINGS: typing.List[str] = ["", "2", "4"]
+#Empty boards by their size, shared by all games without a custom grid
+_empty_grids: typing.Dict[typing.Tuple[int, int], typing.List[typing.List[int]]] = {}
+_row_tables: typing.Dict[int, typing.Tuple[typing.List[int], typing.List[int], typing.List[int], typing.List[int], typing.List[int], typing.List[int]]] = {}
+
+def merge_row(row: typing.List[int])-> typing.Tuple[typing.List[int], typing.List[int]]:
+    """Move a row of tile exponents to the left, return the new row and the exponents of the merged tiles
+
+    If three tiles are next to each other, only the first two merge"""
+    tiles: typing.List[int] = [tile for tile in row if tile != 0]
+    new_row: typing.List[int] = []
+    merged_levels: typing.List[int] = []
+    next_tile_used: bool = False
+    for tile_index, tile in enumerate(tiles):
+        if tile_index == len(tiles) - 1:
+            next_tile = 0
+        else:
+            next_tile = tiles[tile_index + 1]
+        if next_tile == tile and not next_tile_used:
+            new_row.append(tile + 1)
+            merged_levels.append(tile + 1)
+            next_tile_used = True
+        elif not next_tile_used:
+            new_row.append(tile)
+        else:
+            next_tile_used = False
+
+    new_row.extend([0] * (len(row) - len(new_row)))
+    return new_row, merged_levels
+
+def pack_grid(grid: typing.List[typing.List[int]])-> int:
+    """Pack a grid of exponents up to 15 with at most 4 rows and 4 columns into an integer"""
+    board: int = 0
+    for row_index, row in enumerate(grid):
+        for tile_index, tile in enumerate(row):
+            board |= tile << (16*row_index + 4*tile_index)
+    return board
+
+def unpack_board(board: int, rows: int = 4, cols: int = 4)-> typing.List[typing.List[int]]:
+    """Unpack an integer made by pack_grid back into a grid with the said number of rows and columns"""
+    return [[(board >> (16*row_index + 4*tile_index)) & 0xF for tile_index in range(cols)] for row_index in range(rows)]
+
+def board_mask(rows: int = 4, cols: int = 4)-> int:
+    """Return a mask with the lowest bit of every tile of a packed board with the said number of rows and columns set"""
+    return sum(1 << (16*row_index + 4*tile_index) for row_index in range(rows) for tile_index in range(cols))
+
+def get_row_tables(length: int = 4)-> typing.Tuple[typing.List[int], typing.List[int], typing.List[int], typing.List[int], typing.List[int], typing.List[int]]:
+    """Return the tables for moving packed rows of the said length (1 to 4), they are built on the first call
+
+    Returns left, right, up and down tables indexed by a packed row, the merge info table shared by all directions
+    and a table of moves changing the row (1 for left, 4 for right), up and down tables return the row spread over a column (4 bits every 16 bits).
+    Rows shorter than 4 tiles are stored in the lowest nibbles, so left, up and merge info tables are the same for all lengths"""
+    tables: typing.Tuple[typing.List[int], typing.List[int], typing.List[int], typing.List[int], typing.List[int], typing.List[int]] | None = _row_tables.get(length)
+    if tables is not None:
+        return tables
+
+    spread_row = lambda row: (row & 0xF) | ((row & 0xF0) << 12) | ((row & 0xF00) << 24) | ((row & 0xF000) << 36)
+    if _row_tables:
+        left_table, right_table, up_table, down_table, merge_info_table, legal_table = next(iter(_row_tables.values()))
+    else:
+        left_table: typing.List[int] = [0] * 65536
+        merge_info_table: typing.List[int] = [0] * 65536
+        for row in range(65536):
+            new_row, merged_levels = merge_row([(row >> shift) & 0xF for shift in (0, 4, 8, 12)])
+            merge_info: int = 0
+            for level in merged_levels:
+                merge_info += 2**level << MERGE_INFO_SCORE
+                if level == 7:
+                    merge_info += 1 << MERGE_INFO_128
+                elif level == 8:
+                    merge_info += 1 << MERGE_INFO_256
+                elif level == 9:
+                    merge_info += 1 << MERGE_INFO_512
+                elif level > MAX_PACKED_LEVEL:
+                    merge_info += 1 << MERGE_INFO_OVERFLOW
+            left_table[row] = sum((tile & 0xF) << shift for tile, shift in zip(new_row, (0, 4, 8, 12)))
+            merge_info_table[row] = merge_info
+        up_table: typing.List[int] = [spread_row(row) for row in left_table]
+
+    if length == 4:
+        reverse_row = lambda row: ((row & 0xF) << 12) | ((row & 0xF0) << 4) | ((row >> 4) & 0xF0) | (row >> 12)
+    else:
+        reverse_row = lambda row: sum(((row >> 4*tile_index) & 0xF) << 4*(length - 1 - tile_index) for tile_index in range(length))
+    #Equal tiles are merged in pairs either way, so moving right scores the same as moving left
+    right_table: typing.List[int] = [reverse_row(left_table[reverse_row(row)]) for row in range(65536)]
+    down_table: typing.List[int] = [spread_row(row) for row in right_table]
+    legal_table: typing.List[int] = [(left_table[row] != row) | ((right_table[row] != row) << 2) for row in range(65536)]
+    _row_tables[length] = (left_table, right_table, up_table, down_table, merge_info_table, legal_table)
+    return _row_tables[length]
+
+def transpose_board(board: int)-> int:
+    """Transpose a packed board, rows become columns"""
+    a1: int = board & 0xF0F00F0FF0F00F0F
+    a2: int = board & 0x0000F0F00000F0F0
+    a3: int = board & 0x0F0F00000F0F0000
+    board = a1 | (a2 << 12) | (a3 >> 12)
+    b1: int = board & 0xFF00FF0000FF00FF
+    b2: int = board & 0x00FF00FF00000000
+    b3: int = board & 0x00000000FF00FF00
+    return b1 | (b2 >> 24) | (b3 << 24)
+
+def empty_mask(board: int)-> int:
+    """Return a mask with the lowest bit of every empty tile of a packed board set
+
+    Tiles outside of boards smaller than 4x4 count as empty, use board_mask() to leave them out"""
+    board |= board >> 1
+    board |= board >> 2
+    return ~board & NIBBLE_LOW_BITS
+
+def move_board(board: int, direction: int, rows: int = 4, cols: int = 4)-> typing.Tuple[int, int]:
+    """Do a raw move on a packed board, return the new board and the summed merge info of its rows
+
+    Parameters:
+
+        direction = an integer, 0 means left, going up by 1 rotates the direction by 90 degrees clockwise
+
+        rows, cols = integers up to 4, the size of the board
+    """
+    direction %= 4
+    if direction % 2 == 1:
+        left_table, right_table, up_table, down_table, merge_info_table, legal_table = get_row_tables(rows)
+        board = transpose_board(board)
+    else:
+        left_table, right_table, up_table, down_table, merge_info_table, legal_table = get_row_tables(cols)
+    row_0: int = board & ROW_MASK
+    row_1: int = (board >> 16) & ROW_MASK
+    row_2: int = (board >> 32) & ROW_MASK
+    row_3: int = board >> 48
+    merge_info: int = merge_info_table[row_0] + merge_info_table[row_1] + merge_info_table[row_2] + merge_info_table[row_3]
+    if direction == 0:
+        new_board: int = left_table[row_0] | (left_table[row_1] << 16) | (left_table[row_2] << 32) | (left_table[row_3] << 48)
+    elif direction == 2:
+        new_board: int = right_table[row_0] | (right_table[row_1] << 16) | (right_table[row_2] << 32) | (right_table[row_3] << 48)
+    elif direction == 1:
+        new_board: int = up_table[row_0] | (up_table[row_1] << 4) | (up_table[row_2] << 8) | (up_table[row_3] << 12)
+    else:
+        new_board: int = down_table[row_0] | (down_table[row_1] << 4) | (down_table[row_2] << 8) | (down_table[row_3] << 12)
+    return new_board, merge_info
+
+def legal_moves_board(board: int, rows: int = 4, cols: int = 4)-> int:
+    """Return a mask of the directions that change a packed board, bit number n is set if direction n does"""
+    row_legal_table: typing.List[int] = get_row_tables(cols)[5]
+    column_legal_table: typing.List[int] = get_row_tables(rows)[5]
+    columns: int = transpose_board(board)
+    return (row_legal_table[board & ROW_MASK] | row_legal_table[(board >> 16) & ROW_MASK] | row_legal_table[(board >> 32) & ROW_MASK] | row_legal_table[board >> 48]
+            | (column_legal_table[columns & ROW_MASK] | column_legal_table[(columns >> 16) & ROW_MASK] | column_legal_table[(columns >> 32) & ROW_MASK] | column_legal_table[columns >> 48]) << 1)
+
+def legal_moves_grid(grid: typing.List[typing.List[int]])-> int:
+    """Same as legal_moves_board() for a 2D list of tile exponents"""
+    legal_mask: int = 0
+    for lines, direction_bit in ((grid, 1), (zip(*grid), 2)):
+        for line in lines:
+            for tile, next_tile in zip(line, line[1:]):
+                if tile == 0:
+                    if next_tile != 0:
+                        legal_mask |= direction_bit
+                elif next_tile == 0 or tile == next_tile:
+                    legal_mask |= direction_bit << 2 if next_tile == 0 else direction_bit | (direction_bit << 2)
+    return legal_mask
+
+def seed_random_state(seed: int)-> int:
+    """Return the starting state of the random generator of a game for a seed, the seed is mixed by splitmix64 so close seeds give unrelated games"""
+    state: int = ((seed & RANDOM_MASK) + 0x9E3779B97F4A7C15) & RANDOM_MASK
+    state = ((state ^ (state >> 30)) * 0xBF58476D1CE4E5B9) & RANDOM_MASK
+    state = ((state ^ (state >> 27)) * 0x94D049BB133111EB) & RANDOM_MASK
+    state ^= state >> 31
+    #xorshift never leaves the zero state
+    return state or RANDOM_MULTIPLIER
+
+def pad_tile(tile_string: str, column_max_length: int, last_column: bool)-> str:
+    """Return the tile string centered in its column, the padded strings are cached"""
+    key: typing.Tuple[str, int, bool] = (tile_string, column_max_length, last_column)
+    padded_tile: str | None = _padded_tiles.get(key)
+    if padded_tile is None:
+        padded_length: int = column_max_length - len(tile_string)
+        front_padding: int = padded_length//2 + 1
+        back_padding: int = front_padding + padded_length%2
+        if last_column:
+            back_padding = 0
+        padded_tile = " "*front_padding + tile_string + " "*back_padding
+        _padded_tiles[key] = padded_tile
+    return padded_tile
+
+class MoveHistory:
+    """Ring buffer of game states used for undoing moves, the oldest state is overwritten once it is full
+
+    A state is the packed board (an integer) or the tile exponents of the list engine as bytes, its score and powerup uses left.
+    The buffer grows up to its capacity and then only reuses its slots, a capacity of -1 never overwrites any state
+
+    Methods:
+    self.push(board, score, swaps_left, deletes_left) - Stores a state
+    self.pop() - Removes and returns the newest state
+    self.peek() - Returns the newest state without removing it
+    self.states() - Returns the stored states, oldest first
+    """
+    __slots__ = ("capacity", "boards", "stats", "start", "length")
+
+    def __init__(self, capacity: int):
+        self.capacity: int = capacity
+        self.boards: typing.List[int | bytes] = []
+        self.stats: typing.List[int] = []
+        self.start: int = 0
+        self.length: int = 0
+
+    def __len__(self)-> int:
+        return self.length
+
+    def push(self, board: int | bytes, score: int, swaps_left: int, deletes_left: int):
+        """Store a state, the powerup uses are packed together with the score"""
+        if self.capacity == 0:
+            return
+        stats: int = (score << 16) | ((swaps_left + 1) << 8) | (deletes_left + 1)
+        if self.length == self.capacity:
+            self.boards[self.start] = board
+            self.stats[self.start] = stats
+            self.start = (self.start + 1) % self.capacity
+            return
+        end: int = self.start + self.length
+        if self.capacity != -1:
+            end %= self.capacity
+        if end == len(self.boards):
+            self.boards.append(board)
+            self.stats.append(stats)
+        else:
+            self.boards[end] = board
+            self.stats[end] = stats
+        self.length += 1
+
+    def pop(self)-> typing.Tuple[int | bytes, int, int, int]:
+        """Remove the newest state and return its board, score, swaps left and deletes left"""
+        if self.length == 0:
+            raise IndexError("pop from empty MoveHistory")
+        self.length -= 1
+        end: int = self.start + self.length
+        if self.capacity != -1:
+            end %= self.capacity
+        stats: int = self.stats[end]
+        return self.boards[end], stats >> 16, ((stats >> 8) & 0xFF) - 1, (stats & 0xFF) - 1
+
+    def peek(self)-> typing.Tuple[int | bytes, int, int, int]:
+        """Return the newest state in the same form as self.pop() returns it, without removing it"""
+        if self.length == 0:
+            raise IndexError("peek from empty MoveHistory")
+        end: int = self.start + self.length - 1
+        if self.capacity != -1:
+            end %= self.capacity
+        stats: int = self.stats[end]
+        return self.boards[end], stats >> 16, ((stats >> 8) & 0xFF) - 1, (stats & 0xFF) - 1
+
+    def states(self, first: int = 0)-> typing.List[typing.Tuple[int | bytes, int, int, int]]:
+        """Return the states from number first on, oldest first, in the same form as self.pop() returns them"""
+        states: typing.List[typing.Tuple[int | bytes, int, int, int]] = []
+        for state_index in range(first, self.length):
+            slot: int = self.start + state_index
+            if self.capacity != -1:
+                slot %= self.capacity
+            stats: int = self.stats[slot]
+            states.append((self.boards[slot], stats >> 16, ((stats >> 8) & 0xFF) - 1, (stats & 0xFF) - 1))
+        return states
 
 class Game2048:
     """Class describing a game of 2048
@@ -15,7 +301,14 @@ class Game2048:
     self.undo() - Undoes the last move if supported
     self.swap() - Swaps two tiles if supported
     self.delete() - Deletes all tiles with that number if supported
+    self.legal_moves() - Returns a mask of the directions that would change the board
+    self.get_tile(coords) - Returns the tile exponent on the [x, y] coordinates
     """
+    __slots__ = ("engine", "packed", "board", "_grid", "_legal_mask", "seed", "random_state", "start_time", "rows", "cols", "cells_mask",
+                 "original_grid", "custom_grid", "game_state", "score", "moves", "powerup_mode", "practice", "powerups", "powerups_used",
+                 "undos_left", "swaps_left", "deletes_left", "moves_limit", "practice_history", "history", "lose_time")
+    tiles: typing.List[str] = TILE_STRINGS
+
     def __str__(self)-> str:
         """Return a string representation of the board and statistics"""
         additional_info: str = ""
@@ -29,23 +322,14 @@ class Game2048:
         if self.practice:
             secondary_add_info += " (PRACTICE MODE)"
         result: str = f"Score: {self.score}, Moves: {self.moves}{secondary_add_info}{additional_info}"
-        max_character_lengths: typing.List[int] = [len(self.tiles[max(column)]) for column in zip(*self.grid)]
-        for row in self.grid:
-            result += "\n"
-            first: bool = True
-            for tile, tile_index, column_max_length in zip(row, range(len(row)), max_character_lengths):
-                tile_string: str = self.tiles[tile]
-                padded_length: int = column_max_length - len(tile_string)
-                front_padding: int = padded_length//2 + 1
-                back_padding: int = front_padding + padded_length%2
-                if tile_index == len(row) - 1:
-                    back_padding = 0
-                tile_string: str = " "*front_padding + tile_string + " "*back_padding
-                if first:
-                    first = False
-                else:
-                    tile_string = "|" + tile_string
-                result += tile_string
+        grid: typing.List[typing.List[int]] = self.grid
+        self._extend_tiles(max([max(row) for row in grid]))
+        max_character_lengths: typing.List[int] = [len(self.tiles[max(column)]) for column in zip(*grid)]
+        board_lines: typing.List[str] = [result]
+        last_index: int = len(max_character_lengths) - 1
+        for row in grid:
+            board_lines.append("|".join([pad_tile(self.tiles[tile], column_max_length, tile_index == last_index) for tile_index, (tile, column_max_length) in enumerate(zip(row, max_character_lengths))]))
+        result = "\n".join(board_lines)
         if self.powerups:
             result += f"\nUndos left: {self.undos_left}, swaps left: {self.swaps_left}, deletes left: {self.deletes_left}"
         if self.game_state < 0:
@@ -70,36 +354,118 @@ class Game2048:
 
         return result
 
+    @property
+    def grid(self)-> typing.List[typing.List[int]]:
+        """The board as a 2D list of tile exponents, a new list is returned while the packed engine is used"""
+        if self.packed:
+            return unpack_board(self.board, self.rows, self.cols)
+        return self._grid
+
+    @grid.setter
+    def grid(self, new_grid: typing.List[typing.List[int]]):
+        """Set the board, the packed engine is used whenever the board fits into it (up to 4x4 and tiles up to 32768)"""
+        if self.engine == "bitboard" and len(new_grid) <= 4 and len(new_grid[0]) <= 4 and max([max(row) for row in new_grid]) <= MAX_PACKED_LEVEL:
+            self.packed = True
+            self.board = pack_grid(new_grid)
+            self._grid = []
+        else:
+            self.packed = False
+            self.board = 0
+            #Spawning changes the rows in place, so they are copied
+            self._grid = [list(row) for row in new_grid]
+        self._legal_mask = -1
+
+    def get_tile(self, coords: typing.List[int])-> int:
+        """Return the tile exponent on the [x, y] coordinates"""
+        return self.grid[coords[1]][coords[0]]
+
+    def _extend_tiles(self, max_number: int):
+        """Make sure self.tiles, which is shared by all games, has a string for every tile up to max_number"""
+        while max_number >= len(self.tiles):
+            self.tiles.append(str(2*int(self.tiles[-1])))
+
+    def _grant_powerups(self, merges_128: int, merges_256: int, merges_512: int):
+        """Give powerup uses for the merged 128, 256 and 512 tiles"""
+        if not self.powerups:
+            return
+        if merges_128 and not self.practice:
+            self.undos_left = min(self.undos_left + merges_128, 2)
+        if merges_256:
+            self.swaps_left = min(self.swaps_left + merges_256, 2)
+        if merges_512:
+            self.deletes_left = min(self.deletes_left + merges_512, 2)
+
     def _snapshot(self):
-        self.moves_list.append((copy.deepcopy(self.grid), self.score, (self.swaps_left, self.deletes_left)))
-        if len(self.moves_list) > self.moves_limit:
-            self.moves_list.pop(0)
+        if self.packed:
+            self.history.push(self.board, self.score, self.swaps_left, self.deletes_left)
+        else:
+            self.history.push(bytes([tile for row in self.grid for tile in row]), self.score, self.swaps_left, self.deletes_left)
+
+    def _set_board(self, board: int | bytes):
+        """Set the board from a state of self.history, a packed board (an integer) or the tile exponents as bytes"""
+        if isinstance(board, int):
+            self.packed = True
+            self.board = board
+            self._grid = []
+            self._legal_mask = -1
+        else:
+            self.grid = [list(board[row_start_index:row_start_index + self.cols]) for row_start_index in range(0, len(board), self.cols)]
+
+    def _random(self)-> float:
+        """Advance the xorshift64* generator of the game and return a float from 0 up to 1, the same as random.random() returns"""
+        state: int = self.random_state
+        state ^= state >> 12
+        state ^= (state << 25) & RANDOM_MASK
+        state ^= state >> 27
+        self.random_state = state
+        return (((state * RANDOM_MULTIPLIER) & RANDOM_MASK) >> 11) * 1.1102230246251565e-16
 
     def _spawn(self)-> typing.Literal[-1, 1, 2]:
         """Spawn a 2 or 4 tile at random empty position of the grid"""
-        flattened_grid: typing.List[int] = []
-        for row in self.grid:
-            flattened_grid.extend(row)
-        
-        empty_spots: int = flattened_grid.count(0)
+        if self.packed:
+            return self._spawn_packed()
+        empty_spots: int = sum([row.count(0) for row in self._grid])
         if empty_spots == 0:
             return -1
         
-        new_spot: int = (empty_spots * random.random()).__floor__()
+        new_spot: int = (empty_spots * self._random()).__floor__()
         chosen_level: int
-        if random.random() > 0.9:
+        if self._random() > 0.9:
             chosen_level = 2
         else:
             chosen_level = 1
-        current_spot: int = 0
-        for tile_index, tile in enumerate(flattened_grid):
-            if tile == 0 and current_spot == new_spot:
-                flattened_grid[tile_index] = chosen_level
+        #The tile is placed in place, empty tiles are counted row by row the same way as in the flattened grid
+        for row in self._grid:
+            row_empty_spots: int = row.count(0)
+            if new_spot < row_empty_spots:
+                for tile_index, tile in enumerate(row):
+                    if tile == 0:
+                        if new_spot == 0:
+                            row[tile_index] = chosen_level
+                            break
+                        new_spot -= 1
                 break
-            elif tile == 0:
-                current_spot += 1
-        
-        self.grid = [flattened_grid[row_start_index:row_start_index + 4] for row_start_index in range(0, len(flattened_grid), len(self.grid))]
+            new_spot -= row_empty_spots
+        self._legal_mask = -1
+        return chosen_level
+
+    def _spawn_packed(self)-> typing.Literal[-1, 1, 2]:
+        """Same as self._spawn() for the packed board, the random numbers are drawn the same way"""
+        empty_tiles: int = empty_mask(self.board) & self.cells_mask
+        empty_spots: int = empty_tiles.bit_count()
+        if empty_spots == 0:
+            return -1
+
+        new_spot: int = (empty_spots * self._random()).__floor__()
+        chosen_level: int
+        if self._random() > 0.9:
+            chosen_level = 2
+        else:
+            chosen_level = 1
+        for i in range(new_spot):
+            empty_tiles &= empty_tiles - 1
+        self.board |= chosen_level << ((empty_tiles & -empty_tiles).bit_length() - 1)
+        self._legal_mask = -1
         return chosen_level
 
     def _move(self, direction: int, check_only: bool = False)-> typing.Literal[-1, 0, 1, 2]:
@@ -111,90 +477,103 @@ class Game2048:
 
             check_only = a boolean, denoting if the move should change the board and statistics, used by _check method
         """
+        if self.packed:
+            return self._move_packed(direction, check_only)
         #left - 0, up - 1, right - 2, down - 3
         direction %= 4
-        rotated_grid = self.grid.copy()
-        for i in range(direction):
-            rotated_grid = list(map(list, zip(*rotated_grid)))[::-1]
+        #Rows are moved to the left, columns are used for up and down and reversed for right and down
+        lines: typing.List[typing.List[int]] | typing.Iterator[typing.Tuple[int, ...]] = self._grid if direction % 2 == 0 else zip(*self._grid)
+        reverse: bool = direction >= 2
 
         empty_available: bool = False
         definitely_changed: bool = False
-        new_tiles: typing.List[str] = self.tiles.copy()
-        new_score = self.score
-        new_rotated_grid: typing.List[typing.List[int]] = []
-        for row_index, row in enumerate(copy.deepcopy(rotated_grid)):
-            if row.count(0) != 0:
+        merged_levels: typing.List[int] = []
+        new_lines: typing.List[typing.List[int]] = []
+        for line in lines:
+            line = list(line[::-1]) if reverse else list(line)
+            if 0 in line:
                 empty_available = True
-            non_empty_seen: bool = False
-            for tile in row[::-1]:
-                if tile != 0:
-                    non_empty_seen = True
-                elif non_empty_seen:
-                    definitely_changed = True
-            for tile in range(row.count(0)):
-                row.remove(0)
-
-            new_row: typing.List[int] = []
-            next_tile_used: bool = False
-            for tile_index, tile in enumerate(row):
-                if tile_index == len(row) - 1:
-                    next_tile = 0
-                else:
-                    next_tile = row[tile_index + 1]
-                if next_tile == tile and not next_tile_used:
-                    new_row.append(tile + 1)
-                    while tile + 1 >= len(new_tiles):
-                        new_tiles.append(str(2*int(new_tiles[-1])))
-                    new_score += int(new_tiles[tile + 1])
-                    if self.powerups:
-                        if tile == 6 and not self.practice:
-                            self.undos_left = min(self.undos_left + 1, 2)
-                        elif tile == 7:
-                            self.swaps_left = min(self.swaps_left + 1, 2)
-                        elif tile == 8:
-                            self.deletes_left = min(self.deletes_left + 1, 2)
-                    next_tile_used = True
-                    empty_available = True
-                    definitely_changed = True
-                elif not next_tile_used:
-                    new_row.append(tile)
-                else:
-                    next_tile_used = False
-
-            new_row.extend([0] * (len(self.grid[0]) - len(new_row)))
-            new_rotated_grid.append(new_row)
+            new_line, line_merged_levels = merge_row(line)
+            if line_merged_levels:
+                empty_available = True
+                merged_levels.extend(line_merged_levels)
+            if new_line != line:
+                definitely_changed = True
+            if reverse:
+                new_line.reverse()
+            new_lines.append(new_line)
 
         if not empty_available:
             return -1
         elif check_only or not definitely_changed:
             return 0
         else:
-            for i in range(direction):
-                new_rotated_grid = list(map(list, zip(*new_rotated_grid[::-1])))
+            if direction % 2 == 1:
+                new_lines = list(map(list, zip(*new_lines)))
+            if merged_levels:
+                self._extend_tiles(max(merged_levels))
+            self._grant_powerups(merged_levels.count(7), merged_levels.count(8), merged_levels.count(9))
             self._snapshot()
-            self.grid = new_rotated_grid
-            self.tiles = new_tiles
-            self.score = new_score
+            self.grid = new_lines
+            self.score += sum([int(self.tiles[level]) for level in merged_levels])
             self.moves += 1
             spawn_level: typing.Literal[-1, 1, 2] = self._spawn()
             return spawn_level
 
+    def _move_packed(self, direction: int, check_only: bool = False)-> typing.Literal[-1, 0, 1, 2]:
+        """Same as self._move() for the packed board"""
+        new_board, merge_info = move_board(self.board, direction, self.rows, self.cols)
+        if new_board == self.board:
+            if empty_mask(self.board) & self.cells_mask == 0:
+                return -1
+            return 0
+        elif check_only:
+            return 0
+        elif (merge_info >> MERGE_INFO_OVERFLOW) & 0xF:
+            #The merged tile does not fit into 4 bits, continue with the list engine
+            self._grid = unpack_board(self.board, self.rows, self.cols)
+            self.packed = False
+            return self._move(direction)
+
+        if merge_info & 0xFFF:
+            self._grant_powerups((merge_info >> MERGE_INFO_128) & 0xF, (merge_info >> MERGE_INFO_256) & 0xF, (merge_info >> MERGE_INFO_512) & 0xF)
+        self._snapshot()
+        self.board = new_board
+        self._legal_mask = -1
+        self.score += merge_info >> MERGE_INFO_SCORE
+        self.moves += 1
+        spawn_level: typing.Literal[-1, 1, 2] = self._spawn()
+        return spawn_level
+
     def _check(self)-> typing.Literal[-3, -2, -1, 1, 2, 3]:
         """Check the game_state and update accordingly in case"""
-        max_number: int = max([max(row) for row in self.grid])
-        if max_number == 11 and abs(self.game_state) == 1:
-            self.game_state *= 2
-
-        for direction in range(4):
-            if self._move(direction, True) != -1:
-                break
+        if self.packed:
+            #The game is won only when 2048 is the highest tile, same as max_number == 11
+            if abs(self.game_state) == 1 and empty_mask(self.board ^ (11*NIBBLE_LOW_BITS)) and not self.board & (self.board << 1) & NIBBLE_HIGH_BITS:
+                self.game_state *= 2
         else:
+            max_number: int = max([max(row) for row in self.grid])
+            if max_number == 11 and abs(self.game_state) == 1:
+                self.game_state *= 2
+
+        if self.legal_moves() == 0:
             self.game_state *= -1
             self.lose_time = time.time()
             return self.game_state
         self.game_state = abs(self.game_state)
         return self.game_state
 
+    def legal_moves(self)-> int:
+        """Return a mask of the directions that would change the board, bit number n is set if direction n does
+
+        The mask is computed once per board and reset whenever the board changes"""
+        if self._legal_mask == -1:
+            if self.packed:
+                self._legal_mask = legal_moves_board(self.board, self.rows, self.cols)
+            else:
+                self._legal_mask = legal_moves_grid(self.grid)
+        return self._legal_mask
+
     def public_move(self, direction: int)-> bool:
         """Make a move in any direction
         
@@ -212,15 +591,12 @@ class Game2048:
         "Undo a move"
         if self.undos_left == 0:
             return -1
-        elif len(self.moves_list) == 0:
+        elif len(self.history) == 0:
             return -2
         
-        new_game_position: typing.Tuple[typing.List[typing.List[int]], int] = self.moves_list.pop()
-        self.grid = new_game_position[0]
-        self.score = new_game_position[1]
+        board, self.score, self.swaps_left, self.deletes_left = self.history.pop()
+        self._set_board(board)
         self.undos_left = max(self.undos_left - 1, -1)
-        self.swaps_left = new_game_position[2][0]
-        self.deletes_left = new_game_position[2][1]
         self.powerups_used += 1
 
         self._check()
@@ -236,8 +612,10 @@ class Game2048:
         self._snapshot()
         coord_1_tile: int = self.get_tile(coord_1)
         coord_2_tile: int = self.get_tile(coord_2)
-        self.grid[coord_1[1]][coord_1[0]] = coord_2_tile
-        self.grid[coord_2[1]][coord_2[0]] = coord_1_tile
+        new_grid: typing.List[typing.List[int]] = self.grid
+        new_grid[coord_1[1]][coord_1[0]] = coord_2_tile
+        new_grid[coord_2[1]][coord_2[0]] = coord_1_tile
+        self.grid = new_grid
         self.swaps_left = max(self.swaps_left - 1, -1)
         self.powerups_used += 1
         self.moves += 1
@@ -254,7 +632,7 @@ class Game2048:
         
         self._snapshot()
         deleted_number = self.get_tile(coordinates)
-        new_grid = [[0 if tile == deleted_number else tile for tile in enumerate(row)] for row in self.grid]
+        new_grid = [[0 if tile == deleted_number else tile for tile in row] for row in self.grid]
         self.grid = new_grid
         self.deletes_left = max(self.deletes_left - 1, -1)
         self.powerups_used += 1
@@ -263,39 +641,68 @@ class Game2048:
         self._check()
         return 0
 
-    def restart(self, *, custom_grid: typing.List[typing.List[int]] | None = None, powerup_mode: typing.Literal[0, 1, 2] | None = None):
+    def restart(self, *, custom_grid: typing.List[typing.List[int]] | None = None, powerup_mode: typing.Literal[0, 1, 2] | None = None, engine: typing.Literal["bitboard", "list"] | None = None, seed: int | None = None,
+                rows: int | None = None, cols: int | None = None, practice_history: int | None = None):
         """Sets all the main variables, is used by __init__
         
         Parameters:
 
-            custom_grid = a 2D 4x4 list of integers, corresponding to the board the game will start with
+            custom_grid = a 2D list of integers, corresponding to the board the game will start with, its size overrides rows and cols
+
+            powerup_mode = 0 (default) disables any powerups, 1 enables them and 2 starts the game with practice mode
+
+            engine = "bitboard" (default) packs the board into an integer and moves it with precomputed row tables,
+            "list" always keeps the board as a 2D list. The bitboard engine falls back to the list one for tiles above 32768
 
-            powerup_mode = 0 (default) disables any powerups, 1 enables them and 2 starts the game with practice mode"""
+            seed = an integer seeding the random generator of the game, the same seed and moves always lead to the same game.
+            None (default) draws a new seed from the random module
+
+            rows, cols = integers, the size of the board, 4x4 by default. Boards up to 4x4 can use the bitboard engine
+
+            practice_history = an integer, how many moves practice mode can undo in a row, PRACTICE_HISTORY_SIZE by default.
+            -1 keeps every state of the game, so its memory grows with every move"""
+        if hasattr(self, "engine") and engine is None:
+            engine = self.engine
+        elif engine is None:
+            engine = "bitboard"
+        self.engine: typing.Literal["bitboard", "list"] = engine
+        self.packed: bool = False
+        self.board: int = 0
+        self._legal_mask: int = -1
+        if seed is None:
+            seed = random.getrandbits(64)
+        self.seed: int = seed
+        self.random_state: int = seed_random_state(seed)
         self.start_time: float = time.time()
         self.grid: typing.List[typing.List[int]]
         self.custom_grid: bool
         self.original_grid: typing.List[typing.List[int]]
-        if hasattr(self, "original_grid") and custom_grid is None:
-            self.grid = self.original_grid
-        elif custom_grid is None:
-            self.grid = [[0]*4] * 4
-            self.original_grid = [[0]*4] * 4
-            self.custom_grid = False
-        else:
-            self.grid: typing.List[typing.List[int]] = custom_grid.copy()
-            self.original_grid = custom_grid.copy()
+        if custom_grid is not None:
+            rows, cols = len(custom_grid), len(custom_grid[0])
+        if rows is None:
+            rows = self.rows if hasattr(self, "rows") else 4
+        if cols is None:
+            cols = self.cols if hasattr(self, "cols") else 4
+        if rows < 2 or cols < 2 or rows > 16 or cols > 16:
+            raise ValueError("The board must have between 2 and 16 rows and columns")
+        self.rows: int = rows
+        self.cols: int = cols
+        self.cells_mask: int = board_mask(rows, cols)
+        if custom_grid is not None:
+            self.original_grid = [list(row) for row in custom_grid]
             self.custom_grid = True
+        elif not hasattr(self, "original_grid") or len(self.original_grid) != rows or len(self.original_grid[0]) != cols:
+            self.original_grid = _empty_grids.setdefault((rows, cols), [[0]*cols for i in range(rows)])
+            self.custom_grid = False
+        self.grid = self.original_grid
 
         self.game_state: typing.Literal[-2, -1, 1, 2] = 1
-        self.tiles: typing.List[str] = ["", "2", "4"]
         self.score: int = 0
         self.moves: int = 0
         self._spawn()
         self._spawn()
 
-        max_number: int = max([max(row) for row in self.grid])
-        while max_number >= len(self.tiles):
-            self.tiles.append(str(2*int(self.tiles[-1])))
+        self._extend_tiles(max([max(row) for row in self.grid]))
 
         if hasattr(self, "powerup_mode") and powerup_mode is None:
             powerup_mode = self.powerup_mode
@@ -317,38 +724,139 @@ class Game2048:
             self.swaps_left: int = 0
             self.deletes_left: int = 0
             self.moves_limit: int = 0
+        if hasattr(self, "practice_history") and practice_history is None:
+            practice_history = self.practice_history
+        elif practice_history is None:
+            practice_history = PRACTICE_HISTORY_SIZE
+        self.practice_history: int = practice_history
         if self.practice:
             self.undos_left: int = -1
-            self.moves_limit: int = 128
+            self.moves_limit: int = practice_history
         self._check()
-        self.moves_list: typing.List[typing.Tuple[typing.List[typing.List[int]], int, typing.Tuple[int, int]]] = []
+        self.history: MoveHistory = MoveHistory(self.moves_limit)
         self.lose_time: float = -1.0
-        self.get_tile = lambda coords: self.grid[coords[1]][coords[0]]
 
-    def __init__(self, *, custom_grid: typing.List[typing.List[int]] | None = None, powerup_mode: typing.Literal[0, 1, 2] | None = None):
+    def __init__(self, *, custom_grid: typing.List[typing.List[int]] | None = None, powerup_mode: typing.Literal[0, 1, 2] | None = None, engine: typing.Literal["bitboard", "list"] | None = None, seed: int | None = None,
+                 rows: int | None = None, cols: int | None = None, practice_history: int | None = None):
         """Create a new Game2048 object, its parameters are same self.restart() method"""
-        self.restart(custom_grid = custom_grid, powerup_mode = powerup_mode)
+        self.restart(custom_grid = custom_grid, powerup_mode = powerup_mode, engine = engine, seed = seed, rows = rows, cols = cols,
+                     practice_history = practice_history)
+
 
+class TerminalRenderer:
+    """Draws frames of text on the terminal, only the parts of lines that changed since the last frame are rewritten
+
+    Frames are drawn by a background thread, if more of them are submitted while it is drawing only the newest one is drawn
+
+    Methods:
+    self.submit(frame: str) - Replaces the frame on the screen
+    self.append_line(line: str) - Adds a line under the current frame
+    self.close() - Draws the last frame and moves the cursor under it
+    """
+    def __init__(self, stream: typing.TextIO = sys.stdout):
+        self.stream: typing.TextIO = stream
+        self.lines: typing.List[str] | None = None
+        self.frame: str = ""
+        self.pending: bool = False
+        self._lock: threading.Lock = threading.Lock()
+        self._draw_lock: threading.Lock = threading.Lock()
+        self._event: threading.Event = threading.Event()
+        self._thread: threading.Thread | None = None
+        if os.name == "nt":
+            #Enables ANSI escape codes in the Windows console
+            os.system("")
+
+    def submit(self, frame: str):
+        """Replace the frame on the screen, returns before it is drawn"""
+        with self._lock:
+            self.frame = frame
+            self.pending = True
+        if self._thread is None:
+            self._thread = threading.Thread(target = self._run, daemon = True)
+            self._thread.start()
+        self._event.set()
+
+    def append_line(self, line: str):
+        """Add a line under the current frame"""
+        with self._lock:
+            frame: str = self.frame + "\n" + line
+        self.submit(frame)
+
+    def _run(self):
+        while True:
+            self._event.wait()
+            self._event.clear()
+            self.draw()
+
+    def draw(self):
+        """Draw the newest frame if it was not drawn yet"""
+        with self._draw_lock:
+            with self._lock:
+                if not self.pending:
+                    return
+                self.pending = False
+                lines: typing.List[str] = self.frame.split("\n")
+            output: typing.List[str] = []
+            if self.lines is None:
+                self.lines = []
+                output.append("\x1b[2J")
+            for line_index, line in enumerate(lines):
+                old_line: str | None = self.lines[line_index] if line_index < len(self.lines) else None
+                if line == old_line:
+                    continue
+                start: int = 0
+                if old_line is not None:
+                    while start < min(len(line), len(old_line)) and line[start] == old_line[start]:
+                        start += 1
+                if old_line is not None and len(line) == len(old_line):
+                    end: int = len(line)
+                    while end > start and line[end - 1] == old_line[end - 1]:
+                        end -= 1
+                    output.append(f"\x1b[{line_index + 1};{start + 1}H{line[start:end]}")
+                else:
+                    output.append(f"\x1b[{line_index + 1};{start + 1}H{line[start:]}\x1b[K")
+            if len(self.lines) > len(lines):
+                output.append(f"\x1b[{len(lines) + 1};1H\x1b[J")
+            output.append(f"\x1b[{len(lines) + 1};1H")
+            self.lines = lines
+            self.stream.write("".join(output))
+            self.stream.flush()
+
+    def close(self):
+        """Draw the last frame and move the cursor under it"""
+        self.draw()
+
+renderer: TerminalRenderer | None = None
+
+def get_renderer()-> TerminalRenderer:
+    """Return the renderer of the terminal, it is created on the first call"""
+    global renderer
+    if renderer is None:
+        renderer = TerminalRenderer()
+    return renderer
 
 def refresh(game_object: Game2048):
-    """Clear the command line and reprint the board"""
-    os.system("cls" if os.name == "nt" else "clear")
-    print(str(game_object))
+    """Redraw the board, only the changed parts of the screen are rewritten"""
+    get_renderer().submit(str(game_object))
+
+def show(message: str):
+    """Print a message under the board"""
+    get_renderer().append_line(message)
 
 def set_mode(game_object: Game2048, move_mode: typing.List[int], target_mode: int, coordinates: typing.List[int], coordinates_list: typing.List[typing.List[int]]):
     move_mode.append(target_mode)
-    for i in range(max(game_object.grid, game_object.grid[0])):
+    for i in range(max(game_object.rows, game_object.cols)):
         move_coordinates(game_object, coordinates, 0)
         move_coordinates(game_object, coordinates, 1)
     refresh(game_object)
     if move_mode[-1] == 1:
         move_coordinates(game_object, coordinates, 0)
-        print("Entered swap selection")
+        show("Entered swap selection")
     elif move_mode[-1] == 2:
         move_coordinates(game_object, coordinates, 0)
-        print("Entered deletion selection")
+        show("Entered deletion selection")
     else:
-        print("Exitted tile selection")
+        show("Exitted tile selection")
 
     while len(coordinates) != 0:
         coordinates.pop()
@@ -358,7 +866,7 @@ def set_mode(game_object: Game2048, move_mode: typing.List[int], target_mode: in
 
 def move_coordinates(game_object: Game2048, coordinates: typing.List[int], direction: int):
     """Move coordinates by 1 in the direction and refresh the screen"""
-    convert_coordinates_str = lambda coords: f"{coords[1] + 1}{["A", "B", "C", "D"][coords[0]]}"
+    convert_coordinates_str = lambda coords: f"{coords[1] + 1}{chr(ord("A") + coords[0])}"
     direction %= 4
     if direction == 0:
         coordinates[0] -= 1
@@ -369,21 +877,21 @@ def move_coordinates(game_object: Game2048, coordinates: typing.List[int], direc
     else:
         coordinates[1] += 1
 
-    coordinates[0] = min(3, coordinates[0])
-    coordinates[1] = min(3, coordinates[1])
+    coordinates[0] = min(game_object.cols - 1, coordinates[0])
+    coordinates[1] = min(game_object.rows - 1, coordinates[1])
     coordinates[0] = max(0, coordinates[0])
     coordinates[1] = max(0, coordinates[1])
 
     refresh(game_object)
-    print(f"Current coordinates (1A is top left and 1D is top right): {convert_coordinates_str(coordinates)}")
+    show(f"Current coordinates (1A is top left and {convert_coordinates_str([game_object.cols - 1, 0])} is top right): {convert_coordinates_str(coordinates)}")
 
 def select_coordinates(game_object: Game2048, coordinates_list: typing.List[typing.List[int]], coordinates: typing.List[int]):
     """Put coordinates into the coordinates_list and refreshes the screen"""
-    convert_coordinates_str = lambda coords: f"{coords[1] + 1}{["A", "B", "C", "D"][coords[0]]}"
+    convert_coordinates_str = lambda coords: f"{coords[1] + 1}{chr(ord("A") + coords[0])}"
     coordinates_list.append(coordinates.copy())
     
     refresh(game_object)
-    print(f"Selected {convert_coordinates_str(coordinates)}")
+    show(f"Selected {convert_coordinates_str(coordinates)}")
 
 def submit_coordinates(game_object: Game2048, func: typing.Callable, coordinates_list: typing.List[typing.List[int]], move_mode: int):
     """Swap or delete tiles determined by func, coordinates_list and coordinates"""
@@ -402,11 +910,11 @@ def submit_coordinates(game_object: Game2048, func: typing.Callable, coordinates
     set_mode(game_object, move_mode, 0, [0, 0], coordinates_list)
     refresh(game_object)
     if result == 0:
-        print(f"Tiles successfully {function_name_past}")
+        show(f"Tiles successfully {function_name_past}")
     if result == -1:
-        print(f"You don't have any uses left, make {function_requirement} tiles to get more uses")
+        show(f"You don't have any uses left, make {function_requirement} tiles to get more uses")
     elif result == -2:
-        print(f"Failed to {function_name}")
+        show(f"Failed to {function_name}")
 
 def restart(game_object: Game2048):
     """Restart the game and refresh the screen"""
@@ -428,22 +936,33 @@ def undo(game_object: Game2048):
     result: typing.Literal[-2, -1, 0] = game_object.undo()
     refresh(game_object)
     if result == 0:
-        print("Last move undone")
+        show("Last move undone")
     elif result == -1:
-        print("You don't have any uses left, make 128 tiles to get more uses")
+        show("You don't have any uses left, make 128 tiles to get more uses")
     elif result == -2:
-        print("There is no move you can undo")
+        show("There is no move you can undo")
 
-def start_pause(confirm_await_list):
+def start_pause(confirm_await_list: typing.List[bool], pause_timer: "typing.List[asyncio.TimerHandle]"):
+    """Wait PAUSE_CONFIRM_SECONDS for ESC to pause or unpause the game, must be called inside the event loop"""
+    import asyncio
     confirm_await_list[0] = True
-    print("Waiting for ESC press to pause")
+    pause_timer.append(asyncio.get_running_loop().call_later(PAUSE_CONFIRM_SECONDS, cancel_pause, confirm_await_list, pause_timer))
+    show("Waiting for ESC press to pause")
+
+def cancel_pause(confirm_await_list: typing.List[bool], pause_timer: "typing.List[asyncio.TimerHandle]"):
+    """Stop waiting for ESC after the time to confirm the pause ran out"""
+    pause_timer.clear()
+    confirm_await_list[0] = False
+    show("ESC key was not pressed")
 
-def confirm_pause(game_object: Game2048, paused_list: typing.List[bool], confirm_await_list: typing.List[bool], move_mode: typing.List[int], coordinates: typing.List[int]):
+def confirm_pause(game_object: Game2048, paused_list: typing.List[bool], confirm_await_list: typing.List[bool], pause_timer: "typing.List[asyncio.TimerHandle]", move_mode: typing.List[int], coordinates: typing.List[int]):
     paused_list[0] = not paused_list[0]
     confirm_await_list[0] = False
+    while pause_timer:
+        pause_timer.pop().cancel()
     refresh(game_object)
     if paused_list[0]:
-        print("\nCURRENTLY PAUSED")
+        show("\nCURRENTLY PAUSED")
     elif move_mode[0] != 0:
         if coordinates[1] != 0:
             move_coordinates(game_object, coordinates, 1)
@@ -452,8 +971,190 @@ def confirm_pause(game_object: Game2048, paused_list: typing.List[bool], confirm
             move_coordinates(game_object, coordinates, 3)
             move_coordinates(game_object, coordinates, 1)
 
+def post_key(loop: "asyncio.AbstractEventLoop", key_queue: "asyncio.Queue", key: str):
+    """Hand a key press from the listener thread over to the event loop"""
+    try:
+        loop.call_soon_threadsafe(enqueue_key, key_queue, key)
+    except RuntimeError:
+        #The event loop is already closed while the listener is stopping
+        pass
+
+def enqueue_key(key_queue: "asyncio.Queue", key: str):
+    """Put a key press into the queue, it is dropped if the queue is full"""
+    import asyncio
+    try:
+        key_queue.put_nowait(key)
+    except asyncio.QueueFull:
+        pass
+
+def handle_key(keybinds: typing.Dict[str, typing.Callable], key: str, move_mode: typing.List[int]):
+    """Run the action of a key press"""
+    keybinds[key]()
+    del move_mode[:-1]
+
+def show_hint(game_object: Game2048, hint_engine, hint_wanted: typing.List[bool]):
+    """Show the suggested direction, if it is not computed yet it is shown once it is"""
+    import hints
+    if not hint_engine.supports(game_object):
+        show("Hints are only available on 4x4 boards with tiles up to 32768")
+        return
+    if game_object.game_state < 0:
+        show("There is no move left")
+        return
+    direction: int = hint_engine.get(game_object)
+    if direction == -1:
+        hint_wanted[0] = True
+        hint_engine.request(game_object)
+        show("Thinking about a hint...")
+    else:
+        hint_wanted[0] = False
+        show(f"Hint: move {hints.DIRECTION_NAMES[direction]}")
+
+def game_version(game_object: Game2048)-> typing.Tuple[int, int, int, int]:
+    """Return a tuple which changes whenever a key press changes the board, score or history of the game"""
+    return game_object.board if game_object.packed else -1, game_object.score, game_object.moves, len(game_object.history)
+
+async def consume_keys(key_queue: "asyncio.Queue", keybinds: typing.Dict[str, typing.Callable], move_mode: typing.List[int], game_object: Game2048 | None = None, hint_engine = None):
+    """Run the action of every key press one at a time, this is the only place changing the game while it is played
+
+    An action raising an exception is reported under the board and the next key is handled.
+    Once a hint was asked for, the hint being computed is cancelled whenever a key changes the game and the hint for the new board is started"""
+    while True:
+        key: str = await key_queue.get()
+        try:
+            version: typing.Tuple[int, int, int, int] | None = game_version(game_object) if hint_engine is not None else None
+            handle_key(keybinds, key, move_mode)
+            if hint_engine is not None and game_version(game_object) != version:
+                hint_engine.cancel()
+                if hint_engine.started:
+                    hint_engine.request(game_object)
+        except Exception as error:
+            #A failing action must not end the task, the game would stop reacting to keys while the listener still runs
+            show(f"Pressing {key} failed: {error!r}")
+        finally:
+            key_queue.task_done()
+
+async def play(mode: int, rows: int = 4, cols: int = 4):
+    """Play the game with keybinds until ESC is pressed
+
+    Key presses are queued by the listener thread and handled by a single task of the event loop
+
+    Parameters:
+
+        mode = same as powerup_mode of Game2048.restart()
+
+        rows, cols = integers, the size of the board
+    """
+    import asyncio
+    loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+    key_queue: asyncio.Queue = asyncio.Queue(KEY_QUEUE_SIZE)
+    stop: asyncio.Event = asyncio.Event()
+    move_mode: typing.List[int] = [0]
+    paused_list: typing.List[bool] = [False]
+    confirm_await_list: typing.List[bool] = [False]
+    pause_timer: typing.List[asyncio.TimerHandle] = []
+    coordinates: typing.List[int] = [0, 0]
+    coordinates_list: typing.List[typing.List[int]] = []
+    game: Game2048 = Game2048(powerup_mode = mode, rows = rows, cols = cols)
+    restart(game)
+    hint_wanted: typing.List[bool] = [False]
+    def on_hint(board: int, direction: int):
+        if hint_wanted[0] and game.packed and game.board == board:
+            show_hint(game, hint_engine, hint_wanted)
+    import hints
+    #The worker process is started by the first hint asked for
+    hint_engine: hints.HintEngine = hints.HintEngine(on_hint = on_hint)
+    keybinds: typing.Dict[str, typing.Callable] = {
+        "w": lambda: (move(game, 1) if move_mode[-1] == 0 else move_coordinates(game, coordinates, 1)) if not paused_list[0] else None,
+        "s": lambda: (move(game, 3) if move_mode[-1] == 0 else move_coordinates(game, coordinates, 3)) if not paused_list[0] else None,
+        "a": lambda: (move(game, 0) if move_mode[-1] == 0 else move_coordinates(game, coordinates, 0)) if not paused_list[0] else None,
+        "d": lambda: (move(game, 2) if move_mode[-1] == 0 else move_coordinates(game, coordinates, 2)) if not paused_list[0] else None,
+        "<up>": lambda: (move(game, 1) if move_mode[-1] == 0 else move_coordinates(game, coordinates, 1)) if not paused_list[0] else None,
+        "<down>": lambda: (move(game, 3) if move_mode[-1] == 0 else move_coordinates(game, coordinates, 3)) if not paused_list[0] else None,
+        "<left>": lambda: (move(game, 0) if move_mode[-1] == 0 else move_coordinates(game, coordinates, 0)) if not paused_list[0] else None,
+        "<right>": lambda: (move(game, 2) if move_mode[-1] == 0 else move_coordinates(game, coordinates, 2)) if not paused_list[0] else None,
+        "<enter>": lambda: ((select_coordinates(game, coordinates_list, coordinates) if len(coordinates_list) != 2 else submit_coordinates(game, game.swap, coordinates_list, move_mode)) if move_mode[-1] == 1 else ((select_coordinates(game, coordinates_list, coordinates) if len(coordinates_list) !=1 else submit_coordinates(game, game.delete, coordinates_list, move_mode)) if move_mode[-1] == 2 else restart(game))) if not paused_list[0] else None,
+        "<esc>": lambda: confirm_pause(game, paused_list, confirm_await_list, pause_timer, move_mode, coordinates) if confirm_await_list[0] else ((stop.set() if move_mode[-1] == 0 else set_mode(game, move_mode, 0, coordinates, coordinates_list)) if not paused_list[0] else None),
+        "<space>": lambda: start_pause(confirm_await_list, pause_timer) if not confirm_await_list[0] else None,
+        HINT_KEY: lambda: (show_hint(game, hint_engine, hint_wanted) if move_mode[-1] == 0 else None) if not paused_list[0] else None
+    }
+    if game.powerups:
+        keybinds["<shift>+u"] = lambda: (undo(game) if move_mode[-1] == 0 else None) if not paused_list[0] else None
+        keybinds["<shift>+i"] = lambda: (set_mode(game, move_mode, 1, coordinates, coordinates_list) if move_mode[-1] == 0 and game.swaps_left != 0 else (show("You don't have any uses left, make 256 tiles to get more uses") if game.swaps_left == 0 else None)) if not paused_list[0] else None
+        keybinds["<shift>+o"] = lambda: (set_mode(game, move_mode, 2, coordinates, coordinates_list) if move_mode[-1] == 0 and game.deletes_left != 0 else (show("You don't have any uses left, make 512 tiles to get more uses") if game.deletes_left == 0 else None)) if not paused_list[0] else None
+    consumer: asyncio.Task = asyncio.create_task(consume_keys(key_queue, keybinds, move_mode, game, hint_engine))
+    #The keyboard backend is only loaded for the interactive game, it needs a display server on most systems
+    from pynput import keyboard
+    listener: keyboard.GlobalHotKeys = keyboard.GlobalHotKeys({key: lambda key = key: post_key(loop, key_queue, key) for key in keybinds})
+    listener.start()
+    try:
+        await stop.wait()
+    finally:
+        listener.stop()
+        consumer.cancel()
+        while pause_timer:
+            pause_timer.pop().cancel()
+        hint_engine.close()
+        get_renderer().close()
+
 def main(args: typing.List[str] = [""]):
-    """Start the game of 2048 with keybinds, reacts to keys being pressed even when out of focus"""
+    """Start the game of 2048 with keybinds, reacts to keys being pressed even when out of focus
+
+    Passing --selfplay as the first argument plays games without any rendering instead, see selfplay.main(),
+    --replay verifies recorded games, see replay.main(), --view steps through a recorded game, see replay.view_main(), --server hosts games over TCP, see server.main(),
+    --solve computes exact values of small boards, see solver.main(), --export writes self-play games as training data, see dataset.main(),
+    --analyze reports statistics of recorded games, see analyze.main(), --moves plays a stream of moves from a file or stdin, see movestream.main().
+    --size ROWSxCOLS (for example --size 5x5) changes the size of the board.
+    --profile[=PATH] and --cprofile=PATH measure the game, see profiling.py"""
+    import profiling
+    args, profile_output, cprofile_output = profiling.parse_args(args)
+    if profile_output is not None:
+        profiling.start(sys.modules[__name__], profile_output, cprofile_output)
+    if len(args) > 1 and args[1] == "--selfplay":
+        import selfplay
+        selfplay.main(args[2:])
+        return
+    if len(args) > 1 and args[1] == "--replay":
+        import replay
+        replay.main(args[2:])
+        return
+    if len(args) > 1 and args[1] == "--view":
+        import replay
+        replay.view_main(args[2:])
+        return
+    if len(args) > 1 and args[1] == "--server":
+        import server
+        server.main(args[2:])
+        return
+    if len(args) > 1 and args[1] == "--solve":
+        import solver
+        solver.main(args[2:])
+        return
+    if len(args) > 1 and args[1] == "--export":
+        import dataset
+        dataset.main(args[2:])
+        return
+    if len(args) > 1 and args[1] == "--analyze":
+        import analyze
+        analyze.main(args[2:])
+        return
+    if len(args) > 1 and args[1] == "--moves":
+        import movestream
+        movestream.main(args[2:])
+        return
+    rows: int = 4
+    cols: int = 4
+    if "--size" in args[1:-1]:
+        size_index: int = args.index("--size", 1)
+        try:
+            rows, cols = [int(side) for side in args[size_index + 1].lower().split("x")]
+        except ValueError:
+            print(f"Invalid board size {args[size_index + 1]}, expected ROWSxCOLS, for example 5x5")
+            return
+        if not (2 <= rows <= 16 and 2 <= cols <= 16):
+            print("The board must have between 2 and 16 rows and columns")
+            return
+        args = args[:size_index] + args[size_index + 2:]
     if len(args) > 1:
         start_input: str = args[1]
     else:
@@ -472,42 +1173,20 @@ def main(args: typing.List[str] = [""]):
     else:
         mode: int = -1
     if mode >= 0:
-        move_mode: typing.List[int] = [0]
-        paused_list: typing.List[bool] = [False]
-        confirm_await_list: typing.List[bool] = [False]
-        coordinates: typing.List[int] = [0, 0]
-        coordinates_list: typing.List[typing.List[int]] = []
-        condition: typing.List[bool] = [True]
-        game: Game2048 = Game2048(powerup_mode = mode)
-        restart(game)
-        keybinds: typing.Dict[str, typing.Callable] = {
-            "w": lambda: (move(game, 1) if move_mode[-1] == 0 else move_coordinates(game, coordinates, 1)) if not paused_list[0] else None,
-            "s": lambda: (move(game, 3) if move_mode[-1] == 0 else move_coordinates(game, coordinates, 3)) if not paused_list[0] else None,
-            "a": lambda: (move(game, 0) if move_mode[-1] == 0 else move_coordinates(game, coordinates, 0)) if not paused_list[0] else None,
-            "d": lambda: (move(game, 2) if move_mode[-1] == 0 else move_coordinates(game, coordinates, 2)) if not paused_list[0] else None,
-            "<up>": lambda: (move(game, 1) if move_mode[-1] == 0 else move_coordinates(game, coordinates, 1)) if not paused_list[0] else None,
-            "<down>": lambda: (move(game, 3) if move_mode[-1] == 0 else move_coordinates(game, coordinates, 3)) if not paused_list[0] else None,
-            "<left>": lambda: (move(game, 0) if move_mode[-1] == 0 else move_coordinates(game, coordinates, 0)) if not paused_list[0] else None,
-            "<right>": lambda: (move(game, 2) if move_mode[-1] == 0 else move_coordinates(game, coordinates, 2)) if not paused_list[0] else None,
-            "<enter>": lambda: ((select_coordinates(game, coordinates_list, coordinates) if len(coordinates_list) != 2 else submit_coordinates(game, game.swap, coordinates_list, move_mode)) if move_mode[-1] == 1 else ((select_coordinates(game, coordinates_list, coordinates) if len(coordinates_list) !=1 else submit_coordinates(game, game.delete, coordinates_list, move_mode)) if move_mode[-1] == 2 else restart(game))) if not paused_list[0] else None,
-            "<esc>": lambda: confirm_pause(game, paused_list, confirm_await_list, move_mode, coordinates) if confirm_await_list[0] else ((condition.append(False) if move_mode[-1] == 0 else set_mode(game, move_mode, 0, coordinates, coordinates_list)) if not paused_list[0] else None),
-            "<space>": lambda: start_pause(confirm_await_list) if not confirm_await_list[0] else None
-        }
-        if game.powerups:
-            keybinds["<shift>+u"] = lambda: (undo(game) if move_mode[-1] == 0 else None) if not paused_list[0] else None
-            keybinds["<shift>+i"] = lambda: (set_mode(game, move_mode, 1, coordinates, coordinates_list) if move_mode[-1] == 0 and game.swaps_left != 0 else (print("You don't have any uses left, make 256 tiles to get more uses") if game.swaps_left == 0 else None)) if not paused_list[0] else None
-            keybinds["<shift>+o"] = lambda: (set_mode(game, move_mode, 2, coordinates, coordinates_list) if move_mode[-1] == 0 and game.deletes_left != 0 else (print("You don't have any uses left, make 512 tiles to get more uses") if game.deletes_left == 0 else None)) if not paused_list[0] else None
-        listener: keyboard.GlobalHotKeys = keyboard.GlobalHotKeys(keybinds)
-        listener.start()
-        while condition[-1]:
-            time.sleep(0.1)
-            if confirm_await_list[0]:
-                time.sleep(1)
-                if confirm_await_list[0]:
-                    confirm_await_list[0] = False
-                    print("ESC key was not pressed")
-            move_mode = [move_mode[-1]]
+        import asyncio
+        asyncio.run(play(mode, rows, cols))
         quit()
 
+if __name__ != "__main__" and (os.environ.get("CMDGAME2048_PROFILE") or os.environ.get("CMDGAME2048_CPROFILE")):
+    #Programs importing the game are profiled by the environment variables of profiling.py too, main() reads them for the command line.
+    #Worker processes importing the game again would overwrite the report of their parent, so only the parent is profiled
+    import multiprocessing
+    if multiprocessing.parent_process() is None:
+        import profiling
+        profile_arguments, profile_output, cprofile_output = profiling.parse_args([])
+        profiling.start(sys.modules[__name__], profile_output, cprofile_output)
+
 if __name__ == "__main__":
+    #Modules importing cmdgame2048 get this module instead of a second copy of it, so they share its classes, tables and profiler
+    sys.modules.setdefault("cmdgame2048", sys.modules[__name__])
     main(sys.argv)
\ No newline at end of file
@@ -0,0 +1,258 @@
+"""Training data from self-play games stored in memory-mapped NumPy shards
+
+Every move of a game becomes one sample: the board as tile exponents before the move, the mask of legal directions,
+the chosen direction, the score the move made (reward) and the final score of the game. Samples are written into
+.npy shards of a fixed number of samples opened with np.lib.format.open_memmap, so memory stays flat no matter how
+many samples are produced. Every producer process writes its own shards, manifest.json lists all of them
+with the number of samples they hold. The last shard of a producer is usually not full, it is cut down to its samples once it is closed.
+
+    python cmdgame2048.py --export DIRECTORY --games 1000 --workers 4 --strategy greedy
+
+ShardDataset reads the shards memory-mapped and iterates batches which are views into them.
+"""
+import argparse
+import concurrent.futures
+import json
+import os
+import random
+import time
+import typing
+import numpy as np
+import selfplay
+from cmdgame2048 import Game2048
+
+MANIFEST_NAME: str = "manifest.json"
+MANIFEST_VERSION: int = 1
+
+def sample_dtype(rows: int = 4, cols: int = 4)-> np.dtype:
+    """Return the dtype of a sample of a board of the said size"""
+    return np.dtype([("board", np.uint8, (rows * cols,)), ("legal", np.uint8), ("move", np.int8), ("reward", np.int32), ("final_score", np.int64)])
+
+class ShardWriter:
+    """Writes samples into consecutive .npy shards of a fixed size
+
+    Methods:
+    self.write(samples) - Appends a structured array of samples, a new shard is started whenever one is full
+    self.close() - Flushes the current shard and returns the paths and sample counts of all shards
+    """
+    def __init__(self, directory: str, prefix: str, shard_size: int, dtype: np.dtype):
+        """Create a new writer, no shard is created until the first samples are written
+
+        Parameters:
+
+            directory = a path of the directory the shards are written into
+
+            prefix = a string all shard names start with, unique for every producer
+
+            shard_size = an integer, the number of samples in a shard
+
+            dtype = the structured dtype of the samples, see sample_dtype()
+        """
+        self.directory: str = directory
+        self.prefix: str = prefix
+        self.shard_size: int = shard_size
+        self.dtype: np.dtype = dtype
+        self.shards: typing.List[typing.Dict[str, typing.Any]] = []
+        self._shard: np.ndarray | None = None
+        self._count: int = 0
+
+    def _open_shard(self):
+        name: str = f"{self.prefix}-{len(self.shards):05d}.npy"
+        self._shard = np.lib.format.open_memmap(os.path.join(self.directory, name), mode = "w+", dtype = self.dtype, shape = (self.shard_size,))
+        self._count = 0
+        self.shards.append({"path": name, "count": 0})
+
+    def _close_shard(self):
+        if self._shard is None:
+            return
+        shard: np.ndarray = self._shard
+        self._shard = None
+        shard.flush()
+        self.shards[-1]["count"] = self._count
+        if self._count < self.shard_size:
+            #A partial shard is rewritten with only its samples, so its header matches them and it takes no more space than they need
+            path: str = os.path.join(self.directory, self.shards[-1]["path"])
+            truncated: np.ndarray = np.lib.format.open_memmap(path + ".tmp", mode = "w+", dtype = self.dtype, shape = (self._count,))
+            truncated[:] = shard[:self._count]
+            truncated.flush()
+            del truncated, shard
+            os.replace(path + ".tmp", path)
+
+    def write(self, samples: np.ndarray):
+        """Append samples, they are split across shards if the current one fills up"""
+        written: int = 0
+        while written < len(samples):
+            if self._shard is None:
+                self._open_shard()
+            length: int = min(len(samples) - written, self.shard_size - self._count)
+            self._shard[self._count:self._count + length] = samples[written:written + length]
+            self._count += length
+            written += length
+            if self._count == self.shard_size:
+                self._close_shard()
+
+    def close(self)-> typing.List[typing.Dict[str, typing.Any]]:
+        """Flush the current shard and return the path (relative to the directory) and sample count of every shard"""
+        self._close_shard()
+        return self.shards
+
+def play_samples(game: Game2048, choose_move: typing.Callable[[Game2048, random.Random], int], rng: random.Random)-> np.ndarray:
+    """Play a game to its end and return its samples"""
+    cells: int = game.rows * game.cols
+    boards: bytearray = bytearray()
+    legal_masks: bytearray = bytearray()
+    moves: typing.List[int] = []
+    rewards: typing.List[int] = []
+    while game.game_state > 0:
+        direction: int = choose_move(game, rng)
+        if direction == -1:
+            break
+        boards += bytes([tile for row in game.grid for tile in row])
+        legal_masks.append(game.legal_moves())
+        score: int = game.score
+        game.public_move(direction)
+        moves.append(direction)
+        rewards.append(game.score - score)
+    samples: np.ndarray = np.empty(len(moves), dtype = sample_dtype(game.rows, game.cols))
+    samples["board"] = np.frombuffer(boards, dtype = np.uint8).reshape(-1, cells)
+    samples["legal"] = np.frombuffer(legal_masks, dtype = np.uint8)
+    samples["move"] = moves
+    samples["reward"] = rewards
+    samples["final_score"] = game.score
+    return samples
+
+def produce(producer_index: int, game_indices: typing.List[int], directory: str, *, seed: int = 0, strategy: str = "greedy", shard_size: int = 65536,
+            rows: int = 4, cols: int = 4, powerup_mode: int = 0, time_limit_ms: float = 10.0)-> typing.Dict[str, typing.Any]:
+    """Play the games and write their samples into the shards of one producer, is run in the worker processes
+
+    Parameters:
+
+        producer_index = an integer, names the shards of the producer
+
+        game_indices = a list of integers, game number n is played with the seed seed + n
+
+        directory = a path of the directory the shards are written into
+
+        strategy = one of selfplay.STRATEGIES
+
+        shard_size = an integer, the number of samples in a shard
+
+        rows, cols, powerup_mode = same as in Game2048.restart()
+
+        time_limit_ms = a float, the time budget of the expectimax strategy per move
+    """
+    selfplay.init_worker(strategy)
+    choose_move: typing.Callable[[Game2048, random.Random], int] = selfplay.get_strategy(strategy, time_limit_ms)
+    writer: ShardWriter = ShardWriter(directory, f"producer{producer_index:03d}", shard_size, sample_dtype(rows, cols))
+    samples: int = 0
+    for game_index in game_indices:
+        game: Game2048 = Game2048(powerup_mode = powerup_mode, seed = seed + game_index, rows = rows, cols = cols)
+        game_samples: np.ndarray = play_samples(game, choose_move, random.Random(seed + game_index))
+        writer.write(game_samples)
+        samples += len(game_samples)
+    return {"games": len(game_indices), "samples": samples, "shards": writer.close()}
+
+def export(directory: str, games: int, *, workers: int | None = None, seed: int = 0, strategy: str = "greedy", shard_size: int = 65536,
+           rows: int = 4, cols: int = 4, powerup_mode: int = 0, time_limit_ms: float = 10.0)-> typing.Dict[str, typing.Any]:
+    """Play games across producer processes, write their samples into shards in the directory and return the manifest
+
+    Parameters are the same as of produce(), workers is the number of producer processes, None uses one per CPU"""
+    selfplay.check_strategy(strategy, rows, cols)
+    if shard_size < 1:
+        raise ValueError("The shard size must be at least 1")
+    os.makedirs(directory, exist_ok = True)
+    workers = max(1, min(workers or os.cpu_count() or 1, games))
+    start_time: float = time.perf_counter()
+    with concurrent.futures.ProcessPoolExecutor(max_workers = workers) as executor:
+        futures: typing.List[concurrent.futures.Future] = [executor.submit(produce, producer_index, list(range(producer_index, games, workers)), directory, seed = seed,
+                                                                           strategy = strategy, shard_size = shard_size, rows = rows, cols = cols,
+                                                                           powerup_mode = powerup_mode, time_limit_ms = time_limit_ms) for producer_index in range(workers)]
+        results: typing.List[typing.Dict[str, typing.Any]] = [future.result() for future in futures]
+    dtype: np.dtype = sample_dtype(rows, cols)
+    manifest: typing.Dict[str, typing.Any] = {
+        "version": MANIFEST_VERSION,
+        "rows": rows,
+        "cols": cols,
+        "dtype": np.lib.format.dtype_to_descr(dtype),
+        "shard_size": shard_size,
+        "strategy": strategy,
+        "seed": seed,
+        "games": sum([result["games"] for result in results]),
+        "samples": sum([result["samples"] for result in results]),
+        "elapsed": time.perf_counter() - start_time,
+        "shards": [shard for result in results for shard in result["shards"]],
+    }
+    with open(os.path.join(directory, MANIFEST_NAME), "w") as manifest_file:
+        json.dump(manifest, manifest_file, indent = 4)
+    return manifest
+
+class ShardDataset:
+    """Samples of a directory written by export(), the shards are opened memory-mapped
+
+    Methods:
+    self.iter_batches(batch_size) - Yields batches of samples as views into the shards
+    """
+    def __init__(self, directory: str):
+        with open(os.path.join(directory, MANIFEST_NAME)) as manifest_file:
+            self.manifest: typing.Dict[str, typing.Any] = json.load(manifest_file)
+        if self.manifest["version"] != MANIFEST_VERSION:
+            raise ValueError(f"Unsupported manifest version {self.manifest['version']}")
+        self.directory: str = directory
+        self.rows: int = self.manifest["rows"]
+        self.cols: int = self.manifest["cols"]
+
+    def __len__(self)-> int:
+        return self.manifest["samples"]
+
+    def shards(self)-> typing.Iterator[np.ndarray]:
+        """Yield the filled part of every shard, memory-mapped read only"""
+        for shard in self.manifest["shards"]:
+            if shard["count"]:
+                yield np.load(os.path.join(self.directory, shard["path"]), mmap_mode = "r")[:shard["count"]]
+
+    def iter_batches(self, batch_size: int, *, drop_last: bool = False, shuffle_shards: bool = False, seed: int | None = None)-> typing.Iterator[np.ndarray]:
+        """Yield batches of samples without copying them, a batch never spans two shards so the last batch of a shard may be smaller
+
+        Parameters:
+
+            batch_size = an integer, the number of samples in a batch
+
+            drop_last = a boolean, if True the smaller last batches of the shards are skipped
+
+            shuffle_shards = a boolean, if True the shards are read in a random order
+
+            seed = an integer seeding the order of the shards
+        """
+        shards: typing.List[np.ndarray] = list(self.shards())
+        if shuffle_shards:
+            random.Random(seed).shuffle(shards)
+        for shard in shards:
+            for start in range(0, len(shard), batch_size):
+                batch: np.ndarray = shard[start:start + batch_size]
+                if drop_last and len(batch) < batch_size:
+                    continue
+                yield batch
+
+def main(args: typing.List[str]):
+    """Export training data from command line arguments and print the manifest without its list of shards"""
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(prog = "cmdgame2048.py --export", description = "Write self-play games as training data into .npy shards")
+    parser.add_argument("directory")
+    parser.add_argument("--games", type = int, default = 100, help = "number of games to play")
+    parser.add_argument("--workers", type = int, default = None, help = "number of producer processes, one per CPU by default")
+    parser.add_argument("--strategy", choices = selfplay.STRATEGIES, default = "greedy")
+    parser.add_argument("--seed", type = int, default = 0, help = "game number n is played with the seed SEED + n")
+    parser.add_argument("--shard-size", type = int, default = 65536, help = "number of samples in a shard")
+    parser.add_argument("--rows", type = int, default = 4)
+    parser.add_argument("--cols", type = int, default = 4)
+    parser.add_argument("--powerup-mode", type = int, choices = (0, 1, 2), default = 0)
+    parser.add_argument("--time-limit-ms", type = float, default = 10.0, help = "time budget of the expectimax strategy per move")
+    options: argparse.Namespace = parser.parse_args(args)
+    try:
+        selfplay.check_strategy(options.strategy, options.rows, options.cols)
+    except ValueError as error:
+        parser.error(str(error))
+
+    manifest: typing.Dict[str, typing.Any] = export(options.directory, options.games, workers = options.workers, seed = options.seed, strategy = options.strategy,
+                                                     shard_size = options.shard_size, rows = options.rows, cols = options.cols,
+                                                     powerup_mode = options.powerup_mode, time_limit_ms = options.time_limit_ms)
+    print(json.dumps({key: value for key, value in manifest.items() if key != "shards"} | {"shards": len(manifest["shards"])}, indent = 4))
@@ -0,0 +1,121 @@
+"""Hints for the interactive game computed in the background
+
+The expectimax solver runs in a separate process, so searching never holds the interpreter the game and the key listener run in.
+Every search gets a generation number, bumping the shared generation makes the running search stop at its next time check.
+"""
+import asyncio
+import collections
+import concurrent.futures
+import multiprocessing
+import typing
+from cmdgame2048 import Game2048
+
+DIRECTION_NAMES: typing.Tuple[str, ...] = ("left", "up", "right", "down")
+_solver = None
+_generation = None
+_solver_generation: int = 0
+
+def init_worker(generation, time_limit_ms: float):
+    """Create the solver of the worker process and build its tables"""
+    global _solver, _generation
+    import ai
+    _generation = generation
+    _solver = ai.Expectimax(time_limit_ms = time_limit_ms)
+    _solver.should_stop = lambda: _generation.value != _solver_generation
+    ai.get_heuristic_table()
+
+def search(board: int, generation: int)-> typing.Tuple[int, int, bool]:
+    """Return the board, the best direction for it and whether the search finished without being cancelled, is run in the worker process"""
+    global _solver_generation
+    _solver_generation = generation
+    if _generation.value != generation:
+        return board, -1, False
+    direction: int = _solver.best_move_board(board)
+    return board, direction, _generation.value == generation
+
+class HintEngine:
+    """Computes the best direction of the boards of a game in a worker process and caches them by the board, must be used inside an event loop
+
+    Methods:
+    self.request(game) - Starts computing the hint for the board of the game unless it is known
+    self.cancel() - Stops the running search
+    self.get(game) - Returns the cached direction for the board of the game, -1 if it is not known
+    self.started - Whether the worker process was started by a request
+    self.close() - Stops the worker process
+    """
+    def __init__(self, *, time_limit_ms: float = 150.0, cache_size: int = 4096, on_hint: typing.Callable[[int, int], None] | None = None):
+        """Create a new hint engine, the worker process is started with the first request
+
+        Parameters:
+
+            time_limit_ms = a float, the time budget of a single hint
+
+            cache_size = an integer, the highest number of boards whose hints are kept
+
+            on_hint = a function called with the board and direction of every finished hint
+        """
+        self.time_limit_ms: float = time_limit_ms
+        self.cache_size: int = cache_size
+        self.on_hint: typing.Callable[[int, int], None] | None = on_hint
+        self.cache: collections.OrderedDict[int, int] = collections.OrderedDict()
+        context = multiprocessing.get_context("spawn")
+        self._generation = context.RawValue("Q", 0)
+        self._executor: concurrent.futures.ProcessPoolExecutor | None = None
+        self._context = context
+        self._pending_board: int = -1
+
+    @property
+    def started(self)-> bool:
+        """Whether the worker process is running, it is started by the first request"""
+        return self._executor is not None
+
+    @staticmethod
+    def supports(game: Game2048)-> bool:
+        """Return whether hints can be computed for the game, the solver only searches packed 4x4 boards"""
+        return game.packed and game.rows == 4 and game.cols == 4
+
+    def get(self, game: Game2048)-> int:
+        """Return the cached best direction for the board of the game, -1 if it is not known yet"""
+        if not self.supports(game):
+            return -1
+        direction: int | None = self.cache.get(game.board)
+        if direction is None:
+            return -1
+        self.cache.move_to_end(game.board)
+        return direction
+
+    def request(self, game: Game2048):
+        """Start computing the hint for the board of the game in the background, nothing is done if it is cached or being computed"""
+        if not self.supports(game) or game.game_state < 0 or game.board in self.cache or game.board == self._pending_board:
+            return
+        self.cancel()
+        if self._executor is None:
+            self._executor = concurrent.futures.ProcessPoolExecutor(1, mp_context = self._context, initializer = init_worker, initargs = (self._generation, self.time_limit_ms))
+        self._pending_board = game.board
+        asyncio.wrap_future(self._executor.submit(search, game.board, self._generation.value)).add_done_callback(self._finished)
+
+    def cancel(self):
+        """Stop the running search, its result is thrown away"""
+        self._generation.value += 1
+        self._pending_board = -1
+
+    def _finished(self, future: asyncio.Future):
+        if future.cancelled() or future.exception() is not None:
+            return
+        board, direction, completed = future.result()
+        if not completed:
+            return
+        if board == self._pending_board:
+            self._pending_board = -1
+        self.cache[board] = direction
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last = False)
+        if self.on_hint is not None:
+            self.on_hint(board, direction)
+
+    def close(self):
+        """Cancel the running search and stop the worker process"""
+        self.cancel()
+        if self._executor is not None:
+            self._executor.shutdown(wait = False, cancel_futures = True)
+            self._executor = None
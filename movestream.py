@@ -0,0 +1,76 @@
+"""Play a stream of moves read from a file or stdin without any rendering or key listener and print the final state
+
+    printf 'wasdwasd' | python cmdgame2048.py --moves - --seed 7
+    python cmdgame2048.py --moves moves.txt --seed 7 --json
+
+w, a, s and d (in any case) or the direction numbers 0-3 (0 is left, going up rotates clockwise) make moves,
+u undoes a move when powerups are enabled and whitespace is ignored. The stream is read in chunks, so it can be
+of any length, reading stops once the game is lost and can not be undone anymore.
+"""
+import argparse
+import json
+import sys
+import typing
+from cmdgame2048 import Game2048
+
+UNDO_CODE: int = 4
+WHITESPACE_CODE: int = 0xFD
+INVALID_CODE: int = 0xFE
+WHITESPACE: bytes = b" \t\r\n"
+#Bytes of the stream translated to directions, UNDO_CODE, WHITESPACE_CODE or INVALID_CODE
+MOVE_CODES: bytes = bytes([{ord("a"): 0, ord("w"): 1, ord("d"): 2, ord("s"): 3, ord("A"): 0, ord("W"): 1, ord("D"): 2, ord("S"): 3,
+                            ord("0"): 0, ord("1"): 1, ord("2"): 2, ord("3"): 3, ord("u"): UNDO_CODE, ord("U"): UNDO_CODE}.get(byte, WHITESPACE_CODE if byte in WHITESPACE else INVALID_CODE)
+                           for byte in range(256)])
+CHUNK_SIZE: int = 1 << 20
+
+def apply_moves(game: Game2048, stream: typing.BinaryIO, chunk_size: int = CHUNK_SIZE)-> int:
+    """Make the moves of a binary stream in the game and return the number of them read, see the module docstring for the format
+
+    Raises ValueError at the first byte which is not a move"""
+    public_move: typing.Callable[[int], bool] = game.public_move
+    read: int = 0
+    position: int = 0
+    while True:
+        chunk: bytes = stream.read(chunk_size)
+        if not chunk:
+            return read
+        codes: bytes = chunk.translate(MOVE_CODES, WHITESPACE)
+        if INVALID_CODE in codes:
+            invalid_index: int = chunk.translate(MOVE_CODES).index(INVALID_CODE)
+            raise ValueError(f"Invalid move {chunk[invalid_index:invalid_index + 1]!r} at byte {position + invalid_index}")
+        position += len(chunk)
+        for code in codes:
+            read += 1
+            if code == UNDO_CODE:
+                game.undo()
+            elif not public_move(code) and game.undos_left == 0:
+                #The game is lost for good, the rest of the stream can not change it
+                return read
+
+def main(args: typing.List[str]):
+    """Play a move stream from command line arguments and print the final state of the game"""
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(prog = "cmdgame2048.py --moves", description = "Play a stream of moves and print the final state")
+    parser.add_argument("path", nargs = "?", default = "-", help = "file with the moves, - or nothing reads stdin")
+    parser.add_argument("--seed", type = int, default = 0)
+    parser.add_argument("--powerup-mode", type = int, choices = (0, 1, 2), default = 0)
+    parser.add_argument("--rows", type = int, default = 4)
+    parser.add_argument("--cols", type = int, default = 4)
+    parser.add_argument("--engine", choices = ("bitboard", "list"), default = "bitboard", help = "list starts faster, bitboard plays long streams faster")
+    parser.add_argument("--json", action = "store_true", help = "print the final state as one line of JSON")
+    options: argparse.Namespace = parser.parse_args(args)
+
+    game: Game2048 = Game2048(powerup_mode = options.powerup_mode, engine = options.engine, seed = options.seed, rows = options.rows, cols = options.cols)
+    try:
+        if options.path == "-":
+            read: int = apply_moves(game, sys.stdin.buffer)
+        else:
+            with open(options.path, "rb") as moves_file:
+                read: int = apply_moves(game, moves_file)
+    except ValueError as error:
+        print(error, file = sys.stderr)
+        sys.exit(1)
+    if options.json:
+        print(json.dumps({"seed": game.seed, "read": read, "score": game.score, "moves": game.moves, "game_state": game.game_state,
+                          "powerups_used": game.powerups_used, "grid": game.grid}))
+    else:
+        print(game)
@@ -0,0 +1,191 @@
+"""Ranking of the powerups usable in a game of 2048
+
+For a game the planner lists every option: using no powerup, undoing the last move, every swap of two different
+non-empty tiles (up to 120 on a 4x4 board) and deleting every distinct number. The board every option leads to
+is scored and the options are returned best first.
+
+    rollout - plays random moves from all boards at once in a Game2048Batch and scores an option by the score it
+              changes right away (undos lose points) plus the mean score gained in the rollouts, workers > 1 splits
+              the boards across processes
+    heuristic - scores the best move from the board by ai.evaluate_board(), only for 4x4 boards the packed engine
+                can hold, other boards are scored by rollouts. Score lost by undoing is not counted
+
+use_powerups() lets a program play with the powerups, see --auto-powerups of selfplay.py.
+"""
+import concurrent.futures
+import typing
+import numpy as np
+from cmdgame2048 import Game2048, MAX_PACKED_LEVEL, legal_moves_board, move_board, pack_grid, unpack_board
+
+METHODS: typing.Tuple[str, ...] = ("rollout", "heuristic")
+
+class PowerupOption:
+    """A powerup the game can use and the value of the board it leads to
+
+    kind is "none", "undo", "swap" or "delete", coordinates holds the [x, y] coordinates of the swapped tiles or of the deleted number"""
+    __slots__ = ("kind", "coordinates", "grid", "score_change", "value")
+
+    def __init__(self, kind: str, coordinates: typing.List[typing.List[int]], grid: typing.List[typing.List[int]], score_change: int = 0):
+        self.kind: str = kind
+        self.coordinates: typing.List[typing.List[int]] = coordinates
+        self.grid: typing.List[typing.List[int]] = grid
+        self.score_change: int = score_change
+        self.value: float = 0.0
+
+    def __repr__(self)-> str:
+        return f"PowerupOption({self.kind!r}, {self.coordinates}, value = {self.value:.1f})"
+
+def rollout_values(boards: np.ndarray, rollouts: int, moves: int, seed: int)-> np.ndarray:
+    """Return the mean score gained by random moves from every board of an (N, rows, cols) array, is run in the worker processes
+
+    Every board is played rollouts times for at most the said number of moves, all of them at once"""
+    import batch
+    count, rows, cols = boards.shape
+    games: batch.Game2048Batch = batch.Game2048Batch(count * rollouts, seed = seed, rows = rows, cols = cols)
+    games.boards[:] = np.repeat(boards, rollouts, axis = 0)
+    games.scores[:] = 0
+    games.moves[:] = 0
+    legal_masks: np.ndarray = games.legal_moves()
+    games.done[:] = legal_masks == 0
+    direction_bits: np.ndarray = np.arange(4, dtype = np.uint8)
+    for move_index in range(moves):
+        if games.done.all():
+            break
+        #A random legal direction per game, the one with the highest random priority out of the legal ones
+        priorities: np.ndarray = games.rng.random((len(games), 4)) * ((legal_masks[:, None] >> direction_bits) & 1)
+        games.step(np.where(legal_masks > 0, priorities.argmax(axis = 1), -1))
+        legal_masks = games.legal_moves()
+    return games.scores.reshape(count, rollouts).mean(axis = 1)
+
+def heuristic_value(grid: typing.List[typing.List[int]])-> float:
+    """Return the heuristic score of the best move from a 4x4 board, 0 if there is none"""
+    import ai
+    board: int = pack_grid(grid)
+    legal_mask: int = legal_moves_board(board)
+    return max([ai.evaluate_board(move_board(board, direction)[0]) for direction in range(4) if legal_mask >> direction & 1], default = 0.0)
+
+class PowerupPlanner:
+    """Lists and ranks the powerups a game can use
+
+    Methods:
+    self.options(game) - Returns every option of the game without values
+    self.rank(game) - Returns every option of the game with its value, best first
+    self.apply(player, option) - Uses the powerup of an option
+    self.close() - Stops the worker processes
+    """
+    def __init__(self, *, method: str = "rollout", rollouts: int = 32, rollout_moves: int = 64, workers: int = 1, seed: int | None = None):
+        """Create a new planner
+
+        Parameters:
+
+            method = one of METHODS, how the boards are scored, see the module docstring
+
+            rollouts = an integer, the number of random games played from every board
+
+            rollout_moves = an integer, the highest number of moves of a random game
+
+            workers = an integer, the number of processes the rollouts are split across, 1 plays them in this process
+
+            seed = an integer seeding the random moves of the rollouts, None picks a random seed
+        """
+        if method not in METHODS:
+            raise ValueError(f"Unknown method {method!r}, expected one of {', '.join(METHODS)}")
+        self.method: str = method
+        self.rollouts: int = rollouts
+        self.rollout_moves: int = rollout_moves
+        self.workers: int = workers
+        self.rng: np.random.Generator = np.random.default_rng(seed)
+        self._executor: concurrent.futures.ProcessPoolExecutor | None = None
+
+    def options(self, game: Game2048)-> typing.List[PowerupOption]:
+        """Return every option of the game without values: no powerup, then the ones with uses left, the powerups must be enabled for those"""
+        grid: typing.List[typing.List[int]] = [list(row) for row in game.grid]
+        options: typing.List[PowerupOption] = [PowerupOption("none", [], grid)]
+        if not game.powerups:
+            return options
+        if game.undos_left != 0 and len(game.history) > 0:
+            board, score, swaps_left, deletes_left = game.history.peek()
+            previous_grid: typing.List[typing.List[int]] = (unpack_board(board, game.rows, game.cols) if isinstance(board, int)
+                                                           else [list(board[row_start_index:row_start_index + game.cols]) for row_start_index in range(0, len(board), game.cols)])
+            options.append(PowerupOption("undo", [], previous_grid, score - game.score))
+        tiles: typing.List[typing.Tuple[int, int, int]] = [(x, y, tile) for y, row in enumerate(grid) for x, tile in enumerate(row) if tile != 0]
+        if game.swaps_left != 0:
+            for tile_index, (x_1, y_1, tile_1) in enumerate(tiles):
+                for x_2, y_2, tile_2 in tiles[tile_index + 1:]:
+                    if tile_1 != tile_2:
+                        swapped_grid: typing.List[typing.List[int]] = [list(row) for row in grid]
+                        swapped_grid[y_1][x_1] = tile_2
+                        swapped_grid[y_2][x_2] = tile_1
+                        options.append(PowerupOption("swap", [[x_1, y_1], [x_2, y_2]], swapped_grid))
+        if game.deletes_left != 0:
+            deleted_tiles: typing.Set[int] = set()
+            for x, y, tile in tiles:
+                if tile not in deleted_tiles:
+                    deleted_tiles.add(tile)
+                    options.append(PowerupOption("delete", [[x, y]], [[0 if other_tile == tile else other_tile for other_tile in row] for row in grid]))
+        return options
+
+    def _rollout_values(self, boards: np.ndarray)-> np.ndarray:
+        seeds: typing.List[int] = [int(seed) for seed in self.rng.integers(0, 2**63, self.workers)]
+        if self.workers <= 1 or len(boards) < 2 * self.workers:
+            return rollout_values(boards, self.rollouts, self.rollout_moves, seeds[0])
+        if self._executor is None:
+            self._executor = concurrent.futures.ProcessPoolExecutor(self.workers)
+        chunks: typing.List[np.ndarray] = np.array_split(boards, self.workers)
+        return np.concatenate(list(self._executor.map(rollout_values, chunks, [self.rollouts] * len(chunks), [self.rollout_moves] * len(chunks), seeds)))
+
+    def rank(self, game: Game2048)-> typing.List[PowerupOption]:
+        """Return every option of the game with its value, best first, using no powerup wins ties"""
+        options: typing.List[PowerupOption] = self.options(game)
+        if self.method == "heuristic" and game.rows == 4 and game.cols == 4 and max([max(row) for row in game.grid]) <= MAX_PACKED_LEVEL:
+            for option in options:
+                option.value = heuristic_value(option.grid)
+        else:
+            values: np.ndarray = self._rollout_values(np.array([option.grid for option in options], dtype = np.uint8))
+            for option, value in zip(options, values):
+                option.value = option.score_change + float(value)
+        return sorted(options, key = lambda option: (-option.value, option.kind != "none"))
+
+    @staticmethod
+    def apply(player: Game2048, option: PowerupOption)-> int:
+        """Use the powerup of an option, player is a Game2048 or anything with the same powerup methods (like replay.GameRecorder)
+
+        Returns the result of the powerup method, 0 for no powerup"""
+        if option.kind == "undo":
+            return player.undo()
+        elif option.kind == "swap":
+            return player.swap(option.coordinates[0], option.coordinates[1])
+        elif option.kind == "delete":
+            return player.delete(option.coordinates[0])
+        return 0
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+def use_powerups(game: Game2048, player: Game2048, planner: PowerupPlanner, *, max_empty_tiles: int = 0)-> bool:
+    """Use the best powerup if it is worth more than using none and return whether one was used
+
+    The options are only ranked once the game is lost or has at most max_empty_tiles empty tiles left, so the uses are saved
+    for the moments they matter. Undos are never used when they are unlimited (practice mode), as the game would never end
+
+    Parameters:
+
+        game = the Game2048 object being played
+
+        player = the object the powerups are used through, the game itself or a replay.GameRecorder recording it
+
+        planner = a PowerupPlanner
+
+        max_empty_tiles = an integer, see above
+    """
+    if not game.powerups or (game.game_state > 0 and sum([row.count(0) for row in game.grid]) > max_empty_tiles):
+        return False
+    for option in planner.rank(game):
+        if option.kind == "none":
+            return False
+        if option.kind == "undo" and game.undos_left < 0:
+            continue
+        return planner.apply(player, option) == 0
+    return False
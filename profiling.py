@@ -0,0 +1,216 @@
+"""Opt-in instrumentation of the game hot paths
+
+Enabled by the --profile command line option or the CMDGAME2048_PROFILE environment variable holding the path of the JSON report.
+The environment variables also profile any program importing cmdgame2048, such as selfplay.py, dataset.py or a server.
+The methods and functions are wrapped only once the profiler starts, so nothing is measured and nothing costs any time when it is disabled.
+
+The report has a counter and a latency histogram (power of two buckets in nanoseconds) for every measured function, the memory traced
+by tracemalloc with the lines allocating the most, and the net memory allocated by every sampled call. It is written on exit and whenever
+the process gets SIGUSR1. --cprofile=PATH or CMDGAME2048_CPROFILE additionally capture the whole session with cProfile.
+"""
+import atexit
+import cProfile
+import functools
+import json
+import os
+import signal
+import sys
+import time
+import tracemalloc
+import types
+import typing
+
+PROFILE_ENV: str = "CMDGAME2048_PROFILE"
+CPROFILE_ENV: str = "CMDGAME2048_CPROFILE"
+DEFAULT_OUTPUT: str = "cmdgame2048-profile.json"
+#Methods of Game2048 and TerminalRenderer and module functions measured by the profiler, with the names used in the report
+GAME_METHODS: typing.Tuple[str, ...] = ("public_move", "_move", "_check", "_spawn", "_snapshot", "undo", "swap", "delete")
+RENDERER_METHODS: typing.Tuple[str, ...] = ("draw",)
+MODULE_FUNCTIONS: typing.Tuple[str, ...] = ("refresh", "handle_key")
+#Every call number n * ALLOCATION_SAMPLE_RATE of a function also measures the memory it allocated
+ALLOCATION_SAMPLE_RATE: int = 64
+TOP_ALLOCATIONS: int = 20
+
+_profiler: "Profiler | None" = None
+
+class LatencyHistogram:
+    """Counts durations in buckets by powers of two, bucket number n holds durations from 2**(n-1) to 2**n - 1 nanoseconds"""
+    __slots__ = ("buckets", "count", "total_ns", "max_ns", "sampled_calls", "sampled_bytes")
+
+    def __init__(self):
+        self.buckets: typing.List[int] = [0] * 64
+        self.count: int = 0
+        self.total_ns: int = 0
+        self.max_ns: int = 0
+        self.sampled_calls: int = 0
+        self.sampled_bytes: int = 0
+
+    def add(self, duration_ns: int):
+        self.buckets[duration_ns.bit_length()] += 1
+        self.count += 1
+        self.total_ns += duration_ns
+        if duration_ns > self.max_ns:
+            self.max_ns = duration_ns
+
+    def percentile(self, fraction: float)-> int:
+        """Return the upper bound of the bucket holding the said fraction of durations"""
+        target: float = fraction * self.count
+        seen: int = 0
+        for bucket_index, bucket in enumerate(self.buckets):
+            seen += bucket
+            if seen >= target and seen > 0:
+                return min(2**bucket_index - 1, self.max_ns)
+        return self.max_ns
+
+    def to_dict(self)-> typing.Dict[str, typing.Any]:
+        return {
+            "calls": self.count,
+            "total_ns": self.total_ns,
+            "mean_ns": self.total_ns / self.count if self.count else 0.0,
+            "p50_ns": self.percentile(0.5),
+            "p90_ns": self.percentile(0.9),
+            "p99_ns": self.percentile(0.99),
+            "max_ns": self.max_ns,
+            "histogram": {str(2**bucket_index - 1): bucket for bucket_index, bucket in enumerate(self.buckets) if bucket},
+            "sampled_calls": self.sampled_calls,
+            "mean_sampled_bytes": self.sampled_bytes / self.sampled_calls if self.sampled_calls else 0.0,
+        }
+
+class Profiler:
+    """Measures the hot paths of the game and writes a JSON report
+
+    Methods:
+    self.start(module) - Wraps the measured functions of the module holding Game2048 and starts tracing memory
+    self.snapshot() - Returns the report as a dictionary
+    self.dump() - Writes the report into the output file
+    self.stop() - Restores the original functions and writes the report and the cProfile capture
+    """
+    def __init__(self, output: str = DEFAULT_OUTPUT, *, cprofile_output: str | None = None, trace_allocations: bool = True):
+        """Create a new profiler, it does not measure anything until it is started
+
+        Parameters:
+
+            output = a path of the JSON report
+
+            cprofile_output = a path the cProfile statistics of the session are written into, None does not run cProfile
+
+            trace_allocations = a boolean, if True memory is traced with tracemalloc
+        """
+        self.output: str = output
+        self.cprofile_output: str | None = cprofile_output
+        self.trace_allocations: bool = trace_allocations
+        self.histograms: typing.Dict[str, LatencyHistogram] = {}
+        self.start_time: float = 0.0
+        self._originals: typing.List[typing.Tuple[typing.Any, str, typing.Any]] = []
+        self._cprofile: cProfile.Profile | None = None
+
+    def _wrap(self, owner: typing.Any, name: str, label: str):
+        """Replace owner.name by a wrapper recording its latency under the label"""
+        function: typing.Callable = getattr(owner, name)
+        histogram: LatencyHistogram = self.histograms.setdefault(label, LatencyHistogram())
+        perf_counter_ns: typing.Callable[[], int] = time.perf_counter_ns
+        trace_allocations: bool = self.trace_allocations
+        get_traced_memory: typing.Callable[[], typing.Tuple[int, int]] = tracemalloc.get_traced_memory
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if trace_allocations and histogram.count % ALLOCATION_SAMPLE_RATE == 0:
+                memory_before: int = get_traced_memory()[0]
+                start: int = perf_counter_ns()
+                result = function(*args, **kwargs)
+                histogram.add(perf_counter_ns() - start)
+                histogram.sampled_calls += 1
+                histogram.sampled_bytes += get_traced_memory()[0] - memory_before
+                return result
+            start: int = perf_counter_ns()
+            result = function(*args, **kwargs)
+            histogram.add(perf_counter_ns() - start)
+            return result
+
+        self._originals.append((owner, name, owner.__dict__[name] if isinstance(owner, type) else function))
+        setattr(owner, name, wrapper)
+
+    def start(self, module: types.ModuleType):
+        """Start measuring the game of the module, which is cmdgame2048 or __main__ when it is run as a script"""
+        self.start_time = time.time()
+        if self.trace_allocations and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        for name in GAME_METHODS:
+            self._wrap(module.Game2048, name, name)
+        for name in RENDERER_METHODS:
+            self._wrap(module.TerminalRenderer, name, name)
+        for name in MODULE_FUNCTIONS:
+            self._wrap(module, name, name)
+        if self.cprofile_output is not None:
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+
+    def snapshot(self)-> typing.Dict[str, typing.Any]:
+        """Return the counters, latencies and memory statistics measured so far"""
+        report: typing.Dict[str, typing.Any] = {
+            "time": time.time(),
+            "uptime": time.time() - self.start_time,
+            "functions": {label: histogram.to_dict() for label, histogram in self.histograms.items()},
+        }
+        if tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            statistics: typing.List[tracemalloc.Statistic] = tracemalloc.take_snapshot().statistics("lineno")
+            report["memory"] = {
+                "current_bytes": current,
+                "peak_bytes": peak,
+                "top_allocations": [{"location": f"{statistic.traceback[0].filename}:{statistic.traceback[0].lineno}", "bytes": statistic.size, "blocks": statistic.count}
+                                    for statistic in statistics[:TOP_ALLOCATIONS]],
+            }
+        return report
+
+    def dump(self):
+        """Write the report into the output file"""
+        with open(self.output, "w") as output_file:
+            json.dump(self.snapshot(), output_file, indent = 4)
+
+    def stop(self):
+        """Restore the measured functions and write the report and the cProfile statistics"""
+        if self._cprofile is not None:
+            self._cprofile.disable()
+            self._cprofile.dump_stats(self.cprofile_output)
+            self._cprofile = None
+        if not self._originals:
+            return
+        self.dump()
+        while self._originals:
+            owner, name, original = self._originals.pop()
+            setattr(owner, name, original)
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+def start(module: types.ModuleType, output: str = DEFAULT_OUTPUT, cprofile_output: str | None = None)-> Profiler:
+    """Start profiling the game of the module, the report is written on exit and on SIGUSR1"""
+    global _profiler
+    if _profiler is not None:
+        return _profiler
+    _profiler = Profiler(output, cprofile_output = cprofile_output)
+    _profiler.start(module)
+    atexit.register(_profiler.stop)
+    if hasattr(signal, "SIGUSR1"):
+        signal.signal(signal.SIGUSR1, lambda signal_number, frame: _profiler.dump())
+    return _profiler
+
+def parse_args(args: typing.List[str])-> typing.Tuple[typing.List[str], str | None, str | None]:
+    """Remove the profiling options from the command line arguments, return the remaining arguments, the report path and the cProfile path
+
+    The environment variables are used when the options are not given, None means the option is disabled"""
+    output: str | None = os.environ.get(PROFILE_ENV) or None
+    cprofile_output: str | None = os.environ.get(CPROFILE_ENV) or None
+    remaining: typing.List[str] = []
+    for argument in args:
+        if argument == "--profile":
+            output = DEFAULT_OUTPUT
+        elif argument.startswith("--profile="):
+            output = argument.split("=", 1)[1]
+        elif argument.startswith("--cprofile="):
+            cprofile_output = argument.split("=", 1)[1]
+        else:
+            remaining.append(argument)
+    if cprofile_output is not None and output is None:
+        output = DEFAULT_OUTPUT
+    return remaining, output, cprofile_output
@@ -0,0 +1,594 @@
+"""Compact binary replays of games of 2048
+
+A replay stores the seed of the game instead of the spawned tiles, so it only needs the moves and powerups:
+
+    header: magic b"G2KR", version, powerup mode, seed (8 bytes), rows, columns, custom grid flag,
+            the custom grid as one byte per tile if the flag is set and the keyframe interval as a varint
+    moves: bytes 0-63 hold three directions (2 bits each, first one lowest), 64-79 two directions and 80-83 one direction
+    powerups: OP_UNDO, OP_SWAP followed by two coordinate bytes, OP_DELETE followed by one coordinate byte (x + 16*y)
+    keyframes: OP_KEYFRAME followed by the length of the keyframe as a varint and the keyframe, see write_keyframe()
+    end: OP_END followed by the score and moves as varints, game state as a signed byte and the final grid, one byte per tile
+    index: the number of steps and keyframes as varints, the step and offset of every keyframe as varints
+           and TRAILER with the offset of the index, offsets count from the start of the replay
+
+Moves and powerups that do not change the game are not stored. Every one of them is a step, a keyframe holding the whole
+state of the game is written every keyframe interval steps, so ReplayFile reaches any step by simulating at most that many.
+Versions 1 and 2 were recorded while games drew their tiles from random.Random, which they no longer do, so they are rejected.
+Replays can be concatenated into one archive file.
+"""
+import argparse
+import bisect
+import io
+import struct
+import time
+import typing
+from cmdgame2048 import Game2048, MoveHistory
+
+MAGIC: bytes = b"G2KR"
+VERSION: int = 3
+HEADER: struct.Struct = struct.Struct("<4sBBQBBB")
+INDEX_MAGIC: bytes = b"G2KX"
+#Offset of the index from the start of the replay and INDEX_MAGIC
+TRAILER: struct.Struct = struct.Struct("<I4s")
+#State of the xorshift64* generator of the game, see Game2048._random()
+RANDOM_STATE: struct.Struct = struct.Struct("<Q")
+KEYFRAME_INTERVAL: int = 1024
+OP_THREE_MOVES: int = 0
+OP_TWO_MOVES: int = 64
+OP_ONE_MOVE: int = 80
+OP_UNDO: int = 0x80
+OP_SWAP: int = 0x81
+OP_DELETE: int = 0x82
+OP_KEYFRAME: int = 0x83
+OP_END: int = 0xFF
+
+class ReplayError(Exception):
+    """Raised when a replay is malformed"""
+
+def write_varint(stream: typing.BinaryIO, number: int):
+    """Write a non-negative integer 7 bits per byte, the highest bit marks that more bytes follow"""
+    while number >= 0x80:
+        stream.write(bytes([(number & 0x7F) | 0x80]))
+        number >>= 7
+    stream.write(bytes([number]))
+
+def read_varint(stream: typing.BinaryIO)-> int:
+    """Read an integer written by write_varint()"""
+    number: int = 0
+    shift: int = 0
+    while True:
+        byte: bytes = stream.read(1)
+        if not byte:
+            raise ReplayError("Replay ended inside a number")
+        number |= (byte[0] & 0x7F) << shift
+        if byte[0] < 0x80:
+            return number
+        shift += 7
+
+def read_exact(stream: typing.BinaryIO, length: int)-> bytes:
+    data: bytes = stream.read(length)
+    if len(data) != length:
+        raise ReplayError("Replay ended unexpectedly")
+    return data
+
+def to_grid(data: bytes, columns: int)-> typing.List[typing.List[int]]:
+    """Return tile exponents stored one byte per tile as a 2D list"""
+    return [list(data[row_start_index:row_start_index + columns]) for row_start_index in range(0, len(data), columns)]
+
+def write_board(stream: typing.BinaryIO, board: int | bytes):
+    """Write a board in the form of the states of MoveHistory, a flag byte followed by the packed board (8 bytes) or the tile exponents"""
+    if isinstance(board, int):
+        stream.write(b"\x00" + board.to_bytes(8, "little"))
+    else:
+        stream.write(b"\x01" + board)
+
+def read_board(stream: typing.BinaryIO, cells: int)-> int | bytes:
+    """Read a board written by write_board()"""
+    if read_exact(stream, 1)[0] == 0:
+        return int.from_bytes(read_exact(stream, 8), "little")
+    return read_exact(stream, cells)
+
+class Keyframe:
+    """The whole state of a game after a number of steps, only the states of the undo history kept since the previous keyframe are not repeated"""
+    def __init__(self, step: int, score: int, moves: int, powerups_used: int, game_state: int, undos_left: int, swaps_left: int, deletes_left: int,
+                 board: int | bytes, history_kept: int, history_states: typing.List[typing.Tuple[int | bytes, int, int, int]], random_state: int):
+        self.step: int = step
+        self.score: int = score
+        self.moves: int = moves
+        self.powerups_used: int = powerups_used
+        self.game_state: int = game_state
+        self.undos_left: int = undos_left
+        self.swaps_left: int = swaps_left
+        self.deletes_left: int = deletes_left
+        self.board: int | bytes = board
+        #The oldest history_kept states of the undo history are the ones of the previous keyframe, history_states follow them
+        self.history_kept: int = history_kept
+        self.history_states: typing.List[typing.Tuple[int | bytes, int, int, int]] = history_states
+        self.random_state: int = random_state
+
+    def restore(self, game: Game2048, history_states: typing.List[typing.Tuple[int | bytes, int, int, int]]):
+        """Set the state of a game started from the same replay to the keyframe, history_states is the whole undo history"""
+        game._set_board(self.board)
+        game.score = self.score
+        game.moves = self.moves
+        game.powerups_used = self.powerups_used
+        game.game_state = self.game_state
+        game.undos_left = self.undos_left
+        game.swaps_left = self.swaps_left
+        game.deletes_left = self.deletes_left
+        game.history = MoveHistory(game.moves_limit)
+        for state in history_states:
+            game.history.push(*state)
+        game.random_state = self.random_state
+        if game.game_state < 0:
+            game.lose_time = time.time()
+
+def write_keyframe(stream: typing.BinaryIO, game: Game2048, history_kept: int):
+    """Write OP_KEYFRAME and the state of the game: score, moves and powerups used as varints, game state and powerup uses left
+    as signed bytes, the board, the number of kept and written states of the undo history followed by them and the state of the random generator"""
+    keyframe: io.BytesIO = io.BytesIO()
+    write_varint(keyframe, game.score)
+    write_varint(keyframe, game.moves)
+    write_varint(keyframe, game.powerups_used)
+    keyframe.write(struct.pack("<bbbb", game.game_state, game.undos_left, game.swaps_left, game.deletes_left))
+    write_board(keyframe, game.board if game.packed else bytes([tile for row in game.grid for tile in row]))
+    history_states: typing.List[typing.Tuple[int | bytes, int, int, int]] = game.history.states(history_kept)
+    write_varint(keyframe, history_kept)
+    write_varint(keyframe, len(history_states))
+    for board, score, swaps_left, deletes_left in history_states:
+        write_board(keyframe, board)
+        write_varint(keyframe, score)
+        write_varint(keyframe, swaps_left + 1)
+        write_varint(keyframe, deletes_left + 1)
+    keyframe.write(RANDOM_STATE.pack(game.random_state))
+    stream.write(bytes([OP_KEYFRAME]))
+    write_varint(stream, len(keyframe.getvalue()))
+    stream.write(keyframe.getvalue())
+
+def read_keyframe(stream: typing.BinaryIO, step: int, cells: int)-> Keyframe:
+    """Read a keyframe written by write_keyframe() after its OP_KEYFRAME, cells is the number of tiles of the board"""
+    keyframe: io.BytesIO = io.BytesIO(read_exact(stream, read_varint(stream)))
+    score: int = read_varint(keyframe)
+    moves: int = read_varint(keyframe)
+    powerups_used: int = read_varint(keyframe)
+    game_state, undos_left, swaps_left, deletes_left = struct.unpack("<bbbb", read_exact(keyframe, 4))
+    board: int | bytes = read_board(keyframe, cells)
+    history_kept: int = read_varint(keyframe)
+    history_states: typing.List[typing.Tuple[int | bytes, int, int, int]] = []
+    for state_index in range(read_varint(keyframe)):
+        history_states.append((read_board(keyframe, cells), read_varint(keyframe), read_varint(keyframe) - 1, read_varint(keyframe) - 1))
+    random_state: int = RANDOM_STATE.unpack(read_exact(keyframe, RANDOM_STATE.size))[0]
+    return Keyframe(step, score, moves, powerups_used, game_state, undos_left, swaps_left, deletes_left, board, history_kept, history_states, random_state)
+
+class GameRecorder:
+    """Plays a game and records it into a binary replay
+
+    Methods:
+    self.public_move(direction: int) - Makes a move and records it
+    self.undo(), self.swap(coord_1, coord_2), self.delete(coordinates) - Use a powerup and record it
+    self.close() - Writes the end of the replay with the final state of the game and the index of its keyframes
+    """
+    def __init__(self, game: Game2048, stream: typing.BinaryIO, keyframe_interval: int = KEYFRAME_INTERVAL):
+        """Start recording a game, it must not have made any moves yet
+
+        Parameters:
+
+            game = a Game2048 object right after it was created or restarted
+
+            stream = a binary file-like object the replay is written into, must support tell()
+
+            keyframe_interval = an integer, a keyframe is written every this many steps, 0 writes none
+        """
+        if not 0 <= game.seed < 2**64:
+            raise ValueError("Only games with a seed between 0 and 2**64 - 1 can be recorded")
+        self.game: Game2048 = game
+        self.stream: typing.BinaryIO = stream
+        self.keyframe_interval: int = keyframe_interval
+        self.pending_moves: typing.List[int] = []
+        self.start: int = stream.tell()
+        self.steps: int = 0
+        self.keyframes: typing.List[typing.Tuple[int, int]] = []
+        #The length the undo history had at the previous keyframe or has shrunk to by undos since
+        self.history_floor: int = 0
+        grid: typing.List[typing.List[int]] = game.original_grid
+        stream.write(HEADER.pack(MAGIC, VERSION, game.powerup_mode, game.seed, game.rows, game.cols, game.custom_grid))
+        if game.custom_grid:
+            stream.write(bytes([tile for row in grid for tile in row]))
+        write_varint(stream, keyframe_interval)
+
+    def _flush_moves(self):
+        """Write the moves that were not written yet, three in a byte"""
+        moves: typing.List[int] = self.pending_moves
+        if len(moves) == 3:
+            self.stream.write(bytes([OP_THREE_MOVES + moves[0] + 4*moves[1] + 16*moves[2]]))
+        elif len(moves) == 2:
+            self.stream.write(bytes([OP_TWO_MOVES + moves[0] + 4*moves[1]]))
+        elif len(moves) == 1:
+            self.stream.write(bytes([OP_ONE_MOVE + moves[0]]))
+        self.pending_moves = []
+
+    def _step(self):
+        """Count a recorded move or powerup and write a keyframe after every keyframe interval of them"""
+        self.steps += 1
+        if self.keyframe_interval and self.steps % self.keyframe_interval == 0:
+            self._flush_moves()
+            history: MoveHistory = self.game.history
+            #Without a capacity the undo history only grows and shrinks at its end, the states kept since the previous keyframe are not repeated
+            history_kept: int = min(self.history_floor, len(history)) if history.capacity == -1 else 0
+            self.keyframes.append((self.steps, self.stream.tell() - self.start))
+            write_keyframe(self.stream, self.game, history_kept)
+            self.history_floor = len(history)
+
+    def public_move(self, direction: int)-> bool:
+        """Same as Game2048.public_move(), the move is recorded if it changed the board"""
+        moves: int = self.game.moves
+        result: bool = self.game.public_move(direction)
+        if self.game.moves != moves:
+            self.pending_moves.append(direction % 4)
+            if len(self.pending_moves) == 3:
+                self._flush_moves()
+            self._step()
+        return result
+
+    def undo(self)-> typing.Literal[-2, -1, 0]:
+        """Same as Game2048.undo(), the undo is recorded if it succeeded"""
+        result: typing.Literal[-2, -1, 0] = self.game.undo()
+        if result == 0:
+            self._flush_moves()
+            self.stream.write(bytes([OP_UNDO]))
+            self.history_floor = min(self.history_floor, len(self.game.history))
+            self._step()
+        return result
+
+    def swap(self, coord_1: typing.List[int], coord_2: typing.List[int])-> typing.Literal[-2, -1, 0]:
+        """Same as Game2048.swap(), the swap is recorded if it succeeded"""
+        result: typing.Literal[-2, -1, 0] = self.game.swap(coord_1, coord_2)
+        if result == 0:
+            self._flush_moves()
+            self.stream.write(bytes([OP_SWAP, coord_1[0] + 16*coord_1[1], coord_2[0] + 16*coord_2[1]]))
+            self._step()
+        return result
+
+    def delete(self, coordinates: typing.List[int])-> typing.Literal[-2, -1, 0]:
+        """Same as Game2048.delete(), the deletion is recorded if it succeeded"""
+        result: typing.Literal[-2, -1, 0] = self.game.delete(coordinates)
+        if result == 0:
+            self._flush_moves()
+            self.stream.write(bytes([OP_DELETE, coordinates[0] + 16*coordinates[1]]))
+            self._step()
+        return result
+
+    def close(self):
+        """Write the end of the replay with the final score, moves, game state and grid, followed by the index of the keyframes"""
+        self._flush_moves()
+        self.stream.write(bytes([OP_END]))
+        write_varint(self.stream, self.game.score)
+        write_varint(self.stream, self.game.moves)
+        self.stream.write(struct.pack("<b", self.game.game_state))
+        self.stream.write(bytes([tile for row in self.game.grid for tile in row]))
+        index_offset: int = self.stream.tell() - self.start
+        write_varint(self.stream, self.steps)
+        write_varint(self.stream, len(self.keyframes))
+        for step, offset in self.keyframes:
+            write_varint(self.stream, step)
+            write_varint(self.stream, offset)
+        self.stream.write(TRAILER.pack(index_offset, INDEX_MAGIC))
+
+def decode_operations(operations: bytes)-> typing.Iterator[typing.Tuple[int, ...]]:
+    """Yield recorded operations one by one: (OP_ONE_MOVE, direction), (OP_UNDO,), (OP_SWAP, coord_1, coord_2) or (OP_DELETE, coordinates)"""
+    index: int = 0
+    while index < len(operations):
+        operation: int = operations[index]
+        index += 1
+        if operation < OP_TWO_MOVES:
+            yield OP_ONE_MOVE, operation & 3
+            yield OP_ONE_MOVE, (operation >> 2) & 3
+            yield OP_ONE_MOVE, operation >> 4
+        elif operation < OP_ONE_MOVE:
+            yield OP_ONE_MOVE, operation & 3
+            yield OP_ONE_MOVE, (operation >> 2) & 3
+        elif operation < OP_UNDO:
+            yield OP_ONE_MOVE, operation & 3
+        elif operation == OP_UNDO:
+            yield OP_UNDO,
+        elif operation == OP_SWAP:
+            yield OP_SWAP, [operations[index] & 0xF, operations[index] >> 4], [operations[index + 1] & 0xF, operations[index + 1] >> 4]
+            index += 2
+        elif operation == OP_DELETE:
+            yield OP_DELETE, [operations[index] & 0xF, operations[index] >> 4]
+            index += 1
+        else:
+            raise ReplayError(f"Unknown operation {operation}")
+
+def apply_operation(game: Game2048, operation: typing.Tuple[int, ...]):
+    """Make a move or use a powerup yielded by decode_operations()"""
+    if operation[0] == OP_ONE_MOVE:
+        game.public_move(operation[1])
+    elif operation[0] == OP_UNDO:
+        game.undo()
+    elif operation[0] == OP_SWAP:
+        game.swap(operation[1], operation[2])
+    else:
+        game.delete(operation[1])
+
+def read_operations(stream: typing.BinaryIO, stop_at_keyframe: bool = False)-> typing.Tuple[bytes, int]:
+    """Read the moves and powerups of a replay until OP_END and return them and the operation they ended with
+
+    Keyframes are skipped, unless stop_at_keyframe is True, then reading ends right after the next OP_KEYFRAME"""
+    operations: bytearray = bytearray()
+    while True:
+        operation: int = read_exact(stream, 1)[0]
+        if operation == OP_END:
+            return bytes(operations), operation
+        if operation == OP_KEYFRAME:
+            if stop_at_keyframe:
+                return bytes(operations), operation
+            read_exact(stream, read_varint(stream))
+            continue
+        operations.append(operation)
+        if operation == OP_SWAP:
+            operations.extend(read_exact(stream, 2))
+        elif operation == OP_DELETE:
+            operations.extend(read_exact(stream, 1))
+
+class Replay:
+    """A replay read from a stream, holds everything needed to play the game again and its recorded final state"""
+    def __init__(self, powerup_mode: int, seed: int, rows: int, cols: int, custom_grid: typing.List[typing.List[int]] | None, operations: bytes,
+                 score: int, moves: int, game_state: int, grid: typing.List[typing.List[int]]):
+        self.powerup_mode: int = powerup_mode
+        self.seed: int = seed
+        self.rows: int = rows
+        self.cols: int = cols
+        self.custom_grid: typing.List[typing.List[int]] | None = custom_grid
+        self.operations: bytes = operations
+        self.score: int = score
+        self.moves: int = moves
+        self.game_state: int = game_state
+        self.grid: typing.List[typing.List[int]] = grid
+
+    def new_game(self, engine: typing.Literal["bitboard", "list"] | None = None)-> Game2048:
+        """Return the game the replay starts with"""
+        return Game2048(custom_grid = self.custom_grid, powerup_mode = self.powerup_mode, engine = engine, seed = self.seed, rows = self.rows, cols = self.cols)
+
+    def iter_operations(self)-> typing.Iterator[typing.Tuple[int, ...]]:
+        """Yield the recorded operations one by one, see decode_operations()"""
+        return decode_operations(self.operations)
+
+    def play(self, engine: typing.Literal["bitboard", "list"] | None = None, on_operation: typing.Callable[[Game2048], None] | None = None)-> Game2048:
+        """Play the recorded moves and powerups without rendering and return the game, on_operation is called with the game after every one of them"""
+        game: Game2048 = self.new_game(engine)
+        for operation in decode_operations(self.operations):
+            apply_operation(game, operation)
+            if on_operation is not None:
+                on_operation(game)
+        return game
+
+    def verify(self, engine: typing.Literal["bitboard", "list"] | None = None)-> bool:
+        """Play the replay and return whether the final score, moves, game state and grid match the recorded ones"""
+        game: Game2048 = self.play(engine)
+        return game.score == self.score and game.moves == self.moves and game.game_state == self.game_state and game.grid == self.grid
+
+def read_header(stream: typing.BinaryIO)-> typing.Tuple[int, int, int, int, int, typing.List[typing.List[int]] | None, int] | None:
+    """Read the header of the next replay of a stream and return its version, powerup mode, seed, rows, columns, custom grid and keyframe interval,
+    None if the stream is at its end"""
+    header: bytes = stream.read(HEADER.size)
+    if not header:
+        return None
+    if len(header) != HEADER.size:
+        raise ReplayError("Replay ended inside its header")
+    magic, version, powerup_mode, seed, rows, columns, custom = HEADER.unpack(header)
+    if magic != MAGIC:
+        raise ReplayError("Not a replay of a game of 2048")
+    if version in (1, 2):
+        raise ReplayError(f"Replay version {version} was recorded with the previous random generator of the game and can not be played again")
+    if version != VERSION:
+        raise ReplayError(f"Unsupported replay version {version}")
+    custom_grid: typing.List[typing.List[int]] | None = to_grid(read_exact(stream, rows*columns), columns) if custom else None
+    keyframe_interval: int = read_varint(stream)
+    return version, powerup_mode, seed, rows, columns, custom_grid, keyframe_interval
+
+def read_replay(stream: typing.BinaryIO)-> Replay | None:
+    """Read the next replay of a stream, None if the stream is at its end, keyframes and the index are skipped"""
+    header: typing.Tuple[int, int, int, int, int, typing.List[typing.List[int]] | None, int] | None = read_header(stream)
+    if header is None:
+        return None
+    version, powerup_mode, seed, rows, columns, custom_grid, keyframe_interval = header
+    operations, end = read_operations(stream)
+    score: int = read_varint(stream)
+    moves: int = read_varint(stream)
+    game_state: int = struct.unpack("<b", read_exact(stream, 1))[0]
+    grid: typing.List[typing.List[int]] = to_grid(read_exact(stream, rows*columns), columns)
+    read_varint(stream)
+    for keyframe_index in range(2 * read_varint(stream)):
+        read_varint(stream)
+    if TRAILER.unpack(read_exact(stream, TRAILER.size))[1] != INDEX_MAGIC:
+        raise ReplayError("Replay does not end with its index")
+    return Replay(powerup_mode, seed, rows, columns, custom_grid, operations, score, moves, game_state, grid)
+
+def iter_replays(stream: typing.BinaryIO)-> typing.Iterator[Replay]:
+    """Yield every replay of a stream of concatenated replays"""
+    while True:
+        replay: Replay | None = read_replay(stream)
+        if replay is None:
+            return
+        yield replay
+
+def replay_offsets(stream: typing.BinaryIO)-> typing.Iterator[typing.Tuple[int, int]]:
+    """Yield the offsets where every replay of a seekable stream of concatenated replays starts and ends"""
+    start: int = stream.tell()
+    while read_replay(stream) is not None:
+        end: int = stream.tell()
+        yield start, end
+        start = end
+
+class ReplayFile:
+    """Random access to the steps of a replay in a seekable stream, any step is reached from the nearest keyframe before it
+
+    Methods:
+    self.game_at(step) - Returns the game after the said number of steps
+    self.operation(step) - Returns the operation made after the said number of steps
+    self.new_game() - Returns the game the replay starts with
+    """
+    def __init__(self, stream: typing.BinaryIO, start: int = 0, end: int | None = None):
+        """Read the header and the keyframe index of a replay
+
+        Parameters:
+
+            stream = a seekable binary file-like object holding the replay
+
+            start, end = the offsets the replay starts and ends at, by default it fills the whole stream, see replay_offsets() for archives
+        """
+        self.stream: typing.BinaryIO = stream
+        self.start: int = start
+        stream.seek(start)
+        header: typing.Tuple[int, int, int, int, int, typing.List[typing.List[int]] | None, int] | None = read_header(stream)
+        if header is None:
+            raise ReplayError("No replay at the start offset")
+        self.version, self.powerup_mode, self.seed, self.rows, self.cols, self.custom_grid, self.keyframe_interval = header
+        self.operations_start: int = stream.tell()
+        #Every segment starts at a keyframe (or at the start of the game for number -1) and holds the operations until the next one
+        self._segments: typing.Dict[int, typing.Tuple[Keyframe | None, typing.List[typing.Tuple[int, ...]]]] = {}
+        self.keyframe_steps: typing.List[int] = []
+        self.keyframe_offsets: typing.List[int] = []
+        if end is None:
+            end = stream.seek(0, io.SEEK_END)
+        stream.seek(end - TRAILER.size)
+        index_offset, index_magic = TRAILER.unpack(read_exact(stream, TRAILER.size))
+        if index_magic != INDEX_MAGIC:
+            raise ReplayError("Replay does not end with its index")
+        stream.seek(start + index_offset)
+        self.steps: int = read_varint(stream)
+        for keyframe_index in range(read_varint(stream)):
+            self.keyframe_steps.append(read_varint(stream))
+            self.keyframe_offsets.append(read_varint(stream))
+
+    def new_game(self)-> Game2048:
+        """Return the game the replay starts with"""
+        return Game2048(custom_grid = self.custom_grid, powerup_mode = self.powerup_mode, seed = self.seed, rows = self.rows, cols = self.cols)
+
+    def _segment(self, keyframe_index: int)-> typing.Tuple[Keyframe | None, typing.List[typing.Tuple[int, ...]]]:
+        """Return the keyframe of the said number, None for -1, and the operations following it until the next keyframe"""
+        segment: typing.Tuple[Keyframe | None, typing.List[typing.Tuple[int, ...]]] | None = self._segments.get(keyframe_index)
+        if segment is not None:
+            return segment
+        keyframe: Keyframe | None = None
+        if keyframe_index == -1:
+            self.stream.seek(self.operations_start)
+        else:
+            self.stream.seek(self.start + self.keyframe_offsets[keyframe_index])
+            if read_exact(self.stream, 1)[0] != OP_KEYFRAME:
+                raise ReplayError("The keyframe index does not point to a keyframe")
+            keyframe = read_keyframe(self.stream, self.keyframe_steps[keyframe_index], self.rows * self.cols)
+        segment = (keyframe, list(decode_operations(read_operations(self.stream, stop_at_keyframe = True)[0])))
+        #Only a few segments are kept, stepping back and forth over a keyframe needs the two around it
+        if len(self._segments) >= 4:
+            del self._segments[next(iter(self._segments))]
+        self._segments[keyframe_index] = segment
+        return segment
+
+    def _history_states(self, keyframe_index: int, length: int)-> typing.List[typing.Tuple[int | bytes, int, int, int]]:
+        """Return the oldest length states of the undo history at the keyframe of the said number, collected from the keyframes before it"""
+        parts: typing.List[typing.List[typing.Tuple[int | bytes, int, int, int]]] = []
+        while length > 0 and keyframe_index >= 0:
+            keyframe: Keyframe = self._segment(keyframe_index)[0]
+            if length > keyframe.history_kept:
+                parts.append(keyframe.history_states[:length - keyframe.history_kept])
+                length = keyframe.history_kept
+            keyframe_index -= 1
+        return [state for part in reversed(parts) for state in part]
+
+    def operation(self, step: int)-> typing.Tuple[int, ...]:
+        """Return the operation made after the said number of steps, see decode_operations()"""
+        if not 0 <= step < self.steps:
+            raise IndexError("Step out of the replay")
+        keyframe_index: int = bisect.bisect_right(self.keyframe_steps, step) - 1
+        return self._segment(keyframe_index)[1][step - (self.keyframe_steps[keyframe_index] if keyframe_index >= 0 else 0)]
+
+    def game_at(self, step: int)-> Game2048:
+        """Return the game after the said number of steps, it is restored from the nearest keyframe and at most keyframe interval steps are played"""
+        step = max(0, min(step, self.steps))
+        keyframe_index: int = bisect.bisect_right(self.keyframe_steps, step) - 1
+        keyframe, operations = self._segment(keyframe_index)
+        game: Game2048 = self.new_game()
+        first_step: int = 0
+        if keyframe is not None:
+            keyframe.restore(game, self._history_states(keyframe_index, keyframe.history_kept + len(keyframe.history_states)))
+            first_step = keyframe.step
+        for operation in operations[:step - first_step]:
+            apply_operation(game, operation)
+        return game
+
+def view(replay_file: ReplayFile, step: int = 0, input_function: typing.Callable[[str], str] = input):
+    """Show the game of a replay step by step, commands are read by input_function
+
+    Commands: ENTER or n steps forward, p steps back, +N and -N step N steps, g N goes to step N, e goes to the end, q quits"""
+    step = max(0, min(step, replay_file.steps))
+    game: Game2048 = replay_file.game_at(step)
+    while True:
+        print(game)
+        print(f"Step {step}/{replay_file.steps}")
+        try:
+            command: str = input_function("[ENTER/n] next, [p] previous, [+N/-N] step N, [g N] go to step N, [e] end, [q] quit: ").strip().lower()
+        except EOFError:
+            return
+        try:
+            if command in ("", "n"):
+                target: int = step + 1
+            elif command == "p":
+                target: int = step - 1
+            elif command[:1] in ("+", "-"):
+                target: int = step + int(command)
+            elif command[:1] == "g":
+                target: int = int(command[1:])
+            elif command == "e":
+                target: int = replay_file.steps
+            elif command == "q":
+                return
+            else:
+                print(f"Unknown command {command!r}")
+                continue
+        except ValueError:
+            print(f"Invalid number in {command!r}")
+            continue
+        target = max(0, min(target, replay_file.steps))
+        if target == step + 1:
+            #Stepping forward makes the next operation instead of seeking
+            apply_operation(game, replay_file.operation(step))
+        elif target != step:
+            game = replay_file.game_at(target)
+        step = target
+
+def view_main(args: typing.List[str]):
+    """Step through a replay of an archive given by command line arguments"""
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(prog = "cmdgame2048.py --view", description = "Step forward and back through a recorded game")
+    parser.add_argument("archive")
+    parser.add_argument("--game", type = int, default = 0, help = "number of the replay in the archive, the first one by default")
+    parser.add_argument("--step", type = int, default = 0, help = "step to start at")
+    options: argparse.Namespace = parser.parse_args(args)
+
+    with open(options.archive, "rb") as archive_file:
+        for replay_index, (start, end) in enumerate(replay_offsets(archive_file)):
+            if replay_index == options.game:
+                view(ReplayFile(archive_file, start, end), options.step)
+                return
+    print(f"The archive has no game number {options.game}")
+
+def main(args: typing.List[str]):
+    """Verify every replay of the archive files given as arguments and print the results"""
+    if not args:
+        print("Usage: python cmdgame2048.py --replay ARCHIVE...")
+        return
+    games: int = 0
+    failed: int = 0
+    moves: int = 0
+    start_time: float = time.perf_counter()
+    for path in args:
+        with open(path, "rb") as replay_file:
+            for replay_index, replay in enumerate(iter_replays(replay_file)):
+                games += 1
+                moves += replay.moves
+                if not replay.verify():
+                    failed += 1
+                    print(f"{path} game {replay_index} (seed {replay.seed}) does not match its recorded final state")
+    elapsed: float = time.perf_counter() - start_time
+    print(f"Verified {games} games, {failed} failed, {moves} moves in {elapsed:.2f}s ({moves / elapsed if elapsed > 0 else 0.0:.0f} moves/s)")
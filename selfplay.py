@@ -0,0 +1,244 @@
+import argparse
+import concurrent.futures
+import io
+import json
+import random
+import statistics
+import time
+import typing
+import replay
+from cmdgame2048 import Game2048, MERGE_INFO_SCORE, empty_mask, get_row_tables, merge_row, move_board
+
+STRATEGIES: typing.Tuple[str, ...] = ("random", "greedy", "expectimax")
+_solver = None
+
+def random_move(game: Game2048, rng: random.Random)-> int:
+    """Return a random direction out of the ones changing the board, -1 if there is none"""
+    legal_mask: int = game.legal_moves()
+    directions: typing.List[int] = [direction for direction in range(4) if legal_mask >> direction & 1]
+    if not directions:
+        return -1
+    return rng.choice(directions)
+
+def greedy_move(game: Game2048, rng: random.Random)-> int:
+    """Return the direction scoring the most points right away, ties are broken by the number of empty tiles left"""
+    legal_mask: int = game.legal_moves()
+    best_direction: int = -1
+    best_value: typing.Tuple[int, int] = (-1, -1)
+    for direction in range(4):
+        if legal_mask >> direction & 1:
+            value: typing.Tuple[int, int]
+            if game.packed:
+                new_board, merge_info = move_board(game.board, direction, game.rows, game.cols)
+                value = (merge_info >> MERGE_INFO_SCORE, (empty_mask(new_board) & game.cells_mask).bit_count())
+            else:
+                value = greedy_value_grid(game.grid, direction)
+            if value > best_value:
+                best_value = value
+                best_direction = direction
+    return best_direction
+
+def greedy_value_grid(grid: typing.List[typing.List[int]], direction: int)-> typing.Tuple[int, int]:
+    """Return the score of a move of the list engine and the number of empty tiles after it, every merge empties a tile"""
+    lines: typing.List[typing.List[int]] | typing.Iterator[typing.Tuple[int, ...]] = grid if direction % 2 == 0 else zip(*grid)
+    score: int = 0
+    empty_tiles: int = 0
+    for line in lines:
+        new_line, merged_levels = merge_row(list(line[::-1]) if direction >= 2 else list(line))
+        score += sum([2**level for level in merged_levels])
+        empty_tiles += new_line.count(0)
+    return score, empty_tiles
+
+def expectimax_move(game: Game2048, rng: random.Random)-> int:
+    """Return the direction chosen by the expectimax solver of this process"""
+    return _solver.best_move(game)
+
+def check_strategy(strategy: str, rows: int = 4, cols: int = 4, powerup_mode: int = 0, auto_powerups: bool = False):
+    """Raise ValueError if the strategy is unknown or can not play boards of the said size, the expectimax solver only searches 4x4 boards.
+    Using the powerups automatically also needs a powerup mode that has them"""
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown strategy {strategy!r}, expected one of {', '.join(STRATEGIES)}")
+    if strategy == "expectimax" and (rows != 4 or cols != 4):
+        raise ValueError("The expectimax strategy only plays 4x4 boards")
+    if auto_powerups and powerup_mode not in (1, 2):
+        raise ValueError("Using the powerups automatically needs powerup mode 1 or 2")
+
+def init_worker(strategy: str):
+    """Build the lookup tables before the first game so they do not count into its wall time"""
+    get_row_tables()
+    if strategy == "expectimax":
+        import ai
+        ai.get_heuristic_table()
+
+def get_strategy(strategy: str, time_limit_ms: float = 10.0)-> typing.Callable[[Game2048, random.Random], int]:
+    """Return the function choosing the moves of the strategy, the expectimax solver of this process is created when needed"""
+    global _solver
+    if strategy == "expectimax" and (_solver is None or _solver.time_limit_ms != time_limit_ms):
+        import ai
+        _solver = ai.Expectimax(time_limit_ms = time_limit_ms)
+    return {"random": random_move, "greedy": greedy_move, "expectimax": expectimax_move}[strategy]
+
+def play_game(game_index: int, seed: int, strategy: str, powerup_mode: int = 0, time_limit_ms: float = 10.0, record: bool = False, rows: int = 4, cols: int = 4,
+              auto_powerups: bool = False)-> typing.Dict[str, typing.Any]:
+    """Play a whole game without any rendering and return its results, is run in the worker processes
+
+    Parameters:
+
+        game_index = an integer, the number of the game in the tournament
+
+        seed = an integer, seeds both the spawns and the random choices of the strategy
+
+        strategy = one of STRATEGIES
+
+        powerup_mode = same as in Game2048.restart()
+
+        time_limit_ms = a float, the time budget of the expectimax solver per move
+
+        record = a boolean, if True the binary replay of the game is returned under the "replay" key
+
+        rows, cols = integers, the size of the board, the expectimax strategy only plays 4x4 boards, see check_strategy()
+
+        auto_powerups = a boolean, if True the powerups are used by planner.use_powerups() whenever the game is lost, needs powerup_mode 1 or 2
+    """
+    if auto_powerups:
+        import planner
+        powerup_planner: planner.PowerupPlanner = planner.PowerupPlanner(seed = seed)
+    choose_move: typing.Callable[[Game2048, random.Random], int] = get_strategy(strategy, time_limit_ms)
+    rng: random.Random = random.Random(seed)
+    start_time: float = time.perf_counter()
+    game: Game2048 = Game2048(powerup_mode = powerup_mode, seed = seed, rows = rows, cols = cols)
+    replay_stream: io.BytesIO | None = None
+    player: Game2048 | replay.GameRecorder = game
+    if record:
+        replay_stream = io.BytesIO()
+        player = replay.GameRecorder(game, replay_stream)
+    moves_to_2048: int | None = None
+    while True:
+        direction: int = choose_move(game, rng) if game.game_state > 0 else -1
+        if direction == -1:
+            if auto_powerups and planner.use_powerups(game, player, powerup_planner):
+                continue
+            break
+        player.public_move(direction)
+        if moves_to_2048 is None and abs(game.game_state) == 2:
+            moves_to_2048 = game.moves
+    result: typing.Dict[str, typing.Any] = {
+        "game": game_index,
+        "seed": seed,
+        "strategy": strategy,
+        "score": game.score,
+        "moves": game.moves,
+        "max_tile": 2 ** max([max(row) for row in game.grid]),
+        "won": abs(game.game_state) == 2,
+        "game_state": game.game_state,
+        "powerup_mode": powerup_mode,
+        "powerups_used": game.powerups_used,
+        "moves_to_2048": moves_to_2048,
+        "wall_time": time.perf_counter() - start_time,
+    }
+    if replay_stream is not None:
+        player.close()
+        result["replay"] = replay_stream.getvalue()
+    return result
+
+def summarize(results: typing.List[typing.Dict[str, typing.Any]], elapsed: float)-> typing.Dict[str, typing.Any]:
+    """Return the aggregate statistics of a list of game results"""
+    scores: typing.List[int] = [result["score"] for result in results]
+    total_moves: int = sum([result["moves"] for result in results])
+    max_tiles: typing.Dict[int, int] = {}
+    for result in results:
+        max_tiles[result["max_tile"]] = max_tiles.get(result["max_tile"], 0) + 1
+    return {
+        "games": len(results),
+        "moves": total_moves,
+        "elapsed": elapsed,
+        "moves_per_second": total_moves / elapsed if elapsed > 0 else 0.0,
+        "mean_score": statistics.fmean(scores) if scores else 0.0,
+        "median_score": statistics.median(scores) if scores else 0,
+        "max_score": max(scores, default = 0),
+        "win_rate": sum([result["won"] for result in results]) / len(results) if results else 0.0,
+        "max_tiles": dict(sorted(max_tiles.items())),
+        "mean_powerups_used": statistics.fmean([result["powerups_used"] for result in results]) if results else 0.0,
+    }
+
+def run_selfplay(games: int, *, workers: int | None = None, strategy: str = "random", seed: int = 0, powerup_mode: int = 0,
+                 time_limit_ms: float = 10.0, output: str | None = None, record: str | None = None, on_result: typing.Callable[[typing.Dict[str, typing.Any]], None] | None = None,
+                 rows: int = 4, cols: int = 4, auto_powerups: bool = False)-> typing.Dict[str, typing.Any]:
+    """Play games across worker processes and return the summary, results are written to output as JSON lines once they finish
+
+    Parameters:
+
+        games = an integer, the number of games to play
+
+        workers = an integer, the number of worker processes, None uses one per CPU
+
+        strategy = one of STRATEGIES
+
+        seed = an integer, game number n is played with the seed seed + n
+
+        powerup_mode = same as in Game2048.restart()
+
+        time_limit_ms = a float, the time budget of the expectimax solver per move
+
+        output = a path of the JSON lines file, None does not write any
+
+        record = a path of the archive the replays of all games are written into, None does not record them
+
+        on_result = a function called with every result as soon as its game finishes
+
+        rows, cols = integers, the size of the boards
+
+        auto_powerups = a boolean, if True the games use their powerups when they are lost, see play_game()
+    """
+    check_strategy(strategy, rows, cols, powerup_mode, auto_powerups)
+    results: typing.List[typing.Dict[str, typing.Any]] = []
+    start_time: float = time.perf_counter()
+    output_file: typing.TextIO | None = open(output, "w") if output is not None else None
+    record_file: typing.BinaryIO | None = open(record, "wb") if record is not None else None
+    try:
+        with concurrent.futures.ProcessPoolExecutor(max_workers = workers, initializer = init_worker, initargs = (strategy,)) as executor:
+            futures: typing.List[concurrent.futures.Future] = [executor.submit(play_game, game_index, seed + game_index, strategy, powerup_mode, time_limit_ms, record_file is not None, rows, cols,
+                                                                               auto_powerups) for game_index in range(games)]
+            for future in concurrent.futures.as_completed(futures):
+                result: typing.Dict[str, typing.Any] = future.result()
+                if record_file is not None:
+                    record_file.write(result.pop("replay"))
+                results.append(result)
+                if output_file is not None:
+                    output_file.write(json.dumps(result) + "\n")
+                    output_file.flush()
+                if on_result is not None:
+                    on_result(result)
+    finally:
+        if output_file is not None:
+            output_file.close()
+        if record_file is not None:
+            record_file.close()
+    return summarize(results, time.perf_counter() - start_time)
+
+def main(args: typing.List[str]):
+    """Run a self-play tournament from command line arguments and print its summary"""
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(prog = "cmdgame2048.py --selfplay", description = "Play many games of 2048 without any rendering")
+    parser.add_argument("--games", type = int, default = 100, help = "number of games to play")
+    parser.add_argument("--workers", type = int, default = None, help = "number of worker processes, one per CPU by default")
+    parser.add_argument("--strategy", choices = STRATEGIES, default = "random")
+    parser.add_argument("--seed", type = int, default = 0, help = "game number n is played with the seed SEED + n")
+    parser.add_argument("--powerup-mode", type = int, choices = (0, 1, 2), default = 0)
+    parser.add_argument("--rows", type = int, default = 4, help = "number of rows of the boards")
+    parser.add_argument("--cols", type = int, default = 4, help = "number of columns of the boards")
+    parser.add_argument("--time-limit-ms", type = float, default = 10.0, help = "time budget of the expectimax strategy per move")
+    parser.add_argument("--output", default = "selfplay.jsonl", help = "JSON lines file with the result of every game")
+    parser.add_argument("--record", default = None, help = "archive file the binary replays of all games are written into")
+    parser.add_argument("--auto-powerups", action = "store_true", help = "use the undos, swaps and deletes ranked by planner.py once a game is lost, needs --powerup-mode 1 or 2")
+    parser.add_argument("--quiet", action = "store_true", help = "do not print the result of every game")
+    options: argparse.Namespace = parser.parse_args(args)
+    try:
+        check_strategy(options.strategy, options.rows, options.cols, options.powerup_mode, options.auto_powerups)
+    except ValueError as error:
+        parser.error(str(error))
+
+    print_result = lambda result: print(f"Game {result['game']}: score {result['score']}, moves {result['moves']}, max tile {result['max_tile']}, {'won' if result['won'] else 'lost'} in {result['wall_time']:.2f}s")
+    summary: typing.Dict[str, typing.Any] = run_selfplay(options.games, workers = options.workers, strategy = options.strategy, seed = options.seed, powerup_mode = options.powerup_mode,
+                                                         time_limit_ms = options.time_limit_ms, output = options.output, record = options.record, on_result = None if options.quiet else print_result,
+                                                         rows = options.rows, cols = options.cols, auto_powerups = options.auto_powerups)
+    print(json.dumps(summary, indent = 4))
@@ -0,0 +1,225 @@
+"""TCP server hosting many games of 2048 in one process
+
+Every connection plays its own game. Commands and replies are single lines of text:
+
+    move L|U|R|D            make a move (0-3 work as well)
+    undo                    undo the last move
+    swap X1 Y1 X2 Y2        swap two tiles, coordinates start from 0 at the top left
+    delete X Y              delete all tiles with the number of the tile on the coordinates
+    state                   return the state of the game
+    new [POWERUP_MODE]      start a new game
+    stats                   return the number of sessions and memory used by the server
+    quit                    close the connection
+
+The server greets with the state of the new game and answers every command by one line. The state is
+OK SCORE MOVES GAME_STATE UNDOS SWAPS DELETES ROWSxCOLS BOARD, where BOARD are the tile exponents separated by commas
+with rows separated by slashes. Failed commands are answered with ERR and the reason. Sessions idle for longer than the idle timeout are closed.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+import typing
+from cmdgame2048 import Game2048
+
+DIRECTIONS: typing.Dict[str, int] = {"L": 0, "U": 1, "R": 2, "D": 3, "0": 0, "1": 1, "2": 2, "3": 3}
+POWERUP_ERRORS: typing.Dict[int, str] = {-1: "ERR no uses left", -2: "ERR not possible"}
+#Longest accepted command line in bytes
+MAX_LINE_LENGTH: int = 256
+
+def process_memory()-> int:
+    """Return the resident memory of the process in bytes, the peak one where the current one is not available"""
+    try:
+        with open("/proc/self/statm") as statm_file:
+            return int(statm_file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        import resource
+        peak: int = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+def format_state(game: Game2048)-> str:
+    """Return the state line of a game"""
+    board: str = "/".join([",".join([str(tile) for tile in row]) for row in game.grid])
+    return f"OK {game.score} {game.moves} {game.game_state} {game.undos_left} {game.swaps_left} {game.deletes_left} {game.rows}x{game.cols} {board}"
+
+class Session:
+    """A connected player, holds only the game, the connection and the time of the last command"""
+    __slots__ = ("game", "writer", "last_active")
+
+    def __init__(self, game: Game2048, writer: asyncio.StreamWriter):
+        self.game: Game2048 = game
+        self.writer: asyncio.StreamWriter = writer
+        self.last_active: float = time.monotonic()
+
+class GameServer:
+    """Serves games of 2048 over TCP, see the module docstring for the protocol
+
+    Methods:
+    self.start() - Starts listening
+    self.serve_forever() - Starts listening and serves until cancelled
+    self.handle_command(session, line) - Runs a command of a session and returns the reply
+    self.close() - Stops listening and closes all sessions
+    """
+    def __init__(self, host: str = "127.0.0.1", port: int = 2048, *, idle_timeout: float = 300.0, max_sessions: int = 10000,
+                 powerup_mode: int = 0, rows: int = 4, cols: int = 4):
+        """Create a new server, it does not listen until it is started
+
+        Parameters:
+
+            host, port = the address to listen on, port 0 picks a free port
+
+            idle_timeout = a float, sessions without any command for this many seconds are closed
+
+            max_sessions = an integer, connections over this number of sessions are refused
+
+            powerup_mode, rows, cols = same as in Game2048.restart(), used for every new game
+        """
+        self.host: str = host
+        self.port: int = port
+        self.idle_timeout: float = idle_timeout
+        self.max_sessions: int = max_sessions
+        self.powerup_mode: int = powerup_mode
+        self.rows: int = rows
+        self.cols: int = cols
+        self.sessions: typing.Set[Session] = set()
+        self.moves: int = 0
+        self.evicted: int = 0
+        self._server: asyncio.Server | None = None
+        self._evictor: asyncio.Task | None = None
+
+    async def start(self):
+        """Start listening and evicting idle sessions, self.port is set to the port listened on"""
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port, limit = MAX_LINE_LENGTH)
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._evictor = asyncio.create_task(self._evict_idle_sessions())
+
+    async def serve_forever(self):
+        if self._server is None:
+            await self.start()
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.close()
+
+    async def close(self):
+        """Stop listening and close all sessions"""
+        if self._evictor is not None:
+            self._evictor.cancel()
+        if self._server is not None:
+            self._server.close()
+        for session in list(self.sessions):
+            session.writer.close()
+        self.sessions.clear()
+
+    async def _evict_idle_sessions(self):
+        """Close the sessions which have been idle for longer than the idle timeout"""
+        while True:
+            await asyncio.sleep(max(1.0, self.idle_timeout / 4))
+            oldest_allowed: float = time.monotonic() - self.idle_timeout
+            for session in [session for session in self.sessions if session.last_active < oldest_allowed]:
+                self.sessions.discard(session)
+                self.evicted += 1
+                try:
+                    session.writer.write(b"BYE idle\n")
+                except (ConnectionError, RuntimeError):
+                    pass
+                session.writer.close()
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        if len(self.sessions) >= self.max_sessions:
+            writer.write(b"ERR server full\n")
+            await writer.drain()
+            writer.close()
+            return
+        session: Session = Session(Game2048(powerup_mode = self.powerup_mode, rows = self.rows, cols = self.cols), writer)
+        self.sessions.add(session)
+        try:
+            writer.write((format_state(session.game) + "\n").encode())
+            while session in self.sessions:
+                try:
+                    line: bytes = await reader.readline()
+                except (ValueError, asyncio.LimitOverrunError):
+                    writer.write(b"ERR line too long\n")
+                    break
+                if not line:
+                    break
+                session.last_active = time.monotonic()
+                reply: str | None = self.handle_command(session, line.decode(errors = "replace"))
+                if reply is None:
+                    break
+                writer.write((reply + "\n").encode())
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.sessions.discard(session)
+            writer.close()
+
+    def handle_command(self, session: Session, line: str)-> str | None:
+        """Run a command line of a session and return the reply, None if the connection should be closed"""
+        words: typing.List[str] = line.split()
+        if not words:
+            return "ERR empty command"
+        command: str = words[0].lower()
+        game: Game2048 = session.game
+        try:
+            if command == "move" and len(words) == 2 and words[1].upper() in DIRECTIONS:
+                moves: int = game.moves
+                game.public_move(DIRECTIONS[words[1].upper()])
+                self.moves += game.moves - moves
+                return format_state(game)
+            elif command == "state" and len(words) == 1:
+                return format_state(game)
+            elif command == "undo" and len(words) == 1:
+                result: int = game.undo()
+            elif command == "swap" and len(words) == 5:
+                coordinates: typing.List[int] = [int(word) for word in words[1:]]
+                if not all(0 <= coordinates[index] < game.cols and 0 <= coordinates[index + 1] < game.rows for index in (0, 2)):
+                    return "ERR coordinates out of the board"
+                result: int = game.swap(coordinates[:2], coordinates[2:])
+            elif command == "delete" and len(words) == 3:
+                coordinates: typing.List[int] = [int(word) for word in words[1:]]
+                if not (0 <= coordinates[0] < game.cols and 0 <= coordinates[1] < game.rows):
+                    return "ERR coordinates out of the board"
+                result: int = game.delete(coordinates)
+            elif command == "new" and len(words) <= 2:
+                powerup_mode: int = int(words[1]) if len(words) == 2 else self.powerup_mode
+                if powerup_mode not in (0, 1, 2):
+                    return "ERR powerup mode must be 0, 1 or 2"
+                game.restart(powerup_mode = powerup_mode)
+                return format_state(game)
+            elif command == "stats" and len(words) == 1:
+                return f"STATS {len(self.sessions)} {process_memory()} {self.moves} {self.evicted}"
+            elif command == "quit" and len(words) == 1:
+                return None
+            else:
+                return "ERR unknown command"
+        except ValueError:
+            return "ERR invalid number"
+        if result != 0:
+            return POWERUP_ERRORS[result]
+        return format_state(game)
+
+def main(args: typing.List[str]):
+    """Run the server from command line arguments until it is interrupted"""
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(prog = "cmdgame2048.py --server", description = "Host games of 2048 over TCP")
+    parser.add_argument("--host", default = "127.0.0.1")
+    parser.add_argument("--port", type = int, default = 2048)
+    parser.add_argument("--idle-timeout", type = float, default = 300.0, help = "seconds without any command after which a session is closed")
+    parser.add_argument("--max-sessions", type = int, default = 10000)
+    parser.add_argument("--powerup-mode", type = int, choices = (0, 1, 2), default = 0)
+    parser.add_argument("--rows", type = int, default = 4)
+    parser.add_argument("--cols", type = int, default = 4)
+    options: argparse.Namespace = parser.parse_args(args)
+
+    server: GameServer = GameServer(options.host, options.port, idle_timeout = options.idle_timeout, max_sessions = options.max_sessions,
+                                    powerup_mode = options.powerup_mode, rows = options.rows, cols = options.cols)
+    async def serve():
+        await server.start()
+        print(f"Serving games of 2048 on {server.host}:{server.port}", flush = True)
+        await server.serve_forever()
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
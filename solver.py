@@ -0,0 +1,296 @@
+"""Exact values of games of 2048 on small boards
+
+The solver enumerates every board reachable on a board of up to 4x4 tiles (in practice 2x2 and 3x3, larger boards have too many states)
+and computes for each of them the probability of making the target tile and the expected score still to be made, both under optimal play.
+Boards are packed integers reduced to the smallest of their rotations and reflections. Moves keep the sum of the tiles and every spawn
+raises it by 2 or 4, so the boards are enumerated in layers by their tile sum and the values are computed backwards from the highest layer,
+holding only the values of the next two layers in dictionaries.
+
+The result is a .npy file with a structured array sorted by board, it is opened memory-mapped and looked up by binary search, so opening it
+is instant and only the pages touched by the lookups are read. The parameters of the game and the values of the start of the game are
+stored next to it in a .json file.
+
+The game ends when no move changes the board or once the target tile is made. The win probability and the expected score are maximized
+separately, so they belong to two different strategies.
+"""
+import argparse
+import json
+import time
+import typing
+import numpy as np
+from cmdgame2048 import MAX_PACKED_LEVEL, MERGE_INFO_OVERFLOW, MERGE_INFO_SCORE, board_mask, empty_mask, legal_moves_board, move_board, transpose_board
+from ai import flip_board, mirror_board
+
+TABLE_DTYPE: np.dtype = np.dtype([("board", "<u8"), ("win", "<f8"), ("score", "<f8")])
+
+def tile_sum(board: int)-> int:
+    """Return the sum of the tiles of a packed board"""
+    total: int = 0
+    while board:
+        if board & 0xF:
+            total += 2 ** (board & 0xF)
+        board >>= 4
+    return total
+
+class SmallBoardSolver:
+    """Computes and writes the exact values of all boards of one size
+
+    Methods:
+    self.canonical(board) - Returns the smallest symmetric version of a packed board
+    self.start_boards() - Returns the boards a game can start with and their probabilities
+    self.solve(path) - Enumerates all boards, computes their values and writes the table
+    """
+    def __init__(self, rows: int = 3, cols: int = 3, target: int | None = None):
+        """Create a new solver
+
+        Parameters:
+
+            rows, cols = integers up to 4, the size of the board
+
+            target = an integer, the exponent of the tile ending the game with a win, None plays until no move is left
+        """
+        if not (1 <= rows <= 4 and 1 <= cols <= 4):
+            raise ValueError("The solver only supports boards up to 4x4")
+        if target is not None and not 3 <= target <= MAX_PACKED_LEVEL:
+            raise ValueError(f"The target must be between 3 and {MAX_PACKED_LEVEL}")
+        self.rows: int = rows
+        self.cols: int = cols
+        self.target: int | None = target
+        self.cells_mask: int = board_mask(rows, cols)
+        #Boards smaller than 4x4 sit in the top left corner, so mirrored and flipped boards are shifted back into it
+        self._mirror_shift: int = 4*(4 - cols)
+        self._flip_shift: int = 16*(4 - rows)
+        self.states: int = 0
+
+    def canonical(self, board: int)-> int:
+        """Return the smallest of the rotations and reflections of a packed board, transposed boards are only used for square boards"""
+        mirror_shift: int = self._mirror_shift
+        flip_shift: int = self._flip_shift
+        mirrored: int = mirror_board(board) >> mirror_shift
+        smallest: int = min(board, mirrored, flip_board(board) >> flip_shift, flip_board(mirrored) >> flip_shift)
+        if self.rows == self.cols:
+            transposed: int = transpose_board(board)
+            mirrored = mirror_board(transposed) >> mirror_shift
+            smallest = min(smallest, transposed, mirrored, flip_board(transposed) >> flip_shift, flip_board(mirrored) >> flip_shift)
+        return smallest
+
+    def is_won(self, board: int)-> bool:
+        """Return whether a packed board has the target tile"""
+        if self.target is None:
+            return False
+        while board:
+            if board & 0xF >= self.target:
+                return True
+            board >>= 4
+        return False
+
+    def spawns(self, board: int)-> typing.List[typing.Tuple[float, int, int]]:
+        """Return the probability, canonical board and the value of the spawned tile of every spawn on a board"""
+        empty_tiles: int = empty_mask(board) & self.cells_mask
+        empty_spots: int = empty_tiles.bit_count()
+        results: typing.List[typing.Tuple[float, int, int]] = []
+        while empty_tiles:
+            tile: int = empty_tiles & -empty_tiles
+            empty_tiles ^= tile
+            results.append((0.9 / empty_spots, self.canonical(board | tile), 2))
+            results.append((0.1 / empty_spots, self.canonical(board | (tile << 1)), 4))
+        return results
+
+    def afterstates(self, board: int)-> typing.List[typing.Tuple[int, int, int]]:
+        """Return the direction, new board and score of every move changing a board"""
+        results: typing.List[typing.Tuple[int, int, int]] = []
+        legal_mask: int = legal_moves_board(board, self.rows, self.cols)
+        for direction in range(4):
+            if legal_mask >> direction & 1:
+                new_board, merge_info = move_board(board, direction, self.rows, self.cols)
+                if (merge_info >> MERGE_INFO_OVERFLOW) & 0xF:
+                    raise OverflowError("A tile above 32768 does not fit into the packed board")
+                results.append((direction, new_board, merge_info >> MERGE_INFO_SCORE))
+        return results
+
+    def start_boards(self)-> typing.Dict[int, float]:
+        """Return the canonical boards a game starts with, two tiles spawned on an empty board, and their probabilities"""
+        boards: typing.Dict[int, float] = {}
+        for first_probability, first_board, first_tile in self.spawns(0):
+            for second_probability, second_board, second_tile in self.spawns(first_board):
+                boards[second_board] = boards.get(second_board, 0.0) + first_probability * second_probability
+        return boards
+
+    def _enumerate(self, progress: typing.Callable[[str], None] | None = None)-> typing.Dict[int, np.ndarray]:
+        """Return the sorted canonical boards reachable from the start by their tile sum"""
+        pending: typing.Dict[int, typing.Set[int]] = {}
+        for board in self.start_boards():
+            pending.setdefault(tile_sum(board), set()).add(board)
+        layers: typing.Dict[int, np.ndarray] = {}
+        while pending:
+            layer_sum: int = min(pending)
+            boards: typing.Set[int] = pending.pop(layer_sum)
+            layers[layer_sum] = np.array(sorted(boards), dtype = np.uint64)
+            #Symmetric boards after a move have symmetric spawns, so every canonical one is expanded once
+            expanded: typing.Set[int] = set()
+            for board in boards:
+                for direction, new_board, score in self.afterstates(board):
+                    new_board = self.canonical(new_board)
+                    if new_board in expanded or self.is_won(new_board):
+                        continue
+                    expanded.add(new_board)
+                    for probability, spawned_board, spawned_tile in self.spawns(new_board):
+                        pending.setdefault(layer_sum + spawned_tile, set()).add(spawned_board)
+            if progress is not None:
+                progress(f"Layer {layer_sum}: {len(boards)} boards")
+        return layers
+
+    def value(self, board: int, next_values: typing.Dict[int, typing.Tuple[float, float]],
+              afterstate_values: typing.Dict[int, typing.Tuple[float, float]] | None = None)-> typing.Tuple[float, float, int, int]:
+        """Return the win probability, expected score and the directions reaching them for a board, -1 if no move is left
+
+        next_values holds the values of all boards the spawns after the moves lead to,
+        afterstate_values caches the values of the canonical boards after the moves between calls"""
+        best_win: float = 0.0
+        best_score: float = 0.0
+        win_direction: int = -1
+        score_direction: int = -1
+        for direction, new_board, score in self.afterstates(board):
+            if self.is_won(new_board):
+                win: float = 1.0
+                expected_score: float = 0.0
+            else:
+                new_board = self.canonical(new_board)
+                cached: typing.Tuple[float, float] | None = afterstate_values.get(new_board) if afterstate_values is not None else None
+                if cached is None:
+                    win: float = 0.0
+                    expected_score: float = 0.0
+                    for probability, spawned_board, spawned_tile in self.spawns(new_board):
+                        spawned_win, spawned_score = next_values[spawned_board]
+                        win += probability * spawned_win
+                        expected_score += probability * spawned_score
+                    if afterstate_values is not None:
+                        afterstate_values[new_board] = (win, expected_score)
+                else:
+                    win, expected_score = cached
+            expected_score += score
+            if win_direction == -1 or win > best_win:
+                best_win = win
+                win_direction = direction
+            if score_direction == -1 or expected_score > best_score:
+                best_score = expected_score
+                score_direction = direction
+        return best_win, best_score, win_direction, score_direction
+
+    def solve(self, path: str, progress: typing.Callable[[str], None] | None = None)-> typing.Dict[str, typing.Any]:
+        """Compute the values of all reachable boards, write the table into path (.npy) and its metadata next to it (.json)
+
+        Parameters:
+
+            path = a path of the .npy table
+
+            progress = a function called with a line describing every finished layer
+        """
+        start_time: float = time.perf_counter()
+        layers: typing.Dict[int, np.ndarray] = self._enumerate(progress)
+        layer_values: typing.Dict[int, typing.Tuple[np.ndarray, np.ndarray]] = {}
+        recent_values: typing.Dict[int, typing.Dict[int, typing.Tuple[float, float]]] = {}
+        for layer_sum in sorted(layers, reverse = True):
+            next_values: typing.Dict[int, typing.Tuple[float, float]] = {}
+            for successor_sum in (layer_sum + 2, layer_sum + 4):
+                next_values.update(recent_values.get(successor_sum, {}))
+            boards: typing.List[int] = layers[layer_sum].tolist()
+            wins: np.ndarray = np.empty(len(boards), dtype = np.float64)
+            scores: np.ndarray = np.empty(len(boards), dtype = np.float64)
+            afterstate_values: typing.Dict[int, typing.Tuple[float, float]] = {}
+            for board_index, board in enumerate(boards):
+                wins[board_index], scores[board_index] = self.value(board, next_values, afterstate_values)[:2]
+            layer_values[layer_sum] = (wins, scores)
+            recent_values[layer_sum] = dict(zip(boards, zip(wins.tolist(), scores.tolist())))
+            recent_values.pop(layer_sum + 4, None)
+            if progress is not None:
+                progress(f"Solved layer {layer_sum}")
+
+        keys: np.ndarray = np.concatenate([layers[layer_sum] for layer_sum in layers])
+        order: np.ndarray = np.argsort(keys, kind = "stable")
+        table: np.ndarray = np.lib.format.open_memmap(path, mode = "w+", dtype = TABLE_DTYPE, shape = (len(keys),))
+        table["board"] = keys[order]
+        table["win"] = np.concatenate([layer_values[layer_sum][0] for layer_sum in layers])[order]
+        table["score"] = np.concatenate([layer_values[layer_sum][1] for layer_sum in layers])[order]
+        table.flush()
+        del table
+        self.states = len(keys)
+
+        solved: SolvedTable = SolvedTable(path, {"rows": self.rows, "cols": self.cols, "target": self.target})
+        start_win: float = 0.0
+        start_score: float = 0.0
+        for board, probability in self.start_boards().items():
+            win, score = solved.lookup(board)
+            start_win += probability * win
+            start_score += probability * score
+        metadata: typing.Dict[str, typing.Any] = {
+            "rows": self.rows,
+            "cols": self.cols,
+            "target": self.target,
+            "states": self.states,
+            "start_win_probability": start_win,
+            "start_expected_score": start_score,
+            "elapsed": time.perf_counter() - start_time,
+        }
+        with open(metadata_path(path), "w") as metadata_file:
+            json.dump(metadata, metadata_file, indent = 4)
+        return metadata
+
+def metadata_path(path: str)-> str:
+    """Return the path of the metadata of a table"""
+    return (path[:-4] if path.endswith(".npy") else path) + ".json"
+
+class SolvedTable:
+    """A table written by SmallBoardSolver.solve(), opened memory-mapped
+
+    Methods:
+    self.lookup(board) - Returns the win probability and expected score of a packed board
+    self.best_move(board, objective) - Returns the optimal direction for a packed board
+    """
+    def __init__(self, path: str, metadata: typing.Dict[str, typing.Any] | None = None):
+        """Open a table, its metadata is read from the .json file next to it unless it is given"""
+        if metadata is None:
+            with open(metadata_path(path)) as metadata_file:
+                metadata = json.load(metadata_file)
+        self.metadata: typing.Dict[str, typing.Any] = metadata
+        self.table: np.ndarray = np.load(path, mmap_mode = "r")
+        self.boards: np.ndarray = self.table["board"]
+        self.solver: SmallBoardSolver = SmallBoardSolver(metadata["rows"], metadata["cols"], metadata["target"])
+
+    def __len__(self)-> int:
+        return len(self.table)
+
+    def lookup(self, board: int)-> typing.Tuple[float, float]:
+        """Return the win probability and expected score of a packed board, raise KeyError if it is not reachable"""
+        key: int = self.solver.canonical(board)
+        index: int = int(np.searchsorted(self.boards, np.uint64(key)))
+        if index == len(self.boards) or int(self.boards[index]) != key:
+            raise KeyError(board)
+        record = self.table[index]
+        return float(record["win"]), float(record["score"])
+
+    def best_move(self, board: int, objective: typing.Literal["win", "score"] = "win")-> int:
+        """Return the direction maximizing the win probability or the expected score of a packed board, -1 if no move is left"""
+        solver: SmallBoardSolver = self.solver
+        next_values: typing.Dict[int, typing.Tuple[float, float]] = {}
+        for direction, new_board, score in solver.afterstates(board):
+            if not solver.is_won(new_board):
+                for probability, spawned_board, spawned_tile in solver.spawns(new_board):
+                    next_values[spawned_board] = self.lookup(spawned_board)
+        win, score, win_direction, score_direction = solver.value(board, next_values)
+        return win_direction if objective == "win" else score_direction
+
+def main(args: typing.List[str]):
+    """Solve a small board from command line arguments and print the values of the start of the game"""
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(prog = "cmdgame2048.py --solve", description = "Compute exact values of 2048 on small boards")
+    parser.add_argument("--rows", type = int, default = 2)
+    parser.add_argument("--cols", type = int, default = 2)
+    parser.add_argument("--target", type = int, default = None, help = "exponent of the tile winning the game, by default the game is played until no move is left")
+    parser.add_argument("--output", default = None, help = "path of the .npy table, ROWSxCOLS.npy by default")
+    parser.add_argument("--quiet", action = "store_true", help = "do not print the progress")
+    options: argparse.Namespace = parser.parse_args(args)
+
+    output: str = options.output or f"{options.rows}x{options.cols}{'' if options.target is None else f'-{2**options.target}'}.npy"
+    solver: SmallBoardSolver = SmallBoardSolver(options.rows, options.cols, options.target)
+    metadata: typing.Dict[str, typing.Any] = solver.solve(output, None if options.quiet else print)
+    print(json.dumps(metadata, indent = 4))
@@ -0,0 +1,5 @@
+import os
+import sys
+
+#The modules of the game live in the root of the repository, next to cmdgame2048.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,62 @@
+"""The expectimax solver: symmetric boards, its transposition table and its time budget"""
+import statistics
+import typing
+import pytest
+import ai
+from cmdgame2048 import Game2048, legal_moves_board, pack_grid, transpose_board
+
+GRID: typing.List[typing.List[int]] = [[1, 2, 3, 4], [0, 5, 0, 6], [7, 0, 0, 1], [0, 0, 2, 0]]
+
+def symmetries(board: int)-> typing.List[int]:
+    transposed: int = transpose_board(board)
+    return [board, ai.mirror_board(board), ai.flip_board(board), ai.flip_board(ai.mirror_board(board)),
+            transposed, ai.mirror_board(transposed), ai.flip_board(transposed), ai.flip_board(ai.mirror_board(transposed))]
+
+def test_symmetric_boards_share_canonical_board_and_value():
+    boards: typing.List[int] = symmetries(pack_grid(GRID))
+    assert len(set(boards)) == 8
+    assert {ai.canonical_board(board) for board in boards} == {min(boards)}
+    assert len({round(ai.evaluate_board(board), 6) for board in boards}) == 1
+
+def test_mirror_and_flip():
+    board: int = pack_grid(GRID)
+    assert ai.mirror_board(board) == pack_grid([row[::-1] for row in GRID])
+    assert ai.flip_board(board) == pack_grid(GRID[::-1])
+
+def test_transposition_table_evicts_least_recently_used():
+    solver: ai.Expectimax = ai.Expectimax(time_limit_ms = 1000, max_depth = 2, cache_size = 20)
+    solver.best_move_board(pack_grid(GRID))
+    assert len(solver.cache) == 20
+    oldest, second_oldest = list(solver.cache)[:2]
+    #A hit makes the oldest entry the most recently used one
+    hits: int = solver.cache_hits
+    solver._chance_node(oldest, solver.cache[oldest][0], 1.0)
+    assert solver.cache_hits == hits + 1
+    assert next(reversed(solver.cache)) == oldest
+    new_board: int = pack_grid([[11, 0, 0, 0], [0, 0, 0, 0], [0, 0, 0, 0], [0, 0, 0, 1]])
+    assert ai.canonical_board(new_board) not in solver.cache
+    solver._chance_node(new_board, 1, 1.0)
+    assert len(solver.cache) == 20
+    assert ai.canonical_board(new_board) in solver.cache and oldest in solver.cache
+    assert second_oldest not in solver.cache
+
+def test_best_move_is_legal():
+    solver: ai.Expectimax = ai.Expectimax(time_limit_ms = 5)
+    game: Game2048 = Game2048(seed = 5)
+    for move_index in range(30):
+        direction: int = solver.best_move(game)
+        assert legal_moves_board(game.board) >> direction & 1
+        game.public_move(direction)
+    assert solver.best_move(Game2048(custom_grid = [[1, 2], [2, 1]], seed = 1)) == -1
+
+@pytest.mark.parametrize("time_limit_ms", [2.0, 10.0])
+def test_search_keeps_its_time_budget(time_limit_ms: float):
+    ai.get_heuristic_table()
+    solver: ai.Expectimax = ai.Expectimax(time_limit_ms = time_limit_ms)
+    game: Game2048 = Game2048(seed = 2)
+    elapsed: typing.List[float] = []
+    while game.game_state > 0 and len(elapsed) < 100:
+        game.public_move(solver.best_move(game))
+        elapsed.append(solver.stats()["elapsed_ms"])
+    assert statistics.median(elapsed) < 1.5 * time_limit_ms + 1
+    assert max(elapsed) < time_limit_ms + 25
@@ -0,0 +1,76 @@
+"""Streaming analytics: histogram buckets, merging partial aggregates and chunked reading"""
+import json
+import os
+import random
+import typing
+import pytest
+import analyze
+import replay
+from cmdgame2048 import Game2048
+
+def test_buckets_hold_their_numbers():
+    previous: int = -1
+    for number in list(range(5000)) + [2**40 - 1, 2**40, 2**62 + 12345]:
+        index: int = analyze.bucket_index(number)
+        lowest, highest = analyze.bucket_bounds(index)
+        assert lowest <= number <= highest
+        assert index >= previous
+        previous = index
+
+def test_percentiles_are_close_to_exact():
+    rng: random.Random = random.Random(1)
+    numbers: typing.List[int] = [int(rng.lognormvariate(9, 1)) for number_index in range(5001)]
+    histogram: analyze.Histogram = analyze.Histogram()
+    for number in numbers:
+        histogram.add(number)
+    numbers.sort()
+    for fraction in (0.5, 0.9, 0.99):
+        exact: int = numbers[int(fraction * len(numbers))]
+        assert histogram.percentile(fraction) == pytest.approx(exact, rel = 1 / 2**analyze.SUB_BUCKET_BITS)
+
+def test_merge_equals_one_aggregate():
+    rng: random.Random = random.Random(2)
+    games: typing.List[tuple] = [(rng.randrange(50000), rng.randrange(3000), 2**rng.randrange(4, 12), rng.random() < 0.2, rng.randrange(3), rng.randrange(5))
+                                 for game_index in range(300)]
+    whole: analyze.GameStats = analyze.GameStats()
+    parts: typing.List[analyze.GameStats] = [analyze.GameStats() for part_index in range(3)]
+    for game_index, game in enumerate(games):
+        whole.add_game(*game)
+        parts[game_index % 3].add_game(*game)
+    merged: analyze.GameStats = analyze.GameStats()
+    for part in parts:
+        merged.merge(part)
+    assert merged.report() == whole.report()
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 7, 16, 1000])
+def test_chunks_yield_every_line_once(tmp_path, chunk_size: int):
+    path: str = os.path.join(tmp_path, "lines.jsonl")
+    lines: typing.List[bytes] = [b"x" * (line_index % 5) + b"\n" for line_index in range(40)] + [b"last line without newline"]
+    with open(path, "wb") as log_file:
+        log_file.write(b"".join(lines))
+    size: int = os.path.getsize(path)
+    read: typing.List[bytes] = [line for start in range(0, size, chunk_size) for line in analyze.iter_lines(path, start, min(start + chunk_size, size))]
+    assert read == lines
+
+def test_analyze_directory(tmp_path):
+    results: typing.List[typing.Dict[str, typing.Any]] = [{"score": 100 * game_index, "moves": 10 * game_index, "max_tile": 64, "won": False, "powerup_mode": 0}
+                                                          for game_index in range(1, 21)]
+    with open(os.path.join(tmp_path, "results.jsonl"), "w") as results_file:
+        results_file.write("".join([json.dumps(result) + "\n" for result in results]) + "not json\n")
+    with open(os.path.join(tmp_path, "games.g2k"), "wb") as archive:
+        for seed in range(3):
+            game: Game2048 = Game2048(seed = seed)
+            recorder: replay.GameRecorder = replay.GameRecorder(game, archive)
+            rng: random.Random = random.Random(seed)
+            while game.game_state > 0 and game.moves < 50:
+                recorder.public_move(rng.randrange(4))
+            recorder.close()
+    #A report written next to the logs is not read as game results
+    with open(os.path.join(tmp_path, "report.json"), "w") as report_file:
+        json.dump({"games": 1}, report_file, indent = 4)
+
+    report: typing.Dict[str, typing.Any] = analyze.analyze([str(tmp_path)], workers = 2, chunk_size = 64)
+    assert report["files"] == 2
+    assert report["games"] == 23
+    assert report["malformed_records"] == 1
+    assert report["win_rate_by_powerup_mode"]["0"]["games"] == 23
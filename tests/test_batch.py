@@ -0,0 +1,46 @@
+"""Game2048Batch moves and spawns like Game2048"""
+import numpy as np
+import pytest
+from batch import Game2048Batch
+from cmdgame2048 import MERGE_INFO_SCORE, legal_moves_grid, move_board, pack_grid, unpack_board
+
+@pytest.mark.parametrize("rows, cols", [(2, 2), (3, 4), (4, 3), (4, 4)])
+def test_step_matches_the_game(rows: int, cols: int):
+    rng: np.random.Generator = np.random.default_rng(rows * cols)
+    games: Game2048Batch = Game2048Batch(500, seed = 1, rows = rows, cols = cols)
+    games.boards[:] = rng.choice(np.array([0, 0, 0, 1, 1, 2, 3, 4], dtype = np.uint8), size = games.boards.shape)
+    boards: np.ndarray = games.boards.copy()
+    directions: np.ndarray = rng.integers(0, 4, len(games))
+    assert games.legal_moves().tolist() == [legal_moves_grid(board.tolist()) for board in boards]
+
+    score_deltas, changed = games.step(directions)
+    for board, new_board, direction, score, board_changed in zip(boards, games.boards, directions, score_deltas, changed):
+        moved_board, merge_info = move_board(pack_grid(board.tolist()), int(direction), rows, cols)
+        moved: np.ndarray = np.array(unpack_board(moved_board, rows, cols), dtype = np.uint8)
+        assert board_changed == (moved != board).any()
+        assert score == (merge_info >> MERGE_INFO_SCORE)
+        #The moved board gets exactly one new 2 or 4 on one of its empty tiles
+        difference: np.ndarray = np.flatnonzero(new_board != moved)
+        if board_changed:
+            assert len(difference) == 1
+            assert moved.flat[difference[0]] == 0 and new_board.flat[difference[0]] in (1, 2)
+        else:
+            assert len(difference) == 0
+
+def test_spawned_levels_and_reset():
+    games: Game2048Batch = Game2048Batch(20000, seed = 2)
+    tiles: np.ndarray = games.boards.reshape(len(games), -1)
+    assert (np.count_nonzero(tiles, axis = 1) == 2).all()
+    fours: float = float((tiles == 2).sum()) / (2 * len(games))
+    assert 0.08 < fours < 0.12
+    games.scores[:] = 5
+    games.reset(np.arange(len(games)) < 10)
+    assert (games.scores[:10] == 0).all() and (games.scores[10:] == 5).all()
+
+def test_finished_games_are_skipped():
+    games: Game2048Batch = Game2048Batch(2, seed = 3, rows = 2, cols = 2)
+    games.boards[0] = [[1, 2], [2, 1]]
+    games.boards[1] = [[1, 1], [0, 0]]
+    games.step([0, -1])
+    assert games.done.tolist() == [True, False]
+    assert games.moves.tolist() == [0, 0]
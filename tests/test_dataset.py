@@ -0,0 +1,40 @@
+"""Exported training data reads back whole, from the manifest and from the shards alone"""
+import os
+import typing
+import numpy as np
+import dataset
+
+def test_export_and_load(tmp_path):
+    manifest: typing.Dict[str, typing.Any] = dataset.export(str(tmp_path), 6, workers = 2, seed = 3, strategy = "random", shard_size = 100)
+    assert manifest["games"] == 6
+    assert sum([shard["count"] for shard in manifest["shards"]]) == manifest["samples"]
+
+    loaded: dataset.ShardDataset = dataset.ShardDataset(str(tmp_path))
+    assert len(loaded) == manifest["samples"]
+    batches: typing.List[np.ndarray] = list(loaded.iter_batches(32))
+    assert all([len(batch) <= 32 for batch in batches])
+    samples: np.ndarray = np.concatenate(batches)
+    assert len(samples) == manifest["samples"]
+    #Every chosen move is legal and the boards hold at least the two starting tiles
+    assert np.all((samples["legal"] >> samples["move"].astype(np.uint8)) & 1)
+    assert np.all(np.count_nonzero(samples["board"], axis = 1) >= 2)
+    assert len(list(loaded.iter_batches(32, drop_last = True))) == sum([len(shard) // 32 for shard in loaded.shards()])
+
+def test_partial_shards_hold_only_their_samples(tmp_path):
+    manifest: typing.Dict[str, typing.Any] = dataset.export(str(tmp_path), 2, workers = 1, strategy = "random", shard_size = 64)
+    for shard in manifest["shards"]:
+        #Without the manifest plain np.load sees exactly the samples of a shard
+        assert len(np.load(os.path.join(tmp_path, shard["path"]))) == shard["count"]
+    assert sorted(os.listdir(tmp_path)) == sorted([shard["path"] for shard in manifest["shards"]] + [dataset.MANIFEST_NAME])
+
+def test_shard_writer_splits_samples(tmp_path):
+    dtype: np.dtype = dataset.sample_dtype(2, 2)
+    writer: dataset.ShardWriter = dataset.ShardWriter(str(tmp_path), "test", 4, dtype)
+    samples: np.ndarray = np.zeros(10, dtype = dtype)
+    samples["reward"] = np.arange(10)
+    writer.write(samples[:3])
+    writer.write(samples[3:])
+    shards: typing.List[typing.Dict[str, typing.Any]] = writer.close()
+    assert [shard["count"] for shard in shards] == [4, 4, 2]
+    rewards: np.ndarray = np.concatenate([np.load(os.path.join(tmp_path, shard["path"]))["reward"] for shard in shards])
+    assert rewards.tolist() == list(range(10))
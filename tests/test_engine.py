@@ -0,0 +1,59 @@
+"""The packed bitboard engine must play exactly like the list engine"""
+import random
+import typing
+import pytest
+from cmdgame2048 import Game2048
+
+SIZES: typing.List[typing.Tuple[int, int]] = [(2, 2), (2, 3), (3, 2), (3, 3), (3, 4), (4, 3), (4, 4)]
+
+def game_state(game: Game2048)-> tuple:
+    return (game.grid, game.score, game.moves, game.game_state, game.legal_moves(), game.random_state,
+            game.undos_left, game.swaps_left, game.deletes_left, game.powerups_used, len(game.history))
+
+def random_action(game: Game2048, rng: random.Random):
+    """Make a move or, sometimes, try a powerup on random tiles"""
+    action: float = rng.random()
+    coordinates: typing.Callable[[], typing.List[int]] = lambda: [rng.randrange(game.cols), rng.randrange(game.rows)]
+    if game.powerups and action < 0.05:
+        game.undo()
+    elif game.powerups and action < 0.08:
+        game.swap(coordinates(), coordinates())
+    elif game.powerups and action < 0.1:
+        game.delete(coordinates())
+    else:
+        game.public_move(rng.randrange(4))
+
+@pytest.mark.parametrize("rows, cols", SIZES)
+@pytest.mark.parametrize("powerup_mode", [0, 1, 2])
+def test_bitboard_matches_list_engine(rows: int, cols: int, powerup_mode: int):
+    for seed in range(5):
+        bitboard: Game2048 = Game2048(engine = "bitboard", seed = seed, rows = rows, cols = cols, powerup_mode = powerup_mode)
+        listed: Game2048 = Game2048(engine = "list", seed = seed, rows = rows, cols = cols, powerup_mode = powerup_mode)
+        assert bitboard.packed and not listed.packed
+        assert game_state(bitboard) == game_state(listed)
+        bitboard_rng: random.Random = random.Random(seed)
+        list_rng: random.Random = random.Random(seed)
+        for step in range(400):
+            random_action(bitboard, bitboard_rng)
+            random_action(listed, list_rng)
+            assert game_state(bitboard) == game_state(listed), f"seed {seed}, step {step}"
+            if listed.game_state < 0:
+                break
+
+def test_bitboard_falls_back_to_list_engine_above_32768():
+    bitboard: Game2048 = Game2048(custom_grid = [[15, 15], [0, 0]], seed = 1)
+    listed: Game2048 = Game2048(custom_grid = [[15, 15], [0, 0]], seed = 1, engine = "list")
+    assert bitboard.packed
+    bitboard.public_move(0)
+    listed.public_move(0)
+    assert not bitboard.packed
+    assert bitboard.grid[0][0] == 16
+    assert game_state(bitboard) == game_state(listed)
+
+def test_same_seed_same_game():
+    first: Game2048 = Game2048(seed = 42)
+    second: Game2048 = Game2048(seed = 42)
+    for direction in [0, 1, 2, 3] * 20:
+        first.public_move(direction)
+        second.public_move(direction)
+    assert game_state(first) == game_state(second)
@@ -0,0 +1,57 @@
+"""The undo history keeps the newest states of a game in a ring buffer"""
+import pytest
+from cmdgame2048 import PRACTICE_HISTORY_SIZE, Game2048, MoveHistory
+
+@pytest.mark.parametrize("capacity", [1, 3, 8])
+def test_ring_buffer_keeps_newest_states(capacity: int):
+    history: MoveHistory = MoveHistory(capacity)
+    for state_index in range(20):
+        history.push(state_index, 10 * state_index, 1, -1)
+    assert len(history) == capacity
+    assert history.states() == [(state_index, 10 * state_index, 1, -1) for state_index in range(20 - capacity, 20)]
+    for state_index in reversed(range(20 - capacity, 20)):
+        assert history.pop() == (state_index, 10 * state_index, 1, -1)
+    with pytest.raises(IndexError):
+        history.pop()
+
+def test_unlimited_and_disabled_history():
+    unlimited: MoveHistory = MoveHistory(-1)
+    disabled: MoveHistory = MoveHistory(0)
+    for state_index in range(100):
+        unlimited.push(state_index, state_index, 0, 0)
+        disabled.push(state_index, state_index, 0, 0)
+    assert len(unlimited) == 100
+    assert unlimited.states(98) == [(98, 98, 0, 0), (99, 99, 0, 0)]
+    assert len(disabled) == 0
+
+def test_undo_restores_the_previous_state():
+    game: Game2048 = Game2048(seed = 3, powerup_mode = 1)
+    grid, score = game.grid, game.score
+    for direction in range(4):
+        if game.legal_moves() >> direction & 1:
+            game.public_move(direction)
+            break
+    assert game.undo() == 0
+    assert (game.grid, game.score, game.undos_left) == (grid, score, 1)
+    #The history of powerup mode 1 holds a single state
+    assert game.undo() == -2
+
+def test_practice_history_is_bounded_unless_asked():
+    assert Game2048(seed = 3, powerup_mode = 2).history.capacity == PRACTICE_HISTORY_SIZE
+    game: Game2048 = Game2048(seed = 3, powerup_mode = 2, practice_history = -1)
+    assert game.history.capacity == -1
+    #A restart keeps the history size, like the powerup mode
+    game.restart(seed = 4)
+    assert game.history.capacity == -1
+    assert Game2048(seed = 3, powerup_mode = 1, practice_history = -1).history.capacity == 1
+
+@pytest.mark.parametrize("capacity", [-1, 1, 3])
+def test_peek_returns_newest_state(capacity: int):
+    history: MoveHistory = MoveHistory(capacity)
+    for state_index in range(7):
+        history.push(state_index, 10 * state_index, 1, -1)
+        assert history.peek() == history.states()[-1] == (state_index, 10 * state_index, 1, -1)
+    while len(history):
+        assert history.peek() == history.pop()
+    with pytest.raises(IndexError):
+        history.peek()
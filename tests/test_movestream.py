@@ -0,0 +1,40 @@
+"""Playing streams of moves without rendering"""
+import io
+import os
+import subprocess
+import sys
+import pytest
+import movestream
+from cmdgame2048 import Game2048
+
+@pytest.mark.parametrize("chunk_size", [1, 3, movestream.CHUNK_SIZE])
+def test_stream_plays_like_public_move(chunk_size: int):
+    stream: bytes = b"wasd WASD\n0123\tdsaw" * 5
+    game: Game2048 = Game2048(seed = 7)
+    read: int = movestream.apply_moves(game, io.BytesIO(stream), chunk_size)
+    expected: Game2048 = Game2048(seed = 7)
+    directions: str = "".join([character for character in stream.decode() if not character.isspace()])
+    for direction in directions:
+        expected.public_move("awds".index(direction.lower()) if direction.isalpha() else int(direction))
+    assert read == len(directions)
+    assert (game.grid, game.score, game.moves) == (expected.grid, expected.score, expected.moves)
+
+@pytest.mark.parametrize("chunk_size", [1, 2, movestream.CHUNK_SIZE])
+def test_error_names_the_invalid_byte(chunk_size: int):
+    with pytest.raises(ValueError, match = r"Invalid move b'x' at byte 4"):
+        movestream.apply_moves(Game2048(seed = 1), io.BytesIO(b"w a x s"), chunk_size)
+
+def test_undo_in_stream():
+    game: Game2048 = Game2048(seed = 3, powerup_mode = 1)
+    movestream.apply_moves(game, io.BytesIO(b"wasdu"))
+    assert game.powerups_used == 1
+
+def test_reading_stops_once_the_game_is_lost():
+    game: Game2048 = Game2048(custom_grid = [[1, 2], [2, 1]], seed = 1)
+    assert movestream.apply_moves(game, io.BytesIO(b"w" * 100)) == 1
+
+def test_importing_the_game_skips_the_interactive_modules():
+    code: str = "import sys, cmdgame2048; print(sorted(set(sys.argv[1:]) & set(sys.modules)))"
+    result: subprocess.CompletedProcess = subprocess.run([sys.executable, "-c", code, "pynput", "asyncio"], capture_output = True, text = True,
+                                                         cwd = os.path.dirname(os.path.abspath(movestream.__file__)), check = True)
+    assert result.stdout.strip() == "[]"
@@ -0,0 +1,46 @@
+"""Listing, ranking and using powerups"""
+import typing
+import planner
+from cmdgame2048 import Game2048
+
+LOST_GRID: typing.List[typing.List[int]] = [[1, 2, 1, 2], [2, 1, 2, 1], [1, 2, 1, 2], [2, 1, 2, 3]]
+
+def test_options_list_every_powerup():
+    game: Game2048 = Game2048(custom_grid = [[1, 0], [2, 2]], powerup_mode = 1, seed = 1)
+    game.undos_left, game.swaps_left, game.deletes_left = 0, 1, 1
+    grid: typing.List[typing.List[int]] = game.grid
+    options: typing.List[planner.PowerupOption] = planner.PowerupPlanner().options(game)
+    kinds: typing.List[str] = [option.kind for option in options]
+    tiles: typing.List[int] = [tile for row in grid for tile in row if tile]
+    swaps: int = sum([1 for first in range(len(tiles)) for second in range(first + 1, len(tiles)) if tiles[first] != tiles[second]])
+    assert kinds == ["none"] + ["swap"] * swaps + ["delete"] * len(set(tiles))
+    assert options[0].grid == grid
+    for option in options:
+        if option.kind == "swap":
+            (x_1, y_1), (x_2, y_2) = option.coordinates
+            assert (option.grid[y_1][x_1], option.grid[y_2][x_2]) == (grid[y_2][x_2], grid[y_1][x_1])
+        elif option.kind == "delete":
+            x, y = option.coordinates[0]
+            assert option.grid == [[0 if tile == grid[y][x] else tile for tile in row] for row in grid]
+
+def test_options_without_powerups():
+    game: Game2048 = Game2048(seed = 1)
+    assert [option.kind for option in planner.PowerupPlanner().options(game)] == ["none"]
+
+def test_undo_option_loses_the_score_of_the_move():
+    game: Game2048 = Game2048(custom_grid = [[1, 1], [0, 0]], powerup_mode = 1, seed = 2)
+    grid: typing.List[typing.List[int]] = game.grid
+    game.public_move(0)
+    undo: planner.PowerupOption = [option for option in planner.PowerupPlanner().options(game) if option.kind == "undo"][0]
+    assert undo.score_change == -game.score
+    assert undo.grid == grid
+
+def test_use_powerups_revives_a_lost_game():
+    game: Game2048 = Game2048(custom_grid = LOST_GRID, powerup_mode = 1, seed = 3)
+    game.undos_left, game.swaps_left, game.deletes_left = 0, 1, 1
+    assert game.game_state < 0
+    ranked: typing.List[planner.PowerupOption] = planner.PowerupPlanner(rollouts = 4, rollout_moves = 8, seed = 0).rank(game)
+    assert [option.value for option in ranked] == sorted([option.value for option in ranked], reverse = True)
+    assert planner.use_powerups(game, game, planner.PowerupPlanner(rollouts = 4, rollout_moves = 8, seed = 0))
+    assert game.powerups_used == 1
+    assert game.game_state > 0
@@ -0,0 +1,16 @@
+"""The profiler measures the game when it is enabled by its environment variables"""
+import json
+import os
+import subprocess
+import sys
+import profiling
+
+def test_environment_variable_profiles_imported_game(tmp_path):
+    output: str = str(tmp_path / "report.json")
+    code: str = "import cmdgame2048; game = cmdgame2048.Game2048(seed = 1); [game.public_move(direction) for direction in range(4)]"
+    environment: dict = dict(os.environ, **{profiling.PROFILE_ENV: output})
+    subprocess.run([sys.executable, "-c", code], env = environment, cwd = os.path.dirname(os.path.abspath(profiling.__file__)), check = True)
+    with open(output) as report_file:
+        report: dict = json.load(report_file)
+    assert report["functions"]["public_move"]["calls"] == 4
+    assert report["functions"]["_spawn"]["calls"] >= 2
@@ -0,0 +1,62 @@
+"""Recorded replays play back to the recorded game and keyframes restore any step"""
+import io
+import random
+import struct
+import typing
+import pytest
+import replay
+from cmdgame2048 import Game2048
+
+def record_game(seed: int, stream: typing.BinaryIO, keyframe_interval: int, steps: int = 300)-> typing.List[tuple]:
+    """Record a game of random moves and undos, return the state of the game after every step"""
+    game: Game2048 = Game2048(seed = seed, powerup_mode = 2)
+    recorder: replay.GameRecorder = replay.GameRecorder(game, stream, keyframe_interval)
+    rng: random.Random = random.Random(seed)
+    states: typing.List[tuple] = [(0, game.grid, game.score, game.moves, game.random_state)]
+    while game.game_state > 0 and recorder.steps < steps:
+        if rng.random() < 0.1 and len(game.history):
+            recorder.undo()
+        else:
+            recorder.public_move(rng.randrange(4))
+        if recorder.steps != states[-1][0]:
+            states.append((recorder.steps, game.grid, game.score, game.moves, game.random_state))
+    recorder.close()
+    return states
+
+def test_archive_round_trip():
+    archive: io.BytesIO = io.BytesIO()
+    finals: typing.List[tuple] = [record_game(seed, archive, 16)[-1] for seed in range(4)]
+    archive.seek(0)
+    replays: typing.List[replay.Replay] = list(replay.iter_replays(archive))
+    assert len(replays) == len(finals)
+    for game_replay, (steps, grid, score, moves, random_state) in zip(replays, finals):
+        assert game_replay.verify()
+        assert game_replay.verify("list")
+        assert (game_replay.grid, game_replay.score, game_replay.moves) == (grid, score, moves)
+
+@pytest.mark.parametrize("keyframe_interval", [0, 1, 16])
+def test_keyframe_seek(keyframe_interval: int):
+    stream: io.BytesIO = io.BytesIO()
+    states: typing.List[tuple] = record_game(7, stream, keyframe_interval)
+    replay_file: replay.ReplayFile = replay.ReplayFile(stream)
+    assert replay_file.steps == states[-1][0]
+    if keyframe_interval:
+        assert len(replay_file.keyframe_steps) == states[-1][0] // keyframe_interval
+    #Seeking backwards and forwards must give the same games as playing them in order
+    for steps, grid, score, moves, random_state in states[::-3] + states[::5]:
+        game: Game2048 = replay_file.game_at(steps)
+        assert (game.grid, game.score, game.moves, game.random_state) == (grid, score, moves, random_state)
+
+def test_replays_of_older_generator_are_rejected():
+    stream: io.BytesIO = io.BytesIO()
+    record_game(1, stream, 16, 10)
+    data: bytearray = bytearray(stream.getvalue())
+    data[4] = 2
+    with pytest.raises(replay.ReplayError):
+        replay.read_replay(io.BytesIO(bytes(data)))
+
+def test_truncated_replay_raises():
+    stream: io.BytesIO = io.BytesIO()
+    record_game(1, stream, 16, 50)
+    with pytest.raises(replay.ReplayError):
+        replay.read_replay(io.BytesIO(stream.getvalue()[:replay.HEADER.size + 5]))
@@ -0,0 +1,46 @@
+"""Headless self-play and its strategies"""
+import random
+import typing
+import pytest
+import selfplay
+from cmdgame2048 import Game2048
+
+def test_greedy_plays_the_same_on_both_engines():
+    rng: random.Random = random.Random(1)
+    for board_index in range(300):
+        grid: typing.List[typing.List[int]] = [[rng.choice([0, 0, 1, 1, 2, 3]) for column in range(4)] for row in range(4)]
+        bitboard: Game2048 = Game2048(custom_grid = grid, seed = board_index)
+        listed: Game2048 = Game2048(custom_grid = grid, seed = board_index, engine = "list")
+        assert selfplay.greedy_move(bitboard, rng) == selfplay.greedy_move(listed, rng)
+
+def test_greedy_on_large_boards_takes_the_merge():
+    grid: typing.List[typing.List[int]] = [[0] * 5 for row in range(5)]
+    grid[4][0] = grid[4][1] = 3
+    grid[0][4] = 1
+    game: Game2048 = Game2048(custom_grid = grid, seed = 1)
+    assert not game.packed
+    #Only moving left or right merges the 8 tiles
+    assert selfplay.greedy_move(game, random.Random(0)) in (0, 2)
+
+def test_expectimax_is_rejected_for_other_sizes():
+    with pytest.raises(ValueError):
+        selfplay.run_selfplay(1, strategy = "expectimax", rows = 5, cols = 5)
+    with pytest.raises(ValueError):
+        selfplay.check_strategy("unknown")
+    selfplay.check_strategy("greedy", 5, 5)
+
+@pytest.mark.parametrize("powerup_mode", [0, 1, 2])
+def test_auto_powerups_need_a_powerup_mode(powerup_mode: int):
+    if powerup_mode == 0:
+        with pytest.raises(ValueError):
+            selfplay.check_strategy("greedy", powerup_mode = powerup_mode, auto_powerups = True)
+        with pytest.raises(SystemExit):
+            selfplay.main(["--games", "1", "--auto-powerups"])
+    else:
+        selfplay.check_strategy("greedy", powerup_mode = powerup_mode, auto_powerups = True)
+
+def test_results_are_reproducible():
+    first: typing.Dict[str, typing.Any] = selfplay.play_game(0, 11, "greedy", rows = 3, cols = 5)
+    second: typing.Dict[str, typing.Any] = selfplay.play_game(0, 11, "greedy", rows = 3, cols = 5)
+    assert {key: value for key, value in first.items() if key != "wall_time"} == {key: value for key, value in second.items() if key != "wall_time"}
+    assert first["moves"] > 0 and first["game_state"] < 0
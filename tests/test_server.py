@@ -0,0 +1,56 @@
+"""Commands of the game server and eviction of idle sessions"""
+import asyncio
+import typing
+import pytest
+import server
+from cmdgame2048 import Game2048
+
+def new_session(powerup_mode: int = 1)-> server.Session:
+    return server.Session(Game2048(powerup_mode = powerup_mode, seed = 1), None)
+
+def test_moves_and_state():
+    game_server: server.GameServer = server.GameServer()
+    session: server.Session = new_session(0)
+    assert game_server.handle_command(session, "state") == server.format_state(session.game)
+    direction: int = [direction for direction in range(4) if session.game.legal_moves() >> direction & 1][0]
+    reply: str = game_server.handle_command(session, f"move {'LURD'[direction]}\n")
+    assert reply == server.format_state(session.game)
+    assert reply.split()[2] == "1"
+    assert game_server.moves == 1
+    assert reply.split()[7] == "4x4" and len(reply.split()[8].split("/")) == 4
+
+@pytest.mark.parametrize("line, reply", [("", "ERR empty command"), ("jump", "ERR unknown command"), ("move X", "ERR unknown command"),
+                                         ("swap 0 0 9 9", "ERR coordinates out of the board"), ("delete a b", "ERR invalid number"),
+                                         ("new 5", "ERR powerup mode must be 0, 1 or 2")])
+def test_invalid_commands(line: str, reply: str):
+    assert server.GameServer().handle_command(new_session(), line) == reply
+
+def test_powerups_and_new_game():
+    game_server: server.GameServer = server.GameServer()
+    session: server.Session = new_session(0)
+    assert game_server.handle_command(session, "undo") == server.POWERUP_ERRORS[-1]
+    assert game_server.handle_command(session, "new 1").startswith("OK 0 0 1 2 1 0 ")
+    assert game_server.handle_command(session, "undo") == server.POWERUP_ERRORS[-2]
+    assert game_server.handle_command(session, "quit") is None
+
+def test_sessions_over_tcp_and_idle_eviction():
+    async def run()-> typing.Tuple[str, str, str, int]:
+        game_server: server.GameServer = server.GameServer(port = 0, idle_timeout = 0.2)
+        await game_server.start()
+        try:
+            reader, writer = await asyncio.open_connection(game_server.host, game_server.port)
+            greeting: str = (await reader.readline()).decode()
+            writer.write(b"stats\n")
+            stats: str = (await reader.readline()).decode()
+            #The evictor runs once a second at most, the session is closed by its next run
+            goodbye: str = (await asyncio.wait_for(reader.readline(), 5)).decode()
+            writer.close()
+            return greeting, stats, goodbye, game_server.evicted
+        finally:
+            await game_server.close()
+
+    greeting, stats, goodbye, evicted = asyncio.run(run())
+    assert greeting.startswith("OK 0 0 1 ")
+    assert stats.split()[:2] == ["STATS", "1"]
+    assert goodbye == "BYE idle\n"
+    assert evicted == 1
@@ -0,0 +1,69 @@
+"""The exact solver against a plain recursive expectimax over 2x2 boards"""
+import functools
+import os
+import typing
+import pytest
+import solver
+from cmdgame2048 import legal_moves_board, merge_row
+
+def move_grid(grid: typing.Tuple[int, ...], direction: int)-> typing.Tuple[typing.Tuple[int, ...], int]:
+    """Move a 2x2 grid of tile exponents (row by row) with the list engine rules, return it and the score"""
+    rows: typing.List[typing.List[int]] = [list(grid[0:2]), list(grid[2:4])]
+    lines: typing.List[typing.List[int]] = rows if direction % 2 == 0 else [list(column) for column in zip(*rows)]
+    new_lines: typing.List[typing.List[int]] = []
+    score: int = 0
+    for line in lines:
+        if direction >= 2:
+            line = line[::-1]
+        new_line, merged_levels = merge_row(line)
+        score += sum([2**level for level in merged_levels])
+        new_lines.append(new_line[::-1] if direction >= 2 else new_line)
+    if direction % 2 == 1:
+        new_lines = [list(row) for row in zip(*new_lines)]
+    return tuple(new_lines[0] + new_lines[1]), score
+
+def spawns(grid: typing.Tuple[int, ...])-> typing.List[typing.Tuple[float, typing.Tuple[int, ...]]]:
+    empty: typing.List[int] = [cell for cell, tile in enumerate(grid) if tile == 0]
+    return [(probability / len(empty), grid[:cell] + (level,) + grid[cell + 1:]) for cell in empty for probability, level in ((0.9, 1), (0.1, 2))]
+
+def reference_start_values(target: int | None)-> typing.Tuple[float, float]:
+    @functools.lru_cache(maxsize = None)
+    def value(grid: typing.Tuple[int, ...])-> typing.Tuple[float, float]:
+        best_win: float = 0.0
+        best_score: float = 0.0
+        for direction in range(4):
+            new_grid, score = move_grid(grid, direction)
+            if new_grid == grid:
+                continue
+            if target is not None and max(new_grid) >= target:
+                win, expected_score = 1.0, 0.0
+            else:
+                win = sum([probability * value(spawned)[0] for probability, spawned in spawns(new_grid)])
+                expected_score = sum([probability * value(spawned)[1] for probability, spawned in spawns(new_grid)])
+            best_win = max(best_win, win)
+            best_score = max(best_score, expected_score + score)
+        return best_win, best_score
+
+    starts: typing.List[typing.Tuple[float, typing.Tuple[int, ...]]] = [(first * second, grid) for first, spawned in spawns((0, 0, 0, 0)) for second, grid in spawns(spawned)]
+    return sum([probability * value(grid)[0] for probability, grid in starts]), sum([probability * value(grid)[1] for probability, grid in starts])
+
+@pytest.mark.parametrize("target", [None, 4, 5])
+def test_2x2_start_values(tmp_path, target: int | None):
+    metadata: typing.Dict[str, typing.Any] = solver.SmallBoardSolver(2, 2, target).solve(os.path.join(tmp_path, "table.npy"))
+    win, score = reference_start_values(target)
+    assert metadata["start_win_probability"] == pytest.approx(win)
+    assert metadata["start_expected_score"] == pytest.approx(score)
+
+def test_table_lookup_and_best_move(tmp_path):
+    path: str = os.path.join(tmp_path, "table.npy")
+    table_solver: solver.SmallBoardSolver = solver.SmallBoardSolver(2, 2, 5)
+    table_solver.solve(path)
+    table: solver.SolvedTable = solver.SolvedTable(path)
+    assert len(table) == table_solver.states
+    for record in table.table[::7]:
+        board: int = int(record["board"])
+        assert table.lookup(board) == (float(record["win"]), float(record["score"]))
+        direction: int = table.best_move(board)
+        assert direction == -1 or legal_moves_board(board, 2, 2) >> direction & 1
+    with pytest.raises(KeyError):
+        table.lookup(0)